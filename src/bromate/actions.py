@@ -6,8 +6,21 @@ import time
 import typing as T
 
 import pydantic as pdt
-
-from bromate import agents, drivers, types
+from loguru import logger
+
+from bromate import (
+    agents,
+    drivers,
+    extractions,
+    groundings,
+    healings,
+    images,
+    prefetches,
+    results,
+    traces,
+    types,
+    viewports,
+)
 
 # %% CLASSES
 
@@ -18,6 +31,27 @@ class ActionConfig(types.ImmutableData):
     sleep_time: pdt.PositiveFloat = types.Field(
         default=0.5, description="Time to sleep after loading a page"
     )
+    page_source: bool = types.Field(
+        default=True, description="Return the page source after loading a page"
+    )
+    read_size: pdt.PositiveInt = types.Field(
+        default=4000, description="Maximum size (in characters) of a page returned by read"
+    )
+    viewport: viewports.ViewportConfig = types.Field(
+        default=viewports.ViewportConfig(), description="Configuration of the viewports"
+    )
+    prefetch: prefetches.PrefetchConfig = types.Field(
+        default=prefetches.PrefetchConfig(), description="Configuration of the prefetches"
+    )
+    result: results.ResultConfig = types.Field(
+        default=results.ResultConfig(), description="Configuration of the results"
+    )
+    stability: images.StabilityConfig = types.Field(
+        default=images.StabilityConfig(), description="Configuration of the visual stability"
+    )
+    healing: healings.HealingConfig = types.Field(
+        default=healings.HealingConfig(), description="Configuration of the selector healing"
+    )
 
 
 # %% ALIASES
@@ -36,6 +70,75 @@ class Action(T.Protocol):
 
 # %% FUNCTIONS
 
+
+def _wait(driver: drivers.Driver, config: ActionConfig) -> None:
+    """Wait for the page to load (no wait for pages loaded over HTTP)."""
+    if isinstance(driver, drivers.HttpDriver) and driver.browser is None:
+        return
+    if config.stability.enabled is True:
+        with traces.span(driver=driver, kind="wait", name="stability"):
+            stability = images.wait_until_stable(driver=driver, config=config.stability)
+        logger.debug("Visual stability: {}", stability)
+    else:
+        with traces.span(driver=driver, kind="wait", name="sleep"):
+            time.sleep(config.sleep_time)
+
+
+def _observe(
+    name: str, driver: drivers.Driver, config: ActionConfig, start: float | None = None
+) -> agents.Structure:
+    """Observe the page state after loading a page (started at a perf counter)."""
+    if config.prefetch.enabled is True:
+        prefetcher = prefetches.prefetcher(driver=driver, config=config.prefetch)
+        latency = time.perf_counter() - start if start is not None else 0.0
+        prefetcher.visit(driver=driver, latency=latency)
+        prefetcher.warm(driver=driver)
+        logger.debug(
+            "Prefetch metrics: {}, hit rate={:.2f}, hit latency={:.3f}s, miss latency={:.3f}s",
+            prefetcher.metrics,
+            prefetcher.metrics.hit_rate,
+            prefetcher.metrics.hit_latency,
+            prefetcher.metrics.miss_latency,
+        )
+    response = {"title": driver.title, "url": driver.current_url}
+    if config.viewport.enabled is True:
+        if name in (get.__name__, back.__name__, forward.__name__):  # cached or reused pages
+            viewports.forget(driver=driver)
+        response.update(viewports.observe(driver=driver, config=config.viewport))
+    elif config.page_source is True:
+        response["page_source"] = driver.page_source
+    return agents.Structure(name=name, response=response)
+
+
+def _reveal(name: str, driver: drivers.Driver, config: ActionConfig) -> agents.Structure:
+    """Observe the content revealed in the viewport after scrolling (or the page state)."""
+    _wait(driver=driver, config=config)  # load lazy content
+    response = {"title": driver.title, "url": driver.current_url}
+    if config.viewport.enabled is True:
+        response.update(viewports.observe(driver=driver, config=config.viewport))
+    elif config.page_source is True:
+        response["page_source"] = driver.page_source
+    return agents.Structure(name=name, response=response)
+
+
+def _find(
+    name: str,
+    driver: drivers.Driver,
+    config: ActionConfig,
+    css_selector: str | None,
+    mark: int | None,
+) -> T.Any:
+    """Find an element given its CSS selector (healed if enabled) or its mark."""
+    if mark is not None:
+        return driver.find_element(by=drivers.CSS, value=groundings.selector(mark=mark))
+    if css_selector is None:
+        raise ValueError("Cannot find element (no CSS selector or mark given)!")
+    if config.healing.enabled is True:
+        healer = healings.healer(driver=driver, config=config.healing)
+        return healer.find(driver=driver, action=name, css_selector=css_selector)
+    return driver.find_element(by=drivers.CSS, value=css_selector)
+
+
 AGENT_FUNCTIONS: list[agents.Function] = []
 
 
@@ -63,52 +166,152 @@ def declare(schema: agents.Schema | None = None) -> T.Callable[[Action], Action]
 )
 def get(driver: drivers.Driver, config: ActionConfig, url: str) -> agents.Structure:
     """Open a web page in the browser window."""
+    start = time.perf_counter()
     driver.get(url=url)  # wait loading
-    time.sleep(config.sleep_time)
+    _wait(driver=driver, config=config)
+    return _observe(name=get.__name__, driver=driver, config=config, start=start)
+
+
+@declare()
+def done(driver: drivers.Driver, config: ActionConfig) -> agents.Structure:
+    """Call this when no further action is required."""
+    return agents.Structure(name=done.__name__, response={"done": True})
+
+
+@declare(
+    schema=agents.Schema(
+        type=agents.Type.OBJECT,
+        properties={
+            "query": agents.Schema(
+                type=agents.Type.STRING,
+                description="What to look for in the text, to return the most relevant pages first.",
+            ),
+            "page": agents.Schema(
+                type=agents.Type.INTEGER, description="Page of text to return (starts at 1)."
+            ),
+        },
+        required=[],
+    )
+)
+def read(
+    driver: drivers.Driver, config: ActionConfig, query: str = "", page: int = 1
+) -> agents.Structure:
+    """Read the main text of the web page as Markdown, one page at a time."""
+    source, url = driver.page_source, driver.current_url
+    chunks = extractions.extract(source=source, base_url=url, size=config.read_size)
+    order = extractions.rank(chunks=list(chunks), query=query)
+    index = min(max(int(page), 1), len(order) or 1) - 1
+    content = chunks[order[index]] if order else ""
+    logger.debug("Read payload: {} of {} source chars", len(content), len(source))
     return agents.Structure(
-        name=get.__name__,
+        name=read.__name__,
         response={
             "title": driver.title,
-            "url": driver.current_url,
-            "page_source": driver.page_source,
+            "url": url,
+            "page": index + 1,
+            "pages": len(order),
+            "content": content,
         },
     )
 
 
+@declare(
+    schema=agents.Schema(
+        type=agents.Type.OBJECT,
+        properties={
+            "handle": agents.Schema(
+                type=agents.Type.STRING, description="Handle given in a truncated result."
+            ),
+            "offset": agents.Schema(
+                type=agents.Type.INTEGER,
+                description="Offset (in bytes) to read from, given with the handle.",
+            ),
+        },
+        required=["handle"],
+    )
+)
+def read_more(
+    driver: drivers.Driver, config: ActionConfig, handle: str, offset: int = 0
+) -> agents.Structure:
+    """Read more of a truncated result given its handle, one page at a time."""
+    shaper = results.shaper(driver=driver, config=config.result)
+    response = shaper.read(handle=handle, offset=int(offset))
+    return agents.Structure(name=read_more.__name__, response=response)
+
+
 @declare()
-def done(driver: drivers.Driver, config: ActionConfig) -> agents.Structure:
-    """Call this when no further action is required."""
-    return agents.Structure(name=done.__name__, response={"done": True})
+def screenshot(driver: drivers.Driver, config: ActionConfig) -> agents.Structure:
+    """Request a screenshot of the browser window with the next message."""
+    return agents.Structure(name=screenshot.__name__, response={"requested": True})
+
+
+@declare(
+    schema=agents.Schema(
+        type=agents.Type.OBJECT,
+        properties={
+            "screens": agents.Schema(
+                type=agents.Type.NUMBER,
+                description="Number of viewports to scroll (negative to scroll up, default to 1).",
+            ),
+        },
+        required=[],
+    )
+)
+def scroll(driver: drivers.Driver, config: ActionConfig, screens: float = 1.0) -> agents.Structure:
+    """Scroll the page by viewports and return the newly revealed content."""
+    viewports.scroll(driver=driver, config=config.viewport, screens=screens)
+    return _reveal(name=scroll.__name__, driver=driver, config=config)
+
+
+@declare(
+    schema=agents.Schema(
+        type=agents.Type.OBJECT,
+        properties={
+            "css_selector": agents.Schema(
+                type=agents.Type.STRING, description="CSS selector of the element to scroll to."
+            ),
+            "mark": agents.Schema(
+                type=agents.Type.INTEGER,
+                description="Mark of the element (instead of a CSS selector).",
+            ),
+        },
+        required=[],
+    )
+)
+def scroll_to(
+    driver: drivers.Driver,
+    config: ActionConfig,
+    css_selector: str | None = None,
+    mark: int | None = None,
+) -> agents.Structure:
+    """Scroll to an element given its CSS selector or mark and return the revealed content."""
+    element = _find(
+        name=scroll_to.__name__,
+        driver=driver,
+        config=config,
+        css_selector=css_selector,
+        mark=mark,
+    )
+    viewports.scroll_to(driver=driver, config=config.viewport, element=element)
+    return _reveal(name=scroll_to.__name__, driver=driver, config=config)
 
 
 @declare()
 def back(driver: drivers.Driver, config: ActionConfig) -> agents.Structure:
     """Go back from one page."""
+    start = time.perf_counter()
     driver.back()
-    time.sleep(config.sleep_time)
-    return agents.Structure(
-        name=back.__name__,
-        response={
-            "title": driver.title,
-            "url": driver.current_url,
-            "page_source": driver.page_source,
-        },
-    )
+    _wait(driver=driver, config=config)
+    return _observe(name=back.__name__, driver=driver, config=config, start=start)
 
 
 @declare()
 def forward(driver: drivers.Driver, config: ActionConfig) -> agents.Structure:
     """Go forward from one page."""
+    start = time.perf_counter()
     driver.forward()
-    time.sleep(config.sleep_time)
-    return agents.Structure(
-        name=forward.__name__,
-        response={
-            "title": driver.title,
-            "url": driver.current_url,
-            "page_source": driver.page_source,
-        },
-    )
+    _wait(driver=driver, config=config)
+    return _observe(name=forward.__name__, driver=driver, config=config, start=start)
 
 
 @declare(
@@ -118,23 +321,32 @@ def forward(driver: drivers.Driver, config: ActionConfig) -> agents.Structure:
             "css_selector": agents.Schema(
                 type=agents.Type.STRING, description="CSS selector of the element to click on."
             ),
+            "mark": agents.Schema(
+                type=agents.Type.INTEGER,
+                description="Mark of the element (instead of a CSS selector).",
+            ),
         },
-        required=["css_selector"],
+        required=[],
     )
 )
-def click(driver: drivers.Driver, config: ActionConfig, css_selector: str) -> agents.Structure:
-    """Click on an element given its CSS selector."""
-    element = driver.find_element(by=drivers.CSS, value=css_selector)
-    element.click()
-    time.sleep(config.sleep_time)
-    return agents.Structure(
+def click(
+    driver: drivers.Driver,
+    config: ActionConfig,
+    css_selector: str | None = None,
+    mark: int | None = None,
+) -> agents.Structure:
+    """Click on an element given its CSS selector or mark."""
+    element = _find(
         name=click.__name__,
-        response={
-            "title": driver.title,
-            "url": driver.current_url,
-            "page_source": driver.page_source,
-        },
+        driver=driver,
+        config=config,
+        css_selector=css_selector,
+        mark=mark,
     )
+    start = time.perf_counter()
+    element.click()
+    _wait(driver=driver, config=config)
+    return _observe(name=click.__name__, driver=driver, config=config, start=start)
 
 
 @declare(
@@ -144,13 +356,28 @@ def click(driver: drivers.Driver, config: ActionConfig, css_selector: str) -> ag
             "css_selector": agents.Schema(
                 type=agents.Type.STRING, description="CSS selector of the element to clear."
             ),
+            "mark": agents.Schema(
+                type=agents.Type.INTEGER,
+                description="Mark of the element (instead of a CSS selector).",
+            ),
         },
-        required=["css_selector"],
+        required=[],
     )
 )
-def clear(driver: drivers.Driver, config: ActionConfig, css_selector: str) -> agents.Structure:
-    """Clearn an element given its CSS selector."""
-    element = driver.find_element(by=drivers.CSS, value=css_selector)
+def clear(
+    driver: drivers.Driver,
+    config: ActionConfig,
+    css_selector: str | None = None,
+    mark: int | None = None,
+) -> agents.Structure:
+    """Clearn an element given its CSS selector or mark."""
+    element = _find(
+        name=clear.__name__,
+        driver=driver,
+        config=config,
+        css_selector=css_selector,
+        mark=mark,
+    )
     element.clear()
     return agents.Structure(name=clear.__name__, response={"cleared": True})
 
@@ -162,23 +389,32 @@ def clear(driver: drivers.Driver, config: ActionConfig, css_selector: str) -> ag
             "css_selector": agents.Schema(
                 type=agents.Type.STRING, description="CSS selector of the element to submit."
             ),
+            "mark": agents.Schema(
+                type=agents.Type.INTEGER,
+                description="Mark of the element (instead of a CSS selector).",
+            ),
         },
-        required=["css_selector"],
+        required=[],
     )
 )
-def submit(driver: drivers.Driver, config: ActionConfig, css_selector: str) -> agents.Structure:
-    """Submit an element given its CSS selector."""
-    element = driver.find_element(by=drivers.CSS, value=css_selector)
-    element.submit()
-    time.sleep(config.sleep_time)
-    return agents.Structure(
+def submit(
+    driver: drivers.Driver,
+    config: ActionConfig,
+    css_selector: str | None = None,
+    mark: int | None = None,
+) -> agents.Structure:
+    """Submit an element given its CSS selector or mark."""
+    element = _find(
         name=submit.__name__,
-        response={
-            "title": driver.title,
-            "url": driver.current_url,
-            "page_source": driver.page_source,
-        },
+        driver=driver,
+        config=config,
+        css_selector=css_selector,
+        mark=mark,
     )
+    start = time.perf_counter()
+    element.submit()
+    _wait(driver=driver, config=config)
+    return _observe(name=submit.__name__, driver=driver, config=config, start=start)
 
 
 @declare(
@@ -188,18 +424,32 @@ def submit(driver: drivers.Driver, config: ActionConfig, css_selector: str) -> a
             "css_selector": agents.Schema(
                 type=agents.Type.STRING, description="CSS selector of the element to send keys."
             ),
+            "mark": agents.Schema(
+                type=agents.Type.INTEGER,
+                description="Mark of the element (instead of a CSS selector).",
+            ),
             "text": agents.Schema(
                 type=agents.Type.STRING, description="text to send to the element."
             ),
         },
-        required=["css_selector", "text"],
+        required=["text"],
     )
 )
 def write(
-    driver: drivers.Driver, config: ActionConfig, css_selector: str, text: str
+    driver: drivers.Driver,
+    config: ActionConfig,
+    text: str,
+    css_selector: str | None = None,
+    mark: int | None = None,
 ) -> agents.Structure:
-    """write text an the element given its CSS selector."""
-    element = driver.find_element(by=drivers.CSS, value=css_selector)
+    """write text an the element given its CSS selector or mark."""
+    element = _find(
+        name=write.__name__,
+        driver=driver,
+        config=config,
+        css_selector=css_selector,
+        mark=mark,
+    )
     element.send_keys(text)
     return agents.Structure(name=write.__name__, response={"wrote": True})
 
@@ -211,6 +461,10 @@ def write(
             "css_selector": agents.Schema(
                 type=agents.Type.STRING, description="CSS selector of the element to send keys."
             ),
+            "mark": agents.Schema(
+                type=agents.Type.INTEGER,
+                description="Mark of the element (instead of a CSS selector).",
+            ),
             "values": agents.Schema(
                 type=agents.Type.ARRAY,
                 items=agents.Schema(
@@ -218,14 +472,24 @@ def write(
                 ),
             ),
         },
-        required=["css_selector", "values"],
+        required=["values"],
     )
 )
 def select(
-    driver: drivers.Driver, config: ActionConfig, css_selector: str, values: list[str]
+    driver: drivers.Driver,
+    config: ActionConfig,
+    values: list[str],
+    css_selector: str | None = None,
+    mark: int | None = None,
 ) -> agents.Structure:
-    """Select the values in the element given its CSS selector."""
-    element = driver.find_element(by=drivers.CSS, value=css_selector)
+    """Select the values in the element given its CSS selector or mark."""
+    element = _find(
+        name=select.__name__,
+        driver=driver,
+        config=config,
+        css_selector=css_selector,
+        mark=mark,
+    )
     selector = T.cast(drivers.Select, element)
     selector.deselect_all()
     for value in values:
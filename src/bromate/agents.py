@@ -38,11 +38,25 @@ class AgentConfig(types.ImmutableData):
     )
     temperature: float = types.Field(default=0.0, description="Temperature of the agent")
     candidate_count: pdt.PositiveInt = types.Field(
-        default=1, description="Number of candidates to generate"
+        default=1,
+        description="Number of candidates to generate (see --execution.candidate.enabled)",
     )
     max_output_tokens: pdt.PositiveInt = types.Field(
         default=1000, description="Maximum output tokens to generate"
     )
+    backend: T.Literal["gemini", "stub"] = types.Field(
+        default="gemini", description="Backend of the agent (stub runs offline)"
+    )
+    stub_path: str | None = types.Field(
+        default=None,
+        description="Path of recorded responses (JSONL) for the stub backend (rule-based if null)",
+    )
+    stub_latency: pdt.NonNegativeFloat = types.Field(
+        default=0.0, description="Simulated latency (in seconds) of the stub backend"
+    )
+    record_path: str | None = types.Field(
+        default=None, description="Path to record the agent responses (JSONL) for the stub backend"
+    )
     system_instructions: str = types.Field(
         default="You are a browser automation system. Your goal is to understand the user request and execute actions on its browser using the tools at your disposal. After each step, you will receive a screenshot and the page source of the current browser window."
         "",
@@ -52,10 +66,11 @@ class AgentConfig(types.ImmutableData):
 
 # %% ALIASES
 
-Agent: T.TypeAlias = genai.GenerativeModel
 Blob: T.TypeAlias = genai.protos.Blob
 Call: T.TypeAlias = genai.protos.FunctionCall
+Candidate: T.TypeAlias = genai.protos.Candidate
 Content: T.TypeAlias = genai.protos.Content
+FileData: T.TypeAlias = genai.protos.FileData
 Function: T.TypeAlias = genai.protos.FunctionDeclaration
 GenerationConfig: T.TypeAlias = genai.GenerationConfig
 Part: T.TypeAlias = genai.protos.Part
@@ -64,22 +79,26 @@ Schema: T.TypeAlias = genai.protos.Schema
 Structure: T.TypeAlias = genai.protos.FunctionResponse
 Tool: T.TypeAlias = genai.protos.Tool
 Type: T.TypeAlias = genai.protos.Type
+Usage: T.TypeAlias = genai.protos.GenerateContentResponse.UsageMetadata
+
+
+class Agent(T.Protocol):
+    """Alias for an agent backend."""
+
+    def generate_content(self, contents: list[Content], tools: list[Tool]) -> Response: ...
+
+    def stream_content(
+        self, contents: list[Content], tools: list[Tool]
+    ) -> T.Iterator[Response]: ...
+
+    def count_tokens(self, contents: list[Content], tools: list[Tool]) -> int: ...
+
 
 # %% FUNCTIONS
 
 
-def init_agent_from_config(config: AgentConfig) -> Agent:
-    """Initialize a model from config."""
-    api_key = config.api_key.get_secret_value() if config.api_key else None
-    genai.configure(api_key=api_key)  # global assignment!
-    gen_config = GenerationConfig(
-        temperature=config.temperature,
-        candidate_count=config.candidate_count,
-        max_output_tokens=config.max_output_tokens,
-    )
-    model = Agent(
-        model_name=config.name,
-        generation_config=gen_config,
-        system_instruction=config.system_instructions,
-    )
-    return model
+def to_response(content: Content, usage: Usage | None = None) -> Response:
+    """Wrap an agent content into a response (e.g., for offline backends)."""
+    candidate = Candidate(content=content, finish_reason=Candidate.FinishReason.STOP, index=0)
+    proto = genai.protos.GenerateContentResponse(candidates=[candidate], usage_metadata=usage)
+    return Response.from_response(proto)
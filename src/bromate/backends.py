@@ -0,0 +1,218 @@
+"""Implement the agent backends (online and offline)."""
+
+# %% IMPORTS
+
+import re
+import threading
+import time
+import typing as T
+
+import google.generativeai as genai
+
+from bromate import agents
+
+# %% CONSTANTS
+
+# tokens billed per image by the Gemini API
+IMAGE_TOKENS = 258
+# approximate number of characters per text token
+CHARS_PER_TOKEN = 4
+
+# %% CLASSES
+
+
+class GeminiAgent:
+    """Agent backend for the Google Gemini API."""
+
+    def __init__(self, model: genai.GenerativeModel) -> None:
+        """Initialize the backend from a generative model."""
+        self.model = model
+
+    def generate_content(
+        self, contents: list[agents.Content], tools: list[agents.Tool]
+    ) -> agents.Response:
+        """Generate a response from contents and tools."""
+        return self.model.generate_content(contents=contents, tools=tools)
+
+    def stream_content(
+        self, contents: list[agents.Content], tools: list[agents.Tool]
+    ) -> T.Iterator[agents.Response]:
+        """Stream response chunks from contents and tools."""
+        yield from self.model.generate_content(contents=contents, tools=tools, stream=True)
+
+    def count_tokens(self, contents: list[agents.Content], tools: list[agents.Tool]) -> int:
+        """Count the input tokens of contents and tools."""
+        return int(self.model.count_tokens(contents=contents, tools=tools).total_tokens)
+
+
+class StubAgent:
+    """Agent backend that runs offline from recorded contents or rules.
+
+    Recorded contents are replayed by turn (number of agent contents in the
+    history), so a single stub can serve many sessions concurrently. Without
+    records, the first matching rule gives the response of each turn.
+    """
+
+    def __init__(
+        self,
+        records: list[agents.Content] | None = None,
+        rules: list["Rule"] | None = None,
+        latency: float = 0.0,
+    ) -> None:
+        """Initialize the backend from records or rules."""
+        self.records = records or []
+        self.rules = rules if rules is not None else [rule_open_url, rule_done]
+        self.latency = latency
+
+    def respond(self, contents: list[agents.Content]) -> agents.Content:
+        """Select the agent content that answers the given contents."""
+        turn = sum(content.role == agents.Role.AGENT.value for content in contents)
+        if turn < len(self.records):
+            return self.records[turn]
+        for rule in self.rules:
+            if content := rule(contents):
+                return content
+        return rule_done(contents)
+
+    def generate_content(
+        self, contents: list[agents.Content], tools: list[agents.Tool]
+    ) -> agents.Response:
+        """Generate a response from contents and tools."""
+        if self.latency:
+            time.sleep(self.latency)
+        content = self.respond(contents=contents)
+        prompt_tokens = self.count_tokens(contents=contents, tools=tools)
+        output_tokens = estimate_tokens(contents=[content])
+        usage = agents.Usage(
+            prompt_token_count=prompt_tokens,
+            candidates_token_count=output_tokens,
+            total_token_count=prompt_tokens + output_tokens,
+        )
+        return agents.to_response(content=content, usage=usage)
+
+    def stream_content(
+        self, contents: list[agents.Content], tools: list[agents.Tool]
+    ) -> T.Iterator[agents.Response]:
+        """Stream response chunks from contents and tools."""
+        yield self.generate_content(contents=contents, tools=tools)
+
+    def count_tokens(self, contents: list[agents.Content], tools: list[agents.Tool]) -> int:
+        """Count the input tokens of contents and tools (estimated)."""
+        return estimate_tokens(contents=contents)
+
+
+class RecordingAgent:
+    """Agent backend that records the responses of another backend."""
+
+    def __init__(self, agent: agents.Agent, path: str) -> None:
+        """Initialize the backend from an agent and a record path."""
+        self.agent = agent
+        self.path = path
+        self.lock = threading.Lock()
+
+    def record(self, content: agents.Content) -> None:
+        """Append the chosen content of a response to the record file."""
+        content = agents.Content(role=agents.Role.AGENT.value, parts=content.parts)
+        line = agents.Content.to_json(content, indent=None)
+        with self.lock, open(self.path, "a", encoding="utf-8") as file:
+            file.write(line + "\n")
+
+    def generate_content(
+        self, contents: list[agents.Content], tools: list[agents.Tool]
+    ) -> agents.Response:
+        """Generate a response from contents and tools (recorded once chosen)."""
+        return self.agent.generate_content(contents=contents, tools=tools)
+
+    def stream_content(
+        self, contents: list[agents.Content], tools: list[agents.Tool]
+    ) -> T.Iterator[agents.Response]:
+        """Stream response chunks from contents and tools."""
+        yield from self.agent.stream_content(contents=contents, tools=tools)
+
+    def count_tokens(self, contents: list[agents.Content], tools: list[agents.Tool]) -> int:
+        """Count the input tokens of contents and tools."""
+        return self.agent.count_tokens(contents=contents, tools=tools)
+
+
+# %% ALIASES
+
+Rule: T.TypeAlias = T.Callable[[list[agents.Content]], agents.Content | None]
+
+# %% FUNCTIONS
+
+
+def estimate_tokens(contents: list[agents.Content]) -> int:
+    """Estimate the tokens of contents without calling the API."""
+    chars, images = 0, 0
+    for content in contents:
+        for part in content.parts:
+            if part.inline_data:
+                images += 1
+            else:
+                chars += len(agents.Part.to_json(part, indent=None))
+    return chars // CHARS_PER_TOKEN + images * IMAGE_TOKENS
+
+
+def to_call(name: str, **kwargs: T.Any) -> agents.Content:
+    """Create an agent content that calls an action."""
+    call = agents.Call(name=name, args=kwargs)
+    return agents.Content(role=agents.Role.AGENT.value, parts=[agents.Part(function_call=call)])
+
+
+def rule_open_url(contents: list[agents.Content]) -> agents.Content | None:
+    """Open the first URL of the query on the first turn."""
+    if len(contents) != 1:
+        return None
+    text = " ".join(part.text for part in contents[0].parts if part.text)
+    if match := re.search(r"https?://[^\s'\"]+", text):
+        return to_call("get", url=match.group(0))
+    return None
+
+
+def rule_done(contents: list[agents.Content]) -> agents.Content:
+    """Stop the execution."""
+    return to_call("done")
+
+
+def record(agent: agents.Agent, content: agents.Content) -> None:
+    """Record the chosen content of a response with the recording agent (if any)."""
+    wrapped: T.Any = agent
+    while wrapped is not None:  # e.g., limited agents wrap the recording agent
+        if isinstance(wrapped, RecordingAgent):
+            return wrapped.record(content=content)
+        wrapped = getattr(wrapped, "agent", None)
+
+
+def load_records(path: str) -> list[agents.Content]:
+    """Load recorded agent contents from a JSONL file."""
+    with open(path, encoding="utf-8") as file:
+        return [agents.Content.from_json(line) for line in file if line.strip()]
+
+
+def init_agent_from_config(config: agents.AgentConfig) -> agents.Agent:
+    """Initialize an agent backend from config."""
+    agent: agents.Agent  # not assigned!
+    if config.backend == "gemini":
+        api_key = config.api_key.get_secret_value() if config.api_key else None
+        genai.configure(api_key=api_key)  # global assignment!
+        gen_config = agents.GenerationConfig(
+            temperature=config.temperature,
+            candidate_count=config.candidate_count,
+            max_output_tokens=config.max_output_tokens,
+        )
+        model = genai.GenerativeModel(
+            model_name=config.name,
+            generation_config=gen_config,
+            system_instruction=config.system_instructions,
+        )
+        agent = GeminiAgent(model=model)
+    elif config.backend == "stub":
+        records = load_records(path=config.stub_path) if config.stub_path else None
+        agent = StubAgent(records=records, latency=config.stub_latency)
+    else:
+        raise ValueError(
+            f"Cannot initialize agent from config (unknown backend name): {config.backend}!"
+        )
+    if config.record_path:
+        agent = RecordingAgent(agent=agent, path=config.record_path)
+    return agent
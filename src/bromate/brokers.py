@@ -0,0 +1,589 @@
+"""Queue the query jobs of the workers in brokers (SQLite, filesystem, Redis)."""
+
+# %% IMPORTS
+
+import contextlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import typing as T
+import uuid
+
+import pydantic as pdt
+
+from bromate import types
+
+# %% CONSTANTS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    query TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    worker TEXT,
+    deadline REAL,
+    result TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created);
+CREATE TABLE IF NOT EXISTS workers (
+    name TEXT PRIMARY KEY,
+    metrics TEXT NOT NULL,
+    updated REAL NOT NULL
+);
+"""
+# statuses of the jobs in the brokers
+STATUSES = ("queued", "leased", "done", "dead")
+
+# %% CLASSES
+
+
+class BrokerConfig(types.ImmutableData):
+    """Config for the broker."""
+
+    kind: T.Literal["sqlite", "filesystem", "redis"] = types.Field(
+        default="sqlite", description="Kind of broker to queue the jobs"
+    )
+    path: str = types.Field(
+        default="~/.bromate/queue",
+        description="Path of the broker (SQLite database or filesystem folder)",
+    )
+    url: str | None = types.Field(
+        default=None, description="URL of the Redis server (required by the redis kind)"
+    )
+    prefix: str = types.Field(default="bromate", description="Prefix of the Redis keys")
+    max_attempts: pdt.PositiveInt = types.Field(
+        default=3, description="Maximum number of attempts before a job is dead (poison job)"
+    )
+
+
+class Job(types.ImmutableData):
+    """Query job leased by a worker."""
+
+    id: str = types.Field(description="Id of the job")
+    query: str = types.Field(description="User query of the job")
+    attempts: int = types.Field(default=0, description="Number of leases of the job")
+    worker: str | None = types.Field(default=None, description="Worker leasing the job")
+    created: float = types.Field(default_factory=time.time, description="Creation time")
+
+
+class Result(types.ImmutableData):
+    """Result of a job published by a worker."""
+
+    job_id: str = types.Field(description="Id of the job")
+    status: T.Literal["done", "truncated", "dead"] = types.Field(
+        description="Final status of the job (truncated if it reached the maximum steps)"
+    )
+    worker: str | None = types.Field(default=None, description="Worker of the last attempt")
+    output: str = types.Field(default="", description="Last message of the agent")
+    url: str | None = types.Field(default=None, description="Last URL of the driver")
+    error: str | None = types.Field(default=None, description="Error of the last attempt")
+    steps: int = types.Field(default=0, description="Number of execution steps")
+    duration: float = types.Field(default=0.0, description="Duration of the last attempt")
+
+
+class Broker(T.Protocol):
+    """Alias for a broker of jobs (at-least-once delivery with leases)."""
+
+    def enqueue(self, query: str) -> str:
+        """Enqueue a query job and return its id."""
+
+    def lease(self, worker: str, duration: float) -> Job | None:
+        """Lease the next job (or an expired one) for a duration, or None if empty."""
+
+    def heartbeat(self, job: Job, duration: float) -> bool:
+        """Extend the lease of a job (False if the lease was lost)."""
+
+    def complete(self, job: Job, result: Result) -> bool:
+        """Complete a job with its result (False if the lease was lost)."""
+
+    def fail(self, job: Job, error: str) -> bool:
+        """Fail a job and return True if it will be retried (dead otherwise)."""
+
+    def result(self, job_id: str) -> Result | None:
+        """Return the result of a job, or None if not finished."""
+
+    def report(self, worker: str, metrics: dict[str, T.Any]) -> None:
+        """Publish the metrics of a worker."""
+
+    def stats(self) -> dict[str, int]:
+        """Return the number of jobs by status."""
+
+
+class SQLiteBroker:
+    """Broker on a SQLite database (processes on one host or a shared volume)."""
+
+    def __init__(self, path: str, max_attempts: int) -> None:
+        """Open (or create) the broker database."""
+        self.path = path
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            path, timeout=30.0, check_same_thread=False, isolation_level=None
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+
+    @contextlib.contextmanager
+    def transaction(self) -> T.Iterator[sqlite3.Connection]:
+        """Run statements in a transaction that locks the database for writes."""
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.connection
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+            self.connection.execute("COMMIT")
+
+    def enqueue(self, query: str) -> str:
+        """Enqueue a query job and return its id."""
+        job = Job(id=uuid.uuid4().hex, query=query)
+        with self.transaction() as connection:
+            connection.execute(
+                "INSERT INTO jobs VALUES (?, ?, 'queued', 0, NULL, NULL, NULL, ?, ?)",
+                (job.id, job.query, job.created, job.created),
+            )
+        return job.id
+
+    def lease(self, worker: str, duration: float) -> Job | None:
+        """Lease the next job (or an expired one) for a duration, or None if empty."""
+        now = time.time()
+        with self.transaction() as connection:
+            expired = connection.execute(
+                "SELECT id, worker FROM jobs WHERE status = 'leased' AND deadline < ? "
+                "AND attempts >= ?",
+                (now, self.max_attempts),
+            ).fetchall()
+            for job_id, owner in expired:
+                result = Result(job_id=job_id, status="dead", worker=owner, error="lease expired")
+                connection.execute(
+                    "UPDATE jobs SET status = 'dead', result = ?, updated = ? WHERE id = ?",
+                    (result.model_dump_json(), now, job_id),
+                )
+            row = connection.execute(
+                "SELECT id, query, attempts, created FROM jobs WHERE status = 'queued' "
+                "OR (status = 'leased' AND deadline < ?) ORDER BY created LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+            job_id, query, attempts, created = row
+            connection.execute(
+                "UPDATE jobs SET status = 'leased', worker = ?, deadline = ?, attempts = ?, "
+                "updated = ? WHERE id = ?",
+                (worker, now + duration, attempts + 1, now, job_id),
+            )
+        return Job(id=job_id, query=query, attempts=attempts + 1, worker=worker, created=created)
+
+    def heartbeat(self, job: Job, duration: float) -> bool:
+        """Extend the lease of a job (False if the lease was lost)."""
+        now = time.time()
+        with self.transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET deadline = ?, updated = ? "
+                "WHERE id = ? AND worker = ? AND attempts = ? AND status = 'leased'",
+                (now + duration, now, job.id, job.worker, job.attempts),
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, job: Job, result: Result) -> bool:
+        """Complete a job with its result (False if the lease was lost)."""
+        with self.transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET status = 'done', result = ?, updated = ? "
+                "WHERE id = ? AND worker = ? AND attempts = ? AND status = 'leased'",
+                (result.model_dump_json(), time.time(), job.id, job.worker, job.attempts),
+            )
+        return cursor.rowcount == 1
+
+    def fail(self, job: Job, error: str) -> bool:
+        """Fail a job and return True if it will be retried (dead otherwise).
+
+        A job whose lease was lost is left to its new worker (and will be retried).
+        """
+        retried = job.attempts < self.max_attempts
+        with self.transaction() as connection:
+            if retried:
+                connection.execute(
+                    "UPDATE jobs SET status = 'queued', worker = NULL, deadline = NULL, "
+                    "updated = ? WHERE id = ? AND worker = ? AND attempts = ? AND status = 'leased'",
+                    (time.time(), job.id, job.worker, job.attempts),
+                )
+                return True
+            result = Result(job_id=job.id, status="dead", worker=job.worker, error=error)
+            cursor = connection.execute(
+                "UPDATE jobs SET status = 'dead', result = ?, updated = ? "
+                "WHERE id = ? AND worker = ? AND attempts = ? AND status = 'leased'",
+                (result.model_dump_json(), time.time(), job.id, job.worker, job.attempts),
+            )
+        return cursor.rowcount == 0
+
+    def result(self, job_id: str) -> Result | None:
+        """Return the result of a job, or None if not finished."""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT result FROM jobs WHERE id = ? AND status IN ('done', 'dead')", (job_id,)
+            ).fetchone()
+        return Result.model_validate_json(row[0]) if row else None
+
+    def report(self, worker: str, metrics: dict[str, T.Any]) -> None:
+        """Publish the metrics of a worker."""
+        with self.transaction() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO workers VALUES (?, ?, ?)",
+                (worker, json.dumps(metrics), time.time()),
+            )
+
+    def stats(self) -> dict[str, int]:
+        """Return the number of jobs by status."""
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+            ).fetchall()
+        return {status: 0 for status in STATUSES} | dict(rows)
+
+
+class FileBroker:
+    """Broker on a filesystem folder (processes on hosts sharing a volume).
+
+    Jobs are JSON files moved between status folders: a rename is atomic, so
+    only one worker can claim a queued or expired job.
+    """
+
+    def __init__(self, path: str, max_attempts: int) -> None:
+        """Create the status folders of the broker."""
+        self.path = path
+        self.max_attempts = max_attempts
+        for folder in (*STATUSES, "workers"):
+            os.makedirs(os.path.join(path, folder), exist_ok=True)
+
+    def file(self, status: str, job: Job) -> str:
+        """Return the file of a job in a status folder (ordered by creation)."""
+        name = (
+            f"{job.id}.json"
+            if status in ("done", "dead")
+            else f"{job.created:017.6f}-{job.id}.json"
+        )
+        return os.path.join(self.path, status, name)
+
+    def write(self, path: str, data: types.Data, create: bool = True) -> None:
+        """Write data to a file atomically (or in place if the file must exist)."""
+        if create is False:
+            with open(path, "r+") as file:  # fail if the lease was lost
+                file.write(data.model_dump_json())
+                file.truncate()
+            return
+        temp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp, "w") as file:
+            file.write(data.model_dump_json())
+        os.replace(temp, path)
+
+    def read(self, path: str) -> Job | None:
+        """Read a job file, or None if it was moved by another worker."""
+        try:
+            with open(path) as file:
+                return Job.model_validate_json(file.read())
+        except (FileNotFoundError, pdt.ValidationError):
+            return None
+
+    def enqueue(self, query: str) -> str:
+        """Enqueue a query job and return its id."""
+        job = Job(id=uuid.uuid4().hex, query=query)
+        self.write(path=self.file(status="queued", job=job), data=job)
+        return job.id
+
+    def lease(self, worker: str, duration: float) -> Job | None:
+        """Lease the next job (or an expired one) for a duration, or None if empty."""
+        now = time.time()
+        for name in sorted(os.listdir(os.path.join(self.path, "leased"))):
+            leased = os.path.join(self.path, "leased", name)
+            if not name.endswith(".json") or os.path.getmtime(leased) + duration >= now:
+                continue  # lease still valid (mtime refreshed by heartbeats)
+            if (job := self.read(path=leased)) is None:
+                continue
+            try:
+                if job.attempts < self.max_attempts:
+                    os.rename(leased, self.file(status="queued", job=job))
+                else:  # poison job
+                    os.remove(leased)
+                    result = Result(
+                        job_id=job.id, status="dead", worker=job.worker, error="lease expired"
+                    )
+                    self.write(path=self.file(status="dead", job=job), data=result)
+            except FileNotFoundError:
+                continue  # recovered by another worker
+        for name in sorted(os.listdir(os.path.join(self.path, "queued"))):
+            if not name.endswith(".json"):
+                continue
+            queued = os.path.join(self.path, "queued", name)
+            leased = os.path.join(self.path, "leased", name)
+            try:
+                os.rename(queued, leased)  # claim
+                os.utime(leased)  # start the lease
+            except FileNotFoundError:
+                continue  # claimed by another worker
+            if (job := self.read(path=leased)) is None:
+                continue
+            job = job.model_copy(update={"attempts": job.attempts + 1, "worker": worker})
+            self.write(path=leased, data=job)
+            return job
+        return None
+
+    def owns(self, job: Job) -> bool:
+        """Check if the worker of a job still holds its lease."""
+        current = self.read(path=self.file(status="leased", job=job))
+        return current is not None and (current.worker, current.attempts) == (
+            job.worker,
+            job.attempts,
+        )
+
+    def heartbeat(self, job: Job, duration: float) -> bool:
+        """Extend the lease of a job (False if the lease was lost)."""
+        if not self.owns(job=job):
+            return False
+        try:
+            self.write(path=self.file(status="leased", job=job), data=job, create=False)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def complete(self, job: Job, result: Result) -> bool:
+        """Complete a job with its result (False if the lease was lost)."""
+        if not self.owns(job=job):
+            return False
+        self.write(path=self.file(status="done", job=job), data=result)
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.file(status="leased", job=job))
+        return True
+
+    def fail(self, job: Job, error: str) -> bool:
+        """Fail a job and return True if it will be retried (dead otherwise).
+
+        A job whose lease was lost is left to its new worker (and will be retried).
+        """
+        leased = self.file(status="leased", job=job)
+        if not self.owns(job=job):
+            return True
+        if job.attempts < self.max_attempts:
+            with contextlib.suppress(FileNotFoundError):
+                os.rename(leased, self.file(status="queued", job=job))
+            return True
+        result = Result(job_id=job.id, status="dead", worker=job.worker, error=error)
+        self.write(path=self.file(status="dead", job=job), data=result)
+        for path in (leased, self.file(status="queued", job=job)):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+        return False
+
+    def result(self, job_id: str) -> Result | None:
+        """Return the result of a job, or None if not finished."""
+        for status in ("done", "dead"):
+            path = os.path.join(self.path, status, f"{job_id}.json")
+            with contextlib.suppress(FileNotFoundError), open(path) as file:
+                return Result.model_validate_json(file.read())
+        return None
+
+    def report(self, worker: str, metrics: dict[str, T.Any]) -> None:
+        """Publish the metrics of a worker."""
+        path = os.path.join(self.path, "workers", f"{worker.replace(os.sep, '_')}.json")
+        with open(path, "w") as file:
+            json.dump(metrics, file)
+
+    def stats(self) -> dict[str, int]:
+        """Return the number of jobs by status."""
+        return {
+            status: sum(
+                1 for name in os.listdir(os.path.join(self.path, status)) if name.endswith(".json")
+            )
+            for status in STATUSES
+        }
+
+
+class Redis(T.Protocol):
+    """Alias for the subset of Redis commands used by the broker."""
+
+    def lpush(self, name: str, *values: str) -> int:
+        """Push values at the head of a list."""
+
+    def rpoplpush(self, src: str, dst: str) -> str | None:
+        """Pop a value from the tail of a list and push it at the head of another."""
+
+    def lrem(self, name: str, count: int, value: str) -> int:
+        """Remove values from a list."""
+
+    def llen(self, name: str) -> int:
+        """Return the length of a list."""
+
+    def zadd(self, name: str, mapping: dict[str, float]) -> int:
+        """Add members with scores to a sorted set."""
+
+    def zrem(self, name: str, *values: str) -> int:
+        """Remove members from a sorted set."""
+
+    def zrangebyscore(self, name: str, min: float | str, max: float | str) -> list[str]:
+        """Return the members of a sorted set within a score range."""
+
+    def zscore(self, name: str, value: str) -> float | None:
+        """Return the score of a member of a sorted set (None if missing)."""
+
+    def hset(self, name: str, mapping: dict[str, str]) -> int:
+        """Set the fields of a hash."""
+
+    def hget(self, name: str, key: str) -> str | None:
+        """Get a field of a hash."""
+
+    def hgetall(self, name: str) -> dict[str, str]:
+        """Get all the fields of a hash."""
+
+    def hincrby(self, name: str, key: str, amount: int = 1) -> int:
+        """Increment a field of a hash."""
+
+
+class RedisBroker:
+    """Broker on a Redis server (processes on many hosts).
+
+    Jobs are moved atomically from the queue list to the leased list, and
+    their lease deadlines are kept in a sorted set to recover expired leases.
+    """
+
+    def __init__(self, client: Redis, prefix: str, max_attempts: int) -> None:
+        """Initialize the broker with a Redis client."""
+        self.client = client
+        self.prefix = prefix
+        self.max_attempts = max_attempts
+
+    def key(self, *names: str) -> str:
+        """Return a Redis key with the broker prefix."""
+        return ":".join((self.prefix, *names))
+
+    def enqueue(self, query: str) -> str:
+        """Enqueue a query job and return its id."""
+        job = Job(id=uuid.uuid4().hex, query=query)
+        self.client.hset(self.key("job", job.id), mapping={"job": job.model_dump_json()})
+        self.client.lpush(self.key("queue"), job.id)
+        return job.id
+
+    def lease(self, worker: str, duration: float) -> Job | None:
+        """Lease the next job (or an expired one) for a duration, or None if empty."""
+        for job_id in self.client.zrangebyscore(self.key("leases"), "-inf", time.time()):
+            if self.client.zrem(self.key("leases"), job_id) != 1:
+                continue  # recovered by another worker
+            self.client.lrem(self.key("leased"), 0, job_id)
+            if (job := self.job(job_id=job_id)) is None:
+                continue
+            if job.attempts < self.max_attempts:
+                self.client.lpush(self.key("queue"), job_id)
+            else:  # poison job
+                result = Result(
+                    job_id=job_id, status="dead", worker=job.worker, error="lease expired"
+                )
+                self.finish(job=job, result=result)
+        leased = self.client.rpoplpush(self.key("queue"), self.key("leased"))
+        if leased is None or (job := self.job(job_id=leased)) is None:
+            return None
+        job = job.model_copy(update={"attempts": job.attempts + 1, "worker": worker})
+        self.client.hset(self.key("job", job.id), mapping={"job": job.model_dump_json()})
+        self.client.zadd(self.key("leases"), {job.id: time.time() + duration})
+        return job
+
+    def job(self, job_id: str) -> Job | None:
+        """Return a job given its id."""
+        data = self.client.hget(self.key("job", job_id), "job")
+        return Job.model_validate_json(data) if data else None
+
+    def finish(self, job: Job, result: Result) -> None:
+        """Store the result of a job and remove its lease."""
+        self.client.hset(self.key("job", job.id), mapping={"result": result.model_dump_json()})
+        self.client.zrem(self.key("leases"), job.id)
+        self.client.lrem(self.key("leased"), 0, job.id)
+        self.client.hincrby(self.key("stats"), "dead" if result.status == "dead" else "done")
+
+    def owns(self, job: Job) -> bool:
+        """Check if the worker of a job still holds its lease."""
+        current = self.job(job_id=job.id)
+        if current is None or (current.worker, current.attempts) != (job.worker, job.attempts):
+            return False  # leased by another worker
+        return self.client.zscore(self.key("leases"), job.id) is not None  # not recovered
+
+    def heartbeat(self, job: Job, duration: float) -> bool:
+        """Extend the lease of a job (False if the lease was lost)."""
+        if not self.owns(job=job):
+            return False
+        if not self.client.zrem(self.key("leases"), job.id):
+            return False  # expired and recovered
+        self.client.zadd(self.key("leases"), {job.id: time.time() + duration})
+        return True
+
+    def complete(self, job: Job, result: Result) -> bool:
+        """Complete a job with its result (False if the lease was lost)."""
+        if not self.owns(job=job):
+            return False
+        self.finish(job=job, result=result)
+        return True
+
+    def fail(self, job: Job, error: str) -> bool:
+        """Fail a job and return True if it will be retried (dead otherwise).
+
+        A job whose lease was lost is left to its new worker (and will be retried).
+        """
+        if not self.owns(job=job):
+            return True
+        if job.attempts >= self.max_attempts:
+            result = Result(job_id=job.id, status="dead", worker=job.worker, error=error)
+            self.finish(job=job, result=result)
+            return False
+        self.client.zrem(self.key("leases"), job.id)
+        if self.client.lrem(self.key("leased"), 0, job.id):
+            self.client.lpush(self.key("queue"), job.id)
+        return True
+
+    def result(self, job_id: str) -> Result | None:
+        """Return the result of a job, or None if not finished."""
+        data = self.client.hget(self.key("job", job_id), "result")
+        return Result.model_validate_json(data) if data else None
+
+    def report(self, worker: str, metrics: dict[str, T.Any]) -> None:
+        """Publish the metrics of a worker."""
+        self.client.hset(self.key("workers"), mapping={worker: json.dumps(metrics)})
+
+    def stats(self) -> dict[str, int]:
+        """Return the number of jobs by status."""
+        counts = {key: int(val) for key, val in self.client.hgetall(self.key("stats")).items()}
+        return {
+            "queued": self.client.llen(self.key("queue")),
+            "leased": self.client.llen(self.key("leased")),
+            "done": counts.get("done", 0),
+            "dead": counts.get("dead", 0),
+        }
+
+
+# %% FUNCTIONS
+
+
+def worker_name() -> str:
+    """Return a unique name for the worker of this process."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def init_broker_from_config(config: BrokerConfig) -> Broker:
+    """Initialize a broker from config."""
+    path = os.path.expanduser(config.path)
+    if config.kind == "sqlite":
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        return SQLiteBroker(path=path, max_attempts=config.max_attempts)
+    if config.kind == "filesystem":
+        return FileBroker(path=path, max_attempts=config.max_attempts)
+    if config.url is None:
+        raise ValueError(f"Cannot connect to Redis (missing broker url): {config.url}!")
+    try:
+        import redis  # optional dependency
+    except ImportError as error:
+        raise ValueError(f"Cannot connect to Redis (install the redis extra): {error}!") from error
+    client: Redis = redis.Redis.from_url(config.url, decode_responses=True)
+    return RedisBroker(client=client, prefix=config.prefix, max_attempts=config.max_attempts)
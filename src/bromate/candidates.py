@@ -0,0 +1,154 @@
+"""Validate the candidates of the agent and pick the first valid one."""
+
+# %% IMPORTS
+
+import concurrent.futures
+import functools
+import inspect
+import typing as T
+
+import pydantic as pdt
+
+from bromate import actions, agents, documents, drivers, groundings, healings, types
+
+# %% CONSTANTS
+
+# actions that can load another page (the next selectors target it)
+NAVIGATIONS = [
+    actions.get.__name__,
+    actions.back.__name__,
+    actions.forward.__name__,
+    actions.click.__name__,
+    actions.submit.__name__,
+]
+
+# %% CLASSES
+
+
+class CandidateConfig(types.ImmutableData):
+    """Config for the candidates."""
+
+    enabled: bool = types.Field(
+        default=False,
+        description="Validate the candidate actions on the page and pick the first valid one",
+    )
+    max_workers: pdt.PositiveInt = types.Field(
+        default=4, description="Maximum number of candidates validated in parallel (HTTP mode)"
+    )
+
+
+class CandidateMetrics(types.MutableData):
+    """Metrics of the candidates."""
+
+    responses: int = types.Field(default=0, description="Number of responses with candidates")
+    candidates: int = types.Field(default=0, description="Number of candidates validated")
+    invalid: int = types.Field(default=0, description="Number of invalid candidates")
+    recovered: int = types.Field(
+        default=0, description="Number of invalid first candidates replaced by a valid one"
+    )
+    unrecovered: int = types.Field(
+        default=0, description="Number of responses without valid candidates"
+    )
+
+    @property
+    def recovery_rate(self) -> float:
+        """Ratio of invalid first candidates replaced (each one avoids a retry round trip)."""
+        failed = self.recovered + self.unrecovered
+        return self.recovered / failed if failed else 0.0
+
+
+class Chooser:
+    """Chooser of the first valid candidate of the agent responses."""
+
+    def __init__(self, config: CandidateConfig) -> None:
+        """Initialize the chooser from config."""
+        self.config = config
+        self.metrics = CandidateMetrics()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=config.max_workers)
+
+    def choose(
+        self, response: agents.Response, driver: drivers.Driver, config: actions.ActionConfig
+    ) -> agents.Content:
+        """Choose the first valid candidate of a response (the first one if none is valid)."""
+        contents = [candidate.content for candidate in response.candidates]
+        if self.config.enabled is False or len(contents) < 2:
+            return contents[0]
+        self.metrics.responses += 1
+        self.metrics.candidates += len(contents)
+        if isinstance(driver, drivers.HttpDriver) and driver.browser is None:
+            errors = list(
+                self.executor.map(lambda content: validate(content, driver, config), contents)
+            )
+        else:  # one at a time: the browser sessions are not thread-safe
+            errors = [validate(content, driver, config) for content in contents]
+        self.metrics.invalid += sum(1 for error in errors if error)
+        index = next((i for i, error in enumerate(errors) if not error), None)
+        if index is None:
+            self.metrics.unrecovered += 1
+            return contents[0]
+        if index > 0:
+            self.metrics.recovered += 1
+        return contents[index]
+
+    def close(self) -> None:
+        """Shutdown the validation threads."""
+        self.executor.shutdown(wait=False)
+
+
+# %% FUNCTIONS
+
+
+@functools.cache
+def adapter(hint: T.Any) -> pdt.TypeAdapter[T.Any]:
+    """Return the type adapter of an action parameter (cached)."""
+    return pdt.TypeAdapter(hint)
+
+
+def check(name: str, kwargs: dict[str, T.Any]) -> str | None:
+    """Check the arguments of an action call and return the error (if any)."""
+    action = getattr(actions, name)
+    hints = T.get_type_hints(action)
+    try:
+        inspect.signature(action).bind(driver=None, config=None, **kwargs)
+        for key, val in kwargs.items():
+            adapter(hints[key]).validate_python(val)
+    except (TypeError, pdt.ValidationError) as error:
+        return f"Invalid arguments for {name}: {error}"
+    return None
+
+
+def resolves(driver: drivers.Driver, css_selector: str) -> bool | None:
+    """Check if a CSS selector resolves on the current page (None if unknown)."""
+    if isinstance(driver, drivers.HttpDriver) and driver.browser is None:
+        try:  # unsupported selectors escalate to the browser
+            return bool(driver.page.document.select(css=css_selector))
+        except documents.SelectorError:
+            return None
+    return bool(healings.matches(driver=driver, css_selector=css_selector))
+
+
+def validate(
+    content: agents.Content, driver: drivers.Driver, config: actions.ActionConfig
+) -> list[str]:
+    """Validate the action calls of a content on the current page and return the errors."""
+    errors, names = [], {function.name for function in actions.AGENT_FUNCTIONS}
+    navigated = False  # the next selectors target another page
+    for part in content.parts:
+        if not (call := part.function_call):
+            continue
+        name, kwargs = call.name, dict(call.args)
+        if name not in names:
+            errors.append(f"Unknown action: {name}")
+            continue
+        if error := check(name=name, kwargs=kwargs):
+            errors.append(error)
+            continue
+        mark, selector = kwargs.get("mark"), kwargs.get("css_selector")
+        if mark is not None:
+            selector = groundings.selector(mark=mark)
+        if navigated is False and selector is not None:
+            resolved = resolves(driver=driver, css_selector=selector)
+            if resolved is False:  # unknown if the selector is not supported in http mode
+                errors.append(f"Selector does not resolve for {name}: {selector}")
+        navigated = navigated or name in NAVIGATIONS
+    return errors
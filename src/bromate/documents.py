@@ -0,0 +1,323 @@
+"""Parse and query HTML documents without a browser."""
+
+# %% IMPORTS
+
+import html.parser
+import re
+import typing as T
+
+# %% CONSTANTS
+
+# elements without an end tag
+VOID_TAGS = {
+    "area",
+    "base",
+    "br",
+    "col",
+    "embed",
+    "hr",
+    "img",
+    "input",
+    "link",
+    "meta",
+    "param",
+    "source",
+    "track",
+    "wbr",
+}
+# elements closed implicitly by a sibling of the same tag
+SIBLING_TAGS = {"dd", "dt", "li", "option", "p", "td", "th", "tr"}
+# elements closing an open paragraph
+BLOCK_TAGS = {
+    "address",
+    "article",
+    "aside",
+    "blockquote",
+    "div",
+    "dl",
+    "fieldset",
+    "footer",
+    "form",
+    "h1",
+    "h2",
+    "h3",
+    "h4",
+    "h5",
+    "h6",
+    "header",
+    "hr",
+    "main",
+    "nav",
+    "ol",
+    "pre",
+    "section",
+    "table",
+    "ul",
+}
+# elements whose text is not displayed
+HIDDEN_TAGS = {"head", "noscript", "script", "style", "template"}
+# simple selectors, combinators, and groups of CSS selectors
+SIMPLE = re.compile(
+    r"""
+    (?P<tag>\*|[a-zA-Z][\w-]*)
+    | \#(?P<id>[\w-]+)
+    | \.(?P<cls>[\w-]+)
+    | \[\s*(?P<attr>[\w:-]+)\s*
+        (?:(?P<op>[~|^$*]?=)\s*(?P<val>"[^"]*"|'[^']*'|[^\]\s]+)\s*)?\]
+    | :(?P<pseudo>[\w-]+)(?:\((?P<arg>[^)]*)\))?
+    """,
+    re.VERBOSE,
+)
+COMBINATOR = re.compile(r"\s*([>+~])\s*|\s+")
+GROUP = re.compile(r",(?![^\[]*\])")
+
+# %% EXCEPTIONS
+
+
+class SelectorError(ValueError):
+    """CSS selector is not supported."""
+
+
+# %% CLASSES
+
+
+class Node:
+    """Element of an HTML document."""
+
+    __slots__ = ("attrs", "children", "parent", "tag")
+
+    def __init__(self, tag: str, attrs: dict[str, str], parent: "Node | None" = None) -> None:
+        """Initialize the node from a tag and attributes."""
+        self.tag = tag
+        self.attrs = attrs
+        self.parent = parent
+        self.children: list[Node | str] = []
+
+    def __repr__(self) -> str:
+        """Represent the node as its start tag."""
+        attrs = "".join(f' {key}="{val}"' for key, val in self.attrs.items())
+        return f"<{self.tag}{attrs}>"
+
+    @property
+    def elements(self) -> list["Node"]:
+        """Return the element children of the node."""
+        return [child for child in self.children if isinstance(child, Node)]
+
+    def iter(self) -> T.Iterator["Node"]:
+        """Iterate the descendants of the node in document order."""
+        for child in self.elements:
+            yield child
+            yield from child.iter()
+
+    def ancestors(self) -> T.Iterator["Node"]:
+        """Iterate the ancestors of the node from the closest."""
+        node = self.parent
+        while node is not None:
+            yield node
+            node = node.parent
+
+    def text(self) -> str:
+        """Return the displayed text of the node (whitespace collapsed)."""
+        texts: list[str] = []
+
+        def collect(node: Node) -> None:
+            for child in node.children:
+                if isinstance(child, str):
+                    texts.append(child)
+                elif child.tag not in HIDDEN_TAGS:
+                    collect(child)
+
+        collect(self)
+        return " ".join(" ".join(texts).split())
+
+    def select(self, css: str) -> list["Node"]:
+        """Select the descendants matching a CSS selector."""
+        return select(self, css=css)
+
+    def select_one(self, css: str) -> "Node | None":
+        """Select the first descendant matching a CSS selector."""
+        return next(iter(self.select(css=css)), None)
+
+
+class Parser(html.parser.HTMLParser):
+    """Tolerant parser from HTML text to nodes."""
+
+    def __init__(self) -> None:
+        """Initialize the parser with an empty document."""
+        super().__init__(convert_charrefs=True)
+        self.root = Node(tag="#document", attrs={})
+        self.stack = [self.root]
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        """Open an element (and close an implicitly ended element)."""
+        current = self.stack[-1].tag
+        if (tag in SIBLING_TAGS and current == tag) or (tag in BLOCK_TAGS and current == "p"):
+            self.stack.pop()
+        node = Node(tag=tag, attrs={key: val or "" for key, val in attrs}, parent=self.stack[-1])
+        self.stack[-1].children.append(node)
+        if tag not in VOID_TAGS:
+            self.stack.append(node)
+
+    def handle_startendtag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        """Open and close an element."""
+        self.handle_starttag(tag=tag, attrs=attrs)
+        if tag not in VOID_TAGS:
+            self.stack.pop()
+
+    def handle_endtag(self, tag: str) -> None:
+        """Close an element (ignore stray end tags)."""
+        if any(node.tag == tag for node in self.stack[1:]):
+            while self.stack.pop().tag != tag:
+                pass
+
+    def handle_data(self, data: str) -> None:
+        """Add text to the current element."""
+        self.stack[-1].children.append(data)
+
+
+# %% ALIASES
+
+Simple: T.TypeAlias = tuple[str, str, str, str]  # kind, name, operator, value
+Step: T.TypeAlias = tuple[str, list[Simple]]  # combinator, simples
+
+# %% FUNCTIONS
+
+
+def parse_selector(css: str) -> list[list[Step]]:
+    """Parse a CSS selector into groups of steps (supported subset)."""
+    groups: list[list[Step]] = []
+    for text in GROUP.split(css.strip()):
+        steps: list[Step] = []
+        combinator, pos, text = " ", 0, text.strip()
+        while pos < len(text):
+            if steps and (match := COMBINATOR.match(text, pos)) and match.end() > pos:
+                if match.end() == len(text):
+                    raise SelectorError(f"Cannot parse CSS selector (dangling combinator): {css}")
+                combinator, pos = match.group(1) or " ", match.end()
+                continue
+            simples: list[Simple] = []
+            while pos < len(text) and (match := SIMPLE.match(text, pos)):
+                kind = T.cast(str, match.lastgroup)
+                if match.group("attr") is not None:
+                    value = (match.group("val") or "").strip("\"'")
+                    simples.append(("attr", match.group("attr"), match.group("op") or "", value))
+                elif match.group("pseudo") is not None:
+                    simples.append(("pseudo", match.group("pseudo"), "", match.group("arg") or ""))
+                else:
+                    simples.append((kind, match.group(kind), "", ""))
+                pos = match.end()
+            if not simples:
+                raise SelectorError(f"Cannot parse CSS selector at position {pos}: {css}")
+            steps.append((combinator, simples))
+        if not steps:
+            raise SelectorError(f"Cannot parse CSS selector (empty group): {css}")
+        groups.append(steps)
+    return groups
+
+
+def match_nth(index: int, arg: str) -> bool:
+    """Match a 1-based index against an nth expression (e.g., 2, odd, 2n+1)."""
+    arg = arg.replace(" ", "").lower()
+    if arg == "odd":
+        return index % 2 == 1
+    if arg == "even":
+        return index % 2 == 0
+    if arg.isdigit():
+        return index == int(arg)
+    if match := re.fullmatch(r"([+-]?\d*)n([+-]\d+)?", arg):
+        step = int(match.group(1) + "1" if match.group(1) in ("", "+", "-") else match.group(1))
+        offset = int(match.group(2) or 0)
+        if step == 0:
+            return index == offset
+        return (index - offset) % step == 0 and (index - offset) // step >= 0
+    raise SelectorError(f"Cannot parse nth expression: {arg}")
+
+
+def match_simple(node: Node, simple: Simple) -> bool:
+    """Match a node against a simple selector."""
+    kind, name, operator, value = simple
+    if kind == "tag":
+        return name == "*" or node.tag == name.lower()
+    if kind == "id":
+        return node.attrs.get("id") == name
+    if kind == "cls":
+        return name in node.attrs.get("class", "").split()
+    if kind == "attr":
+        if name not in node.attrs:
+            return False
+        actual = node.attrs[name]
+        match operator:
+            case "":
+                return True
+            case "=":
+                return actual == value
+            case "~=":
+                return value in actual.split()
+            case "|=":
+                return actual == value or actual.startswith(value + "-")
+            case "^=":
+                return bool(value) and actual.startswith(value)
+            case "$=":
+                return bool(value) and actual.endswith(value)
+            case "*=":
+                return bool(value) and value in actual
+    if kind == "pseudo":
+        siblings = node.parent.elements if node.parent else [node]
+        typed = [sibling for sibling in siblings if sibling.tag == node.tag]
+        match name:
+            case "first-child":
+                return siblings[0] is node
+            case "last-child":
+                return siblings[-1] is node
+            case "only-child":
+                return len(siblings) == 1
+            case "first-of-type":
+                return typed[0] is node
+            case "last-of-type":
+                return typed[-1] is node
+            case "nth-child":
+                return match_nth(siblings.index(node) + 1, value)
+            case "nth-of-type":
+                return match_nth(typed.index(node) + 1, value)
+            case "nth-last-child":
+                return match_nth(len(siblings) - siblings.index(node), value)
+            case "not":
+                return not any(match_steps(node, steps) for steps in parse_selector(value))
+            case "checked":
+                return "checked" in node.attrs or "selected" in node.attrs
+            case "disabled":
+                return "disabled" in node.attrs
+    raise SelectorError(f"Cannot match CSS selector (unsupported {kind}): {name}")
+
+
+def match_steps(node: Node, steps: list[Step]) -> bool:
+    """Match a node against the steps of a selector (from right to left)."""
+    combinator, simples = steps[-1]
+    if not all(match_simple(node, simple) for simple in simples):
+        return False
+    if len(steps) == 1:
+        return True
+    rest = steps[:-1]
+    if combinator == ">":
+        return node.parent is not None and match_steps(node.parent, rest)
+    if combinator == " ":
+        return any(match_steps(ancestor, rest) for ancestor in node.ancestors())
+    siblings = node.parent.elements if node.parent else [node]
+    previous = siblings[: siblings.index(node)]
+    if combinator == "+":
+        return bool(previous) and match_steps(previous[-1], rest)
+    return any(match_steps(sibling, rest) for sibling in previous)  # ~
+
+
+def parse(text: str) -> Node:
+    """Parse an HTML text into a document node."""
+    parser = Parser()
+    parser.feed(text)
+    parser.close()
+    return parser.root
+
+
+def select(root: Node, css: str) -> list[Node]:
+    """Select the descendants of a node matching a CSS selector."""
+    groups = parse_selector(css=css)
+    return [node for node in root.iter() if any(match_steps(node, steps) for steps in groups)]
@@ -2,13 +2,60 @@
 
 # %% IMPORTS
 
+import codecs
+import concurrent.futures
+import functools
+import http.cookies
+import os
+import re
+import threading
+import time
 import typing as T
+import urllib.parse
 
+import pydantic as pdt
 import selenium.webdriver as wd
+import urllib3
+from loguru import logger
+from selenium.common import exceptions
 from selenium.webdriver.common import alert, by
+from selenium.webdriver.remote import webelement
 from selenium.webdriver.support import select
 
-from bromate import types
+from bromate import documents, types
+
+# %% CONSTANTS
+
+# script to collect the web storages of the current page
+STORAGE_SCRIPT = """
+const dump = (storage) => Object.fromEntries(Object.keys(storage).map((k) => [k, storage.getItem(k)]));
+return {local: dump(localStorage), session: dump(sessionStorage)};
+"""
+# script to restore the web storages of the current page
+RESTORE_SCRIPT = """
+const [local, session] = arguments;
+for (const [key, val] of Object.entries(local)) localStorage.setItem(key, val);
+for (const [key, val] of Object.entries(session)) sessionStorage.setItem(key, val);
+"""
+# script to show a page loaded by a form submission in the browser (without submitting again)
+WRITE_SCRIPT = """
+const [url, source] = arguments;
+history.replaceState(null, '', url);
+document.open();
+document.write(source);
+document.close();
+"""
+# script to set the value of a field typed in HTTP mode (with the events of typing)
+TYPE_SCRIPT = """
+const [element, value] = arguments;
+element.value = value;
+element.dispatchEvent(new Event('input', {bubbles: true}));
+element.dispatchEvent(new Event('change', {bubbles: true}));
+"""
+# cookie keys accepted by the browsers
+COOKIE_KEYS = {"name", "value", "path", "domain", "secure", "httpOnly", "expiry", "sameSite"}
+# second-level labels of the country domains (e.g., co.uk, com.au)
+SECOND_LEVELS = {"ac", "co", "com", "edu", "gov", "ne", "net", "or", "org"}
 
 # %% CLASSES
 
@@ -25,6 +72,378 @@ class DriverConfig(types.ImmutableData):
     maximize_window: bool = types.Field(
         default=True, description="Maximize the browser window at the start of the execution"
     )
+    http_mode: bool = types.Field(
+        default=False,
+        description="Load static pages over HTTP and start the browser only when scripts are required",
+    )
+    http_timeout: pdt.PositiveFloat = types.Field(
+        default=10.0, description="Timeout (in seconds) of the HTTP requests"
+    )
+    http_pool_size: pdt.PositiveInt = types.Field(
+        default=10, description="Number of HTTP connections kept alive per host"
+    )
+    http_min_text: pdt.NonNegativeInt = types.Field(
+        default=200, description="Minimum text length of a page with scripts to stay in HTTP mode"
+    )
+    http_user_agent: str = types.Field(
+        default="Mozilla/5.0 (compatible; bromate)", description="User agent of the HTTP requests"
+    )
+    profile_path: str | None = types.Field(
+        default=None, description="Profile folder of the browser to reuse (e.g., with logins)"
+    )
+
+
+class SessionConfig(types.ImmutableData):
+    """Config for the session snapshots."""
+
+    path: str | None = types.Field(
+        default=None, description="Folder of the session snapshots (disabled if null)"
+    )
+    user: str = types.Field(default="default", description="User key of the session snapshots")
+    sites: list[str] = types.Field(
+        default=[], description="Sites to restore in addition to the sites of the query URLs"
+    )
+    ttl: pdt.PositiveFloat = types.Field(
+        default=24 * 3600.0, description="Time to live (in seconds) of a session snapshot"
+    )
+    check: str | None = types.Field(
+        default=None, description="CSS selector found on authenticated pages to validate a session"
+    )
+    save: bool = types.Field(
+        default=True, description="Save the session of the last site at the end of the execution"
+    )
+
+
+class Session(types.ImmutableData):
+    """Snapshot of the browser state of a site for a user."""
+
+    site: str = types.Field(description="Registrable domain of the site (with its port)")
+    user: str = types.Field(description="User key of the snapshot")
+    url: str = types.Field(description="URL of the page when the snapshot was saved")
+    created: float = types.Field(default_factory=time.time, description="Creation time")
+    cookies: list[dict[str, T.Any]] = types.Field(default=[], description="Cookies of the site")
+    local_storage: dict[str, str] = types.Field(default={}, description="Local storage")
+    session_storage: dict[str, str] = types.Field(default={}, description="Session storage")
+
+    def expired(self, ttl: float) -> bool:
+        """Check if the snapshot or all its expiring cookies are expired."""
+        now = time.time()
+        expiries = [cookie["expiry"] for cookie in self.cookies if "expiry" in cookie]
+        return self.created + ttl < now or (bool(expiries) and max(expiries) < now)
+
+
+class Page(T.NamedTuple):
+    """Page loaded over HTTP."""
+
+    url: str
+    source: str
+    document: documents.Node
+    cookies: dict[str, dict[str, str]] | None = None  # received (host -> name -> value)
+    method: str = "GET"  # method of the last request (e.g., POST for a form submission)
+
+
+class HttpElement:
+    """Element of a page loaded over HTTP."""
+
+    def __init__(self, driver: "HttpDriver", node: documents.Node, css_selector: str) -> None:
+        """Initialize the element from its driver, node, and selector."""
+        self.driver = driver
+        self.node = node
+        self.css_selector = css_selector
+
+    @property
+    def tag_name(self) -> str:
+        """Return the tag name of the element."""
+        return self.node.tag
+
+    @property
+    def text(self) -> str:
+        """Return the text of the element."""
+        return self.node.text()
+
+    def get_attribute(self, name: str) -> str | None:
+        """Return an attribute of the element."""
+        return self.node.attrs.get(name)
+
+    def click(self) -> None:
+        """Follow links and submit forms, or click in the browser."""
+        self.driver.click(element=self)
+
+    def submit(self) -> None:
+        """Submit the form of the element, or submit in the browser."""
+        self.driver.submit(element=self)
+
+    def send_keys(self, *values: str) -> None:
+        """Append text to the value of the element."""
+        self.node.attrs["value"] = self.node.attrs.get("value", "") + "".join(values)
+        self.driver.type(element=self)
+
+    def clear(self) -> None:
+        """Clear the value of the element."""
+        self.node.attrs["value"] = ""
+        self.driver.type(element=self)
+
+
+class HttpDriver:
+    """Driver that loads pages over HTTP and escalates to a browser when required.
+
+    Navigations, link clicks, and form submissions are emulated with a pooled
+    HTTP client and an HTML parser. Once scripts are required (e.g., empty page
+    with scripts, unsupported selector or command), the driver starts a browser
+    at the current page and delegates every call to it.
+    """
+
+    def __init__(self, config: DriverConfig) -> None:
+        """Initialize the driver from config (without a browser)."""
+        self.config = config
+        self.pool = urllib3.PoolManager(
+            maxsize=config.http_pool_size,
+            timeout=urllib3.Timeout(total=config.http_timeout),
+            headers={"User-Agent": config.http_user_agent},
+        )
+        self.browser: Browser | None = None
+        self.lock = threading.Lock()  # of the cookies (read by the prefetches)
+        self.cookies: dict[str, dict[str, str]] = {}  # host -> name -> value
+        self.history: list[Page] = []
+        self.index = -1
+        self.prefetches: dict[str, concurrent.futures.Future[Page]] = {}
+        self.executor: concurrent.futures.ThreadPoolExecutor | None = None
+        self.warm = False  # last page served by a prefetch
+        self.escalations: dict[str, T.Callable[[Browser], None]] = {}  # hooks of the current page
+
+    @property
+    def page(self) -> Page:
+        """Return the current page (or an empty page)."""
+        if self.index < 0:
+            return Page(url="about:blank", source="", document=documents.parse(""))
+        return self.history[self.index]
+
+    @property
+    def title(self) -> str:
+        """Return the title of the current page."""
+        if self.browser is not None:
+            return self.browser.title
+        title = self.page.document.select_one("title")
+        return title.text() if title else ""
+
+    @property
+    def current_url(self) -> str:
+        """Return the URL of the current page."""
+        if self.browser is not None:
+            return self.browser.current_url
+        return self.page.url
+
+    @property
+    def page_source(self) -> str:
+        """Return the source of the current page."""
+        if self.browser is not None:
+            return self.browser.page_source
+        return self.page.source
+
+    def jar(self, host: str) -> dict[str, str]:
+        """Return a copy of the cookies of a host."""
+        with self.lock:
+            return dict(self.cookies.get(host, {}))
+
+    def keep(self, cookies: dict[str, dict[str, str]]) -> None:
+        """Keep cookies by host (e.g., received with a page or restored from a session)."""
+        with self.lock:
+            for host, jar in cookies.items():
+                self.cookies.setdefault(host, {}).update(jar)
+
+    def request(self, method: str, url: str, body: str | None = None) -> Page:
+        """Send an HTTP request (following redirects) and parse the response.
+
+        The cookies received are kept in the page and set on the driver when the
+        page is consumed, so prefetches (in other threads) do not leak them.
+        """
+        received: dict[str, dict[str, str]] = {}
+        for _ in range(10):
+            parts = urllib.parse.urlsplit(url)
+            host = parts.hostname or ""
+            headers = {}
+            if cookies := {**self.jar(host=host), **received.get(host, {})}:
+                headers["Cookie"] = "; ".join(f"{key}={val}" for key, val in cookies.items())
+            if body is not None:
+                headers["Content-Type"] = "application/x-www-form-urlencoded"
+            response = self.pool.request(method, url, body=body, headers=headers, redirect=False)
+            for header in response.headers.getlist("Set-Cookie"):
+                cookie = http.cookies.SimpleCookie(header)
+                jar = received.setdefault(host, {})
+                jar.update({key: morsel.value for key, morsel in cookie.items()})
+            if response.status in (301, 302, 303, 307, 308) and "Location" in response.headers:
+                url = urllib.parse.urljoin(url, response.headers["Location"])
+                if response.status in (301, 302, 303):
+                    method, body = "GET", None
+                continue
+            source = response.data.decode(charset(response.headers), errors="replace")
+            document = documents.parse(source)
+            return Page(url=url, source=source, document=document, cookies=received, method=method)
+        raise exceptions.WebDriverException(f"Cannot load page (too many redirects): {url}")
+
+    def requires_scripts(self, page: Page) -> bool:
+        """Check if a page requires scripts to display its content."""
+        body = page.document.select_one("body") or page.document
+        scripts = page.document.select("script")
+        return bool(scripts) and len(body.text()) < self.config.http_min_text
+
+    def prefetch(self, urls: list[str]) -> None:
+        """Load pages in the background to serve their next navigation warm."""
+        if self.browser is not None:
+            return
+        if self.executor is None:
+            self.executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.config.http_pool_size
+            )
+        for url in urls:
+            if url not in self.prefetches:
+                self.prefetches[url] = self.executor.submit(self.request, method="GET", url=url)
+
+    def navigate(self, method: str, url: str, body: str | None = None) -> None:
+        """Load a page over HTTP, or in the browser if it requires scripts."""
+        future = self.prefetches.pop(url, None) if method == "GET" and body is None else None
+        self.warm = future is not None and future.exception() is None
+        page = future.result() if future is not None and self.warm else None
+        page = page or self.request(method=method, url=url, body=body)
+        for pending in self.prefetches.values():
+            pending.cancel()
+        self.prefetches.clear()
+        self.keep(cookies=page.cookies or {})
+        self.escalations.clear()
+        self.history = self.history[: self.index + 1] + [page]
+        self.index += 1
+        if self.requires_scripts(page=page):
+            self.escalate(reason=f"page requires scripts: {page.url}")
+
+    def escalate(self, reason: str) -> "Browser":
+        """Start a browser at the current page with the same cookies (and run its hooks).
+
+        The page of a form submission is written in the browser instead of loaded
+        again (without submitting twice), and the hooks replay the state of the page
+        (e.g., typed values, marks).
+        """
+        if self.browser is None:
+            logger.info("Escalating from HTTP mode to the browser: {}", reason)
+            self.browser = init_browser_from_config(config=self.config)
+            if self.index >= 0:
+                page = self.page
+                parts = urllib.parse.urlsplit(page.url)
+                cookies = self.jar(host=parts.hostname or "")
+                if cookies or page.method != "GET":
+                    self.browser.get(f"{parts.scheme}://{parts.netloc}/")
+                for key, val in cookies.items():
+                    self.browser.add_cookie({"name": key, "value": val})
+                if page.method != "GET":
+                    self.browser.execute_script(WRITE_SCRIPT, page.url, page.source)
+                else:
+                    self.browser.get(page.url)
+                for name, hook in self.escalations.items():
+                    logger.debug("Escalation hook: {}", name)
+                    hook(self.browser)
+                self.escalations.clear()
+        return self.browser
+
+    def type(self, element: HttpElement) -> None:
+        """Keep the value typed in an element to replay it in the browser (if escalated)."""
+        value = element.node.attrs.get("value", "")
+        self.escalations[f"type:{element.css_selector}"] = functools.partial(
+            type_value, css_selector=element.css_selector, value=value
+        )
+
+    def get(self, url: str) -> None:
+        """Open a web page."""
+        if self.browser is not None:
+            return self.browser.get(url)
+        self.navigate(method="GET", url=url)
+
+    def back(self) -> None:
+        """Go back from one page."""
+        if self.browser is not None:
+            return self.browser.back()
+        self.index, self.warm = max(0, self.index - 1), False
+        self.escalations.clear()
+
+    def forward(self) -> None:
+        """Go forward from one page."""
+        if self.browser is not None:
+            return self.browser.forward()
+        self.index, self.warm = min(len(self.history) - 1, self.index + 1), False
+        self.escalations.clear()
+
+    def find_element(self, by: str = by.By.CSS_SELECTOR, value: str | None = None) -> T.Any:
+        """Find an element given a CSS selector (or in the browser otherwise)."""
+        if self.browser is None and by == CSS and value is not None:
+            try:
+                if node := self.page.document.select_one(value):
+                    return HttpElement(driver=self, node=node, css_selector=value)
+                raise exceptions.NoSuchElementException(f"Cannot find element: {value}")
+            except documents.SelectorError as error:
+                self.escalate(reason=str(error))
+        return self.escalate(reason=f"cannot find by {by}").find_element(by=by, value=value)
+
+    def click(self, element: HttpElement) -> None:
+        """Follow a link or submit a form, or click in the browser."""
+        node = element.node
+        href = node.attrs.get("href", "")
+        if self.browser is None and node.tag == "a" and "onclick" not in node.attrs:
+            if href.startswith("#"):
+                return None
+            if href and not href.lower().startswith("javascript:"):
+                return self.navigate(method="GET", url=urllib.parse.urljoin(self.page.url, href))
+        kind = node.attrs.get("type", "submit" if node.tag == "button" else "")
+        if self.browser is None and node.tag in ("button", "input") and kind in ("submit", "image"):
+            return self.submit(element=element)
+        browser = self.escalate(reason=f"cannot emulate click: {element.css_selector}")
+        browser.find_element(by=CSS, value=element.css_selector).click()
+
+    def submit(self, element: HttpElement) -> None:
+        """Submit the form of an element, or submit in the browser."""
+        node = element.node
+        form = (
+            node
+            if node.tag == "form"
+            else next((ancestor for ancestor in node.ancestors() if ancestor.tag == "form"), None)
+        )
+        multipart = form is not None and "multipart" in form.attrs.get("enctype", "")
+        if self.browser is not None or form is None or multipart or "onsubmit" in form.attrs:
+            browser = self.escalate(reason=f"cannot emulate submit: {element.css_selector}")
+            return browser.find_element(by=CSS, value=element.css_selector).submit()
+        fields = form_fields(form=form, submitter=node)
+        action = urllib.parse.urljoin(self.page.url, form.attrs.get("action", ""))
+        body = urllib.parse.urlencode(fields)
+        if form.attrs.get("method", "get").lower() == "post":
+            return self.navigate(method="POST", url=action, body=body)
+        url = urllib.parse.urlunsplit(urllib.parse.urlsplit(action)._replace(query=body))
+        self.navigate(method="GET", url=url)
+
+    def get_screenshot_as_png(self) -> bytes:
+        """Return a screenshot of the page (empty in HTTP mode)."""
+        if self.browser is not None:
+            return self.browser.get_screenshot_as_png()
+        return b""
+
+    def maximize_window(self) -> None:
+        """Maximize the browser window (if any)."""
+        if self.browser is not None:
+            self.browser.maximize_window()
+
+    def quit(self) -> None:
+        """Close the connections and the browser (if any)."""
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+        self.pool.clear()
+        if self.browser is not None:
+            self.browser.quit()
+
+    def execute(self, *args: T.Any, **kwargs: T.Any) -> T.Any:
+        """Execute a browser command (e.g., for alerts) in the browser."""
+        return self.escalate(reason="browser command").execute(*args, **kwargs)
+
+    def __getattr__(self, name: str) -> T.Any:
+        """Delegate other attributes to the browser."""
+        if name.startswith("_") or "browser" not in self.__dict__:
+            raise AttributeError(name)
+        return getattr(self.escalate(reason=f"browser attribute: {name}"), name)
 
 
 # %% ALIASES
@@ -32,23 +451,192 @@ class DriverConfig(types.ImmutableData):
 CSS = by.By.CSS_SELECTOR
 Alert: T.TypeAlias = alert.Alert
 Select: T.TypeAlias = select.Select
-Driver: T.TypeAlias = wd.Chrome | wd.Firefox
+Browser: T.TypeAlias = wd.Chrome | wd.Firefox
+Driver: T.TypeAlias = Browser | HttpDriver
+Element: T.TypeAlias = webelement.WebElement | HttpElement
 
 # %% FUNCTIONS
 
 
-def init_driver_from_config(config: DriverConfig) -> Driver:
-    """Initialize the driver from config."""
-    driver: Driver  # not assiged!
+def charset(headers: T.Mapping[str, str]) -> str:
+    """Return the charset of a response from its headers (utf-8 if missing or unknown)."""
+    value = headers.get("Content-Type", "").partition("charset=")[2]
+    name = value.split(";")[0].strip().strip("\"'")
+    try:
+        return codecs.lookup(name).name if name else "utf-8"
+    except LookupError:
+        return "utf-8"
+
+
+def form_fields(form: documents.Node, submitter: documents.Node) -> list[tuple[str, str]]:
+    """Collect the fields of a form as a browser would submit them."""
+    fields: list[tuple[str, str]] = []
+    for node in form.iter():
+        name, kind = node.attrs.get("name"), node.attrs.get("type", "text").lower()
+        if not name or "disabled" in node.attrs:
+            continue
+        if node.tag == "input":
+            if kind in ("submit", "image", "button", "reset", "file") and node is not submitter:
+                continue
+            if kind in ("checkbox", "radio") and "checked" not in node.attrs:
+                continue
+            fields.append((name, node.attrs.get("value", "on" if kind == "checkbox" else "")))
+        elif node.tag == "button" and node is submitter:
+            fields.append((name, node.attrs.get("value", "")))
+        elif node.tag == "textarea":
+            fields.append((name, node.attrs.get("value", node.text())))
+        elif node.tag == "select":
+            options = node.select("option")
+            chosen = [option for option in options if "selected" in option.attrs] or options[:1]
+            for option in chosen:
+                fields.append((name, option.attrs.get("value", option.text())))
+    return fields
+
+
+def session_file(path: str, site: str, user: str) -> str:
+    """Return the file of a session snapshot given its site and user."""
+    return os.path.join(
+        os.path.expanduser(path), urllib.parse.quote(f"{user}@{site}", safe="@") + ".json"
+    )
+
+
+def registrable(netloc: str) -> str:
+    """Return the registrable domain of a netloc (e.g., www.example.co.uk:80 -> example.co.uk:80)."""
+    host, colon, port = netloc.lower().partition(":")
+    labels = host.split(".")
+    if len(labels) <= 2 or labels[-1].isdigit() or host.startswith("["):  # e.g., ip address
+        return netloc.lower()
+    size = 3 if len(labels[-1]) == 2 and labels[-2] in SECOND_LEVELS else 2
+    return ".".join(labels[-size:]) + colon + port
+
+
+def query_sites(query: str) -> list[str]:
+    """Return the sites (registrable domains) of the URLs in a query."""
+    urls = re.findall(r"https?://[^\s'\"]+", query)
+    return list(dict.fromkeys(registrable(urllib.parse.urlsplit(url).netloc) for url in urls))
+
+
+def save_session(driver: Driver, config: SessionConfig) -> Session | None:
+    """Save a snapshot of the session of the current site (None if not a web page)."""
+    parts = urllib.parse.urlsplit(driver.current_url)
+    if parts.scheme not in ("http", "https") or config.path is None:
+        return None
+    site = registrable(parts.netloc)  # same key for the subdomains (e.g., login redirects)
+    if isinstance(driver, HttpDriver) and driver.browser is None:
+        jar = driver.jar(host=parts.hostname or "")
+        cookies = [{"name": key, "value": val} for key, val in jar.items()]
+        storages: dict[str, dict[str, str]] = {"local": {}, "session": {}}
+    else:
+        cookies = [
+            {key: val for key, val in cookie.items() if key in COOKIE_KEYS}
+            for cookie in driver.get_cookies()
+        ]
+        storages = driver.execute_script(STORAGE_SCRIPT)
+    session = Session(
+        site=site,
+        user=config.user,
+        url=driver.current_url,
+        cookies=cookies,
+        local_storage=storages["local"],
+        session_storage=storages["session"],
+    )
+    path = session_file(path=config.path, site=site, user=config.user)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp = f"{path}.tmp"
+    with open(os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as file:
+        file.write(session.model_dump_json())  # private: contains credentials
+    os.replace(temp, path)
+    logger.info("Session saved: {}@{} ({} cookies)", config.user, site, len(cookies))
+    return session
+
+
+def load_session(site: str, config: SessionConfig) -> Session | None:
+    """Load the snapshot of a site if it exists and is valid (not expired)."""
+    if config.path is None:
+        return None
+    path = session_file(path=config.path, site=site, user=config.user)
+    try:
+        with open(path) as file:
+            session = Session.model_validate_json(file.read())
+    except FileNotFoundError:
+        return None
+    except pdt.ValidationError as error:
+        logger.warning("Session snapshot is invalid: {}: {}", path, error)
+        return None
+    if session.site != site or session.user != config.user or session.expired(ttl=config.ttl):
+        logger.info("Session snapshot is expired: {}", path)
+        return None
+    return session
+
+
+def type_value(browser: Browser, css_selector: str, value: str) -> None:
+    """Set the value typed in an element in HTTP mode on the browser (after an escalation)."""
+    try:
+        element = browser.find_element(by=CSS, value=css_selector)
+    except exceptions.WebDriverException as error:
+        logger.warning("Cannot replay the value of '{}': {}", css_selector, error)
+        return
+    browser.execute_script(TYPE_SCRIPT, element, value)
+
+
+def restore_session(driver: Driver, session: Session, check: str | None = None) -> bool:
+    """Restore the snapshot of a site and validate it (with a CSS selector if given)."""
+    parts = urllib.parse.urlsplit(session.url)
+    if isinstance(driver, HttpDriver) and driver.browser is None:
+        jar = {cookie["name"]: cookie["value"] for cookie in session.cookies}
+        driver.keep(cookies={parts.hostname or "": jar})
+    else:
+        driver.get(f"{parts.scheme}://{parts.netloc}/")  # cookies require the same site
+        for cookie in session.cookies:
+            try:
+                driver.add_cookie(cookie)
+            except exceptions.WebDriverException as error:
+                logger.warning("Cannot restore cookie '{}': {}", cookie.get("name"), error)
+        driver.execute_script(RESTORE_SCRIPT, session.local_storage, session.session_storage)
+    if check is None:
+        return True
+    driver.get(session.url)
+    try:
+        driver.find_element(by=CSS, value=check)
+        return True
+    except exceptions.NoSuchElementException:
+        logger.warning("Session snapshot is not authenticated anymore: {}", session.site)
+        return False
+
+
+def restore_sessions(driver: Driver, query: str, config: SessionConfig) -> list[str]:
+    """Restore the valid snapshots of the query sites and return the restored sites."""
+    restored = []
+    sites = [registrable(site) for site in config.sites] + query_sites(query=query)
+    for site in dict.fromkeys(sites):
+        session = load_session(site=site, config=config)
+        if session and restore_session(driver=driver, session=session, check=config.check):
+            restored.append(site)
+    if restored:
+        logger.info("Sessions restored: {}", restored)
+    return restored
+
+
+def init_browser_from_config(config: DriverConfig) -> Browser:
+    """Initialize a browser from config."""
+    browser: Browser  # not assiged!
     if config.name == "Chrome":
-        driver = wd.Chrome(
-            options=wd.ChromeOptions(),
+        chrome_options = wd.ChromeOptions()
+        if config.profile_path is not None:
+            profile_path = os.path.expanduser(config.profile_path)
+            chrome_options.add_argument(f"--user-data-dir={profile_path}")
+        browser = wd.Chrome(
+            options=chrome_options,
             service=wd.ChromeService(),
             keep_alive=config.keep_alive,
         )
     elif config.name == "Firefox":
-        driver = wd.Firefox(
-            options=wd.FirefoxOptions(),
+        firefox_options = wd.FirefoxOptions()
+        if config.profile_path is not None:
+            firefox_options.add_argument("-profile")
+            firefox_options.add_argument(os.path.expanduser(config.profile_path))
+        browser = wd.Firefox(
+            options=firefox_options,
             service=wd.FirefoxService(),
             keep_alive=config.keep_alive,
         )
@@ -57,5 +645,12 @@ def init_driver_from_config(config: DriverConfig) -> Driver:
             f"Cannot initialize driver from config (unknown driver name): {config.name}!"
         )
     if config.maximize_window is True:
-        driver.maximize_window()
-    return driver
+        browser.maximize_window()
+    return browser
+
+
+def init_driver_from_config(config: DriverConfig) -> Driver:
+    """Initialize the driver from config."""
+    if config.http_mode is True:
+        return HttpDriver(config=config)
+    return init_browser_from_config(config=config)
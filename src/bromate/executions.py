@@ -2,11 +2,42 @@
 
 # %% IMPORTS
 
+import concurrent.futures
+import functools
+import time
 import typing as T
 
+import urllib3
 from loguru import logger
+from selenium.common import exceptions as driver_exceptions
 
-from bromate import actions, agents, drivers, types
+from bromate import (
+    actions,
+    agents,
+    backends,
+    candidates,
+    drivers,
+    groundings,
+    healings,
+    journals,
+    payloads,
+    results,
+    screenshots,
+    traces,
+    types,
+)
+
+# %% CONSTANTS
+
+# errors of the actions replayed from the journal (the page may have changed since)
+REPLAY_ERRORS = (
+    driver_exceptions.WebDriverException,
+    urllib3.exceptions.HTTPError,
+    OSError,
+    LookupError,
+    TypeError,
+    ValueError,
+)
 
 # %% CLASSES
 
@@ -22,6 +53,23 @@ class ExecutionConfig(types.ImmutableData):
         default=f"Continue the execution if necessary or call the {actions.done.__name__} tool if you are done",
         description="Default message to send to the agent when no input is provided by the user",
     )
+    candidate: candidates.CandidateConfig = types.Field(
+        default=candidates.CandidateConfig(), description="Configuration of the candidates"
+    )
+
+
+class ExecutionMetrics(types.MutableData):
+    """Metrics of the execution."""
+
+    steps: int = types.Field(default=0, description="Number of agent responses")
+    actions: int = types.Field(default=0, description="Number of actions executed")
+    errors: int = types.Field(default=0, description="Number of actions that failed")
+    request_bytes: int = types.Field(default=0, description="Bytes of the user contents sent")
+
+    @property
+    def error_rate(self) -> float:
+        """Ratio of failed actions (each one costs a retry round trip)."""
+        return self.errors / self.actions if self.actions else 0.0
 
 
 # %% ALIASES
@@ -31,6 +79,52 @@ Execution: T.TypeAlias = T.Generator[agents.Content, str | None, agents.Content]
 # %% FUNCTIONS
 
 
+def dispatch(name: str, agent_functions: list[agents.Function]) -> actions.Action:
+    """Return the action of a function call (only the actions declared to the agent)."""
+    names = {function.name for function in agent_functions}
+    if name not in names or not (action := getattr(actions, name, None)):
+        raise ValueError(f"Cannot execute action (unknown action name): {name}!")
+    return T.cast(actions.Action, action)
+
+
+def replay(
+    content: agents.Content,
+    driver: drivers.Driver,
+    action_config: actions.ActionConfig,
+    agent_functions: list[agents.Function] = actions.AGENT_FUNCTIONS,
+) -> None:
+    """Replay the actions of an agent content on a driver (e.g., to resume a run)."""
+    for part in content.parts:
+        if call := part.function_call:
+            name, kwargs = call.name, call.args
+            try:
+                action = dispatch(name=name, agent_functions=agent_functions)
+                action(driver=driver, config=action_config, **kwargs)
+            except REPLAY_ERRORS as error:
+                logger.warning("Error while replaying action '{}': {}", name, error)
+
+
+def observe(
+    driver: drivers.Driver,
+    names: list[str],
+    policy: screenshots.ScreenshotPolicy,
+    grounding_config: groundings.GroundingConfig,
+) -> tuple[str | None, bytes]:
+    """Observe the page with marks (if enabled) and a screenshot (if decided)."""
+    marks_text = None
+    with traces.span(driver=driver, kind="observe", name="observe"):
+        if grounding_config.enabled is True:
+            marks = groundings.mark_page(driver=driver, config=grounding_config)
+            marks_text = f"Marks of the interactive elements:\n{groundings.table(marks=marks)}"
+        start = time.perf_counter()
+        png = policy.capture(driver=driver, names=names)  # empty in http mode
+        if png and (tracer := traces.TRACERS.get(driver)):
+            tracer.screenshot(png=png, start=start)
+        if grounding_config.enabled is True:
+            groundings.unmark_page(driver=driver)
+    return marks_text, png
+
+
 def execute(
     query: str,
     agent: agents.Agent,
@@ -38,70 +132,233 @@ def execute(
     config: ExecutionConfig,
     action_config: actions.ActionConfig,
     agent_functions: list[agents.Function] = actions.AGENT_FUNCTIONS,
+    store: payloads.PayloadStore | None = None,
+    grounding_config: groundings.GroundingConfig | None = None,
+    metrics: ExecutionMetrics | None = None,
+    journal: journals.Journal | None = None,
+    run_id: str | None = None,
+    screenshot_config: screenshots.ScreenshotConfig | None = None,
+    session_config: drivers.SessionConfig | None = None,
+    trace_config: traces.TraceConfig | None = None,
 ) -> Execution:
     """Execute a query given a config."""
-    # contents
-    query_content = agents.Content(role=agents.Role.USER.value, parts=[agents.Part(text=query)])
-    contents = [query_content]
-    # tools
-    agent_tool = agents.Tool(function_declarations=agent_functions)
-    tools = [agent_tool]
-    # steps
-    while True:
-        done = False
-        # response
-        response = agent.generate_content(contents=contents, tools=tools)
-        # feedback
-        if feedback := response.prompt_feedback:
-            logger.warning("Agent feedback: {}", feedback)
-        # usage
-        if usage := response.usage_metadata:
-            logger.debug(
-                "Agent usage: total tokens={}, input tokens={}, output tokens={}",
-                usage.total_token_count,
-                usage.prompt_token_count,
-                usage.candidates_token_count,
+    # payloads
+    store = store or payloads.PayloadStore()
+    # results
+    shaper = results.Shaper(config=action_config.result, store=store)
+    # groundings
+    grounding_config = grounding_config or groundings.GroundingConfig()
+    # screenshots
+    policy = screenshots.ScreenshotPolicy(
+        config=screenshot_config or screenshots.ScreenshotConfig()
+    )
+    observer = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    # candidates
+    chooser = candidates.Chooser(config=config.candidate)
+    # sessions
+    session_config = session_config or drivers.SessionConfig()
+    # traces
+    tracer: traces.Tracer | None = None
+    results.SHAPERS[driver] = shaper  # to read more of the truncated results
+    try:
+        # metrics
+        metrics = metrics or ExecutionMetrics()
+        # contents
+        if journal is not None and run_id is not None:
+            query = journal.query(run_id=run_id)  # same query to resume
+        # sessions
+        query_parts = [agents.Part(text=query)]
+        if restored := drivers.restore_sessions(driver=driver, query=query, config=session_config):
+            sites_text = ", ".join(restored)
+            query_parts.append(
+                agents.Part(
+                    text=f"Sessions restored (already logged in): {sites_text}. Skip login."
+                )
             )
-        # parts
-        structures: list[agents.Structure] = []
-        for i, part in enumerate(response.parts, start=1):
-            logger.debug("## Agent response part {}: {}", i, str(part).strip())
-            if call := part.function_call:
-                name, kwargs = call.name, call.args
-                if name in config.stop_actions:
-                    done = True  # stop execution
-                if action := getattr(actions, name):
+        query_content = agents.Content(role=agents.Role.USER.value, parts=query_parts)
+        # traces
+        tracer = traces.init_tracer_from_config(
+            config=trace_config or traces.TraceConfig(), query=query, run_id=run_id
+        )
+        if tracer is not None:
+            traces.TRACERS[driver] = tracer
+        contents = [query_content]
+        # journal
+        step, digest = 0, journals.origin(query=query)  # same digest for other sessions
+        if journal is not None and run_id is not None:
+            for record in journal.steps(run_id=run_id):
+                if journals.chain(digest, record.response, record.request) != record.digest:
+                    logger.warning(
+                        "Journal step {} is inconsistent, resuming before it", record.step
+                    )
+                    break
+                replay(
+                    content=record.response,
+                    driver=driver,
+                    action_config=action_config,
+                    agent_functions=agent_functions,
+                )
+                parts = [
+                    part
+                    for part in record.request.parts
+                    if not payloads.is_reference(part) or payloads.digest(part) in store
+                ]
+                request = agents.Content(role=record.request.role, parts=parts)
+                contents.extend([record.response, request])
+                step, digest = record.step, record.digest
+            if step > 0:
+                logger.info("Execution resumed from journal: run id={}, steps={}", run_id, step)
+        # tools
+        agent_tool = agents.Tool(function_declarations=agent_functions)
+        tools = [agent_tool]
+        # steps
+        while True:
+            done = False
+            start = time.perf_counter()
+            if tracer is not None:
+                tracer.step = metrics.steps + 1
+            # response
+            with traces.span(driver=driver, kind="model", name="generate_content") as fields:
+                response = agent.generate_content(contents=store.materialize(contents), tools=tools)
+                fields["size"] = sum(
+                    len(agents.Candidate.serialize(candidate)) for candidate in response.candidates
+                )
+            chosen = chooser.choose(response=response, driver=driver, config=action_config)
+            backends.record(agent=agent, content=chosen)
+            # feedback
+            if feedback := response.prompt_feedback:
+                logger.warning("Agent feedback: {}", feedback)
+            # usage
+            if usage := response.usage_metadata:
+                logger.debug(
+                    "Agent usage: total tokens={}, input tokens={}, output tokens={}",
+                    usage.total_token_count,
+                    usage.prompt_token_count,
+                    usage.candidates_token_count,
+                )
+            # parts
+            structures: list[agents.Structure] = []
+            metrics.steps += 1
+            for i, part in enumerate(chosen.parts, start=1):
+                logger.debug("## Agent response part {}: {}", i, payloads.describe(part))
+                if call := part.function_call:
+                    name, kwargs = call.name, call.args
+                    if name in config.stop_actions:
+                        done = True  # stop execution
+                    action = dispatch(name=name, agent_functions=agent_functions)
+                    metrics.actions += 1
                     try:
-                        structure = action(driver=driver, config=action_config, **kwargs)
+                        with traces.span(driver=driver, kind="action", name=name) as fields:
+                            structure = action(driver=driver, config=action_config, **kwargs)
+                            fields["size"] = len(agents.Structure.serialize(structure))
                     except Exception as error:
                         kwargs_text = ", ".join(f"{key}={val}" for key, val in kwargs.items())
                         logger.error(
                             f"Error while executing action '{name}' with kwargs '{kwargs_text}': {error}"
                         )
                         structure = agents.Structure(name=name, response={"error": str(error)})
-                    structures.append(structure)
+                        metrics.errors += 1
+                    structures.append(store.refer(shaper.shape(structure=structure)))
+                elif part.text:
+                    pass
                 else:
-                    raise ValueError(f"Cannot execute action (unknown action name): {name}!")
-            elif part.text:
-                pass
-            else:
-                raise ValueError(f"Cannot handle agent response (unknown part type): {part}!")
-        # output
-        agent_content = agents.Content(role=agents.Role.AGENT.value, parts=response.parts)
-        if done is True:
-            return agent_content
-        contents.append(agent_content)
-        user_input = yield agent_content
-        # input
-        message = user_input or config.default_message
-        returned = [agents.Part(function_response=s) for s in structures]
-        screenshot = agents.Blob(mime_type="image/png", data=driver.get_screenshot_as_png())
-        user_content = agents.Content(
-            role=agents.Role.USER.value,
-            parts=[
-                agents.Part(inline_data=screenshot),
-                agents.Part(text=message),
-            ]
-            + returned,  # action calls
-        )
-        contents.append(user_content)
+                    raise ValueError(f"Cannot handle agent response (unknown part type): {part}!")
+            # output
+            agent_content = agents.Content(role=agents.Role.AGENT.value, parts=chosen.parts)
+            if done is True:
+                if journal is not None and run_id is not None:
+                    journal.finish(run_id=run_id)
+                logger.info(
+                    "Screenshot metrics: {}, avoided image tokens={}",
+                    policy.metrics,
+                    policy.metrics.avoided_tokens,
+                )
+                return agent_content
+            # observation (in the background while waiting for the user input)
+            observation: concurrent.futures.Future[tuple[str | None, bytes]]
+            observing = functools.partial(
+                observe,
+                driver=driver,
+                names=[structure.name for structure in structures],
+                policy=policy,
+                grounding_config=grounding_config,
+            )
+            if policy.config.asynchronous is True:
+                observation = observer.submit(observing)
+            else:  # without the thread hop
+                observation = concurrent.futures.Future()
+                observation.set_result(observing())
+            duration = time.perf_counter() - start
+            contents.append(agent_content)
+            with traces.span(driver=driver, kind="input", name="user"):
+                user_input = yield agent_content
+            # input
+            message = user_input or config.default_message
+            returned = [agents.Part(function_response=s) for s in structures]
+            parts = [agents.Part(text=message)] + returned  # action calls
+            marks_text, png = observation.result()
+            if marks_text is not None:
+                parts.insert(0, agents.Part(text=marks_text))
+            if png:
+                parts.insert(0, store.reference(data=png, mime_type="image/png"))
+            user_content = agents.Content(role=agents.Role.USER.value, parts=parts)
+            contents.append(user_content)
+            step_bytes = len(agents.Content.serialize(user_content))
+            metrics.request_bytes += step_bytes
+            # journal
+            if journal is not None and run_id is not None:
+                step, digest = step + 1, journals.chain(digest, agent_content, user_content)
+                journal.record(
+                    run_id=run_id,
+                    step=step,
+                    digest=digest,
+                    response=agent_content,
+                    request=user_content,
+                    payloads=[payload for part in parts for payload in payloads.digests(part)],
+                    duration=duration,
+                )
+            # metrics
+            logger.debug(
+                "Execution memory: peak rss={} bytes, payloads={}",
+                payloads.peak_rss(),
+                store.metrics,
+            )
+            logger.debug(
+                "Execution metrics: {}, error rate={:.2f}, step bytes={}",
+                metrics,
+                metrics.error_rate,
+                step_bytes,
+            )
+            logger.debug("Screenshot metrics: {}", policy.metrics)
+            logger.debug(
+                "Result metrics: {}, removed ratio={:.2f}",
+                shaper.metrics,
+                shaper.metrics.removed_ratio,
+            )
+            if chooser.config.enabled is True:
+                logger.debug(
+                    "Candidate metrics: {}, recovery rate={:.2f}",
+                    chooser.metrics,
+                    chooser.metrics.recovery_rate,
+                )
+            if action_config.healing.enabled is True:
+                healer = healings.healer(driver=driver, config=action_config.healing)
+                logger.debug(
+                    "Healing metrics: {}, hit rate={:.2f}, repair rate={:.2f}",
+                    healer.metrics,
+                    healer.metrics.hit_rate,
+                    healer.metrics.repair_rate,
+                )
+    finally:  # also when the execution is closed or fails
+        if session_config.save is True:
+            try:
+                drivers.save_session(driver=driver, config=session_config)
+            except (OSError, ValueError, driver_exceptions.WebDriverException) as error:
+                logger.warning("Cannot save session: {}", error)
+        observer.shutdown(wait=False)
+        chooser.close()
+        results.SHAPERS.pop(driver, None)
+        healings.close(driver=driver)
+        if tracer is not None:
+            traces.TRACERS.pop(driver, None)
+            tracer.close()
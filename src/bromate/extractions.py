@@ -0,0 +1,214 @@
+"""Extract the main content of web pages as Markdown text."""
+
+# %% IMPORTS
+
+import functools
+import math
+import re
+import urllib.parse
+from collections import Counter
+
+from bromate import documents
+
+# %% CONSTANTS
+
+# elements that do not belong to the main content
+SKIPPED_TAGS = documents.HIDDEN_TAGS | {
+    "aside",
+    "button",
+    "footer",
+    "form",
+    "header",
+    "iframe",
+    "nav",
+    "select",
+    "svg",
+}
+# elements that contain the main content (by priority)
+MAIN_SELECTORS = ["main", "article", "[role=main]", "#content", "#main", ".content"]
+# elements rendered as blocks
+BLOCK_TAGS = documents.BLOCK_TAGS | {"li", "p", "tr", "br", "body", "dd", "dt", "figure"}
+# words ignored when ranking chunks
+STOP_WORDS = {
+    "a",
+    "an",
+    "and",
+    "are",
+    "for",
+    "in",
+    "is",
+    "it",
+    "of",
+    "on",
+    "or",
+    "the",
+    "to",
+    "what",
+    "with",
+}
+
+# %% FUNCTIONS
+
+
+def find_main(root: documents.Node) -> documents.Node:
+    """Find the node of the main content (readability heuristic)."""
+    for selector in MAIN_SELECTORS:
+        if node := root.select_one(selector):
+            return node
+    best, best_score = root.select_one("body") or root, 0.0
+    for node in root.iter():
+        if node.tag not in ("div", "section", "td"):
+            continue
+        paragraphs = [child for child in node.elements if child.tag in ("p", "pre", "ul", "ol")]
+        text = sum(len(child.text()) for child in paragraphs)
+        links = sum(len(link.text()) for link in node.select("a"))
+        score = text * (1.0 - min(1.0, links / (len(node.text()) or 1)))
+        if score > best_score:
+            best, best_score = node, score
+    return best
+
+
+def raw_text(node: documents.Node) -> str:
+    """Return the text of a node with its whitespace (e.g., for code)."""
+    return "".join(child if isinstance(child, str) else raw_text(child) for child in node.children)
+
+
+def to_markdown(node: documents.Node, base_url: str = "") -> str:
+    """Convert a node to Markdown (headings, lists, links, tables, code)."""
+    lines: list[str] = []
+
+    def inline(children: list[documents.Node | str]) -> str:
+        texts: list[str] = []
+        for child in children:
+            if isinstance(child, str):
+                texts.append(child)
+            elif child.tag in SKIPPED_TAGS or child.tag in ("ul", "ol"):
+                continue  # nested lists are blocks
+            elif (
+                child.tag == "a"
+                and (href := child.attrs.get("href", ""))
+                and not href.startswith(("#", "javascript:"))
+            ):
+                text = " ".join(inline(child.children).split())
+                url = urllib.parse.urljoin(base_url, href)
+                texts.append(f"[{text}]({url})" if text else "")
+            elif child.tag in ("b", "strong"):
+                texts.append(f"**{inline(child.children).strip()}**")
+            elif child.tag in ("i", "em"):
+                texts.append(f"*{inline(child.children).strip()}*")
+            elif child.tag == "code":
+                texts.append(f"`{child.text()}`")
+            elif child.tag == "br":
+                texts.append("\n")
+            elif child.tag == "img" and (alt := child.attrs.get("alt")):
+                texts.append(f"![{alt}]")
+            else:
+                texts.append(inline(child.children))
+        return "".join(texts)
+
+    def block(node: documents.Node, depth: int = 0) -> None:
+        if node.tag in SKIPPED_TAGS:
+            return
+        if re.fullmatch(r"h[1-6]", node.tag):
+            lines.extend(["#" * int(node.tag[1]) + " " + node.text(), ""])
+        elif node.tag == "pre":
+            lines.extend(["```", raw_text(node).strip("\n"), "```", ""])
+        elif node.tag in ("ul", "ol"):
+            items = [child for child in node.elements if child.tag == "li"]
+            for index, item in enumerate(items, start=1):
+                bullet = f"{index}." if node.tag == "ol" else "-"
+                text = " ".join(inline(item.children).split())
+                lines.append("  " * depth + f"{bullet} {text}")
+                for sublist in item.elements:
+                    if sublist.tag in ("ul", "ol"):
+                        block(sublist, depth=depth + 1)
+            if depth == 0:
+                lines.append("")
+        elif node.tag == "table":
+            rows = node.select("tr")
+            cells = [
+                [" ".join(inline(cell.children).split()) for cell in row.elements] for row in rows
+            ]
+            cells = [row for row in cells if any(row)]
+            if cells:
+                width = max(len(row) for row in cells)
+                cells = [row + [""] * (width - len(row)) for row in cells]
+                lines.append("| " + " | ".join(cells[0]) + " |")
+                lines.append("|" + " --- |" * width)
+                lines.extend("| " + " | ".join(row) + " |" for row in cells[1:])
+                lines.append("")
+        elif node.tag in ("p", "blockquote", "dd", "dt", "figcaption") or not any(
+            child.tag in BLOCK_TAGS for child in node.elements
+        ):
+            if text := " ".join(inline(node.children).split()):
+                prefix = "> " if node.tag == "blockquote" else ""
+                lines.extend([prefix + text, ""])
+        else:
+            texts: list[str] = []  # inline texts between blocks
+            for child in node.children:
+                if isinstance(child, str) or child.tag not in BLOCK_TAGS | {"table", "pre"}:
+                    texts.append(inline([child]))
+                    continue
+                if text := " ".join("".join(texts).split()):
+                    lines.extend([text, ""])
+                texts = []
+                block(child, depth=depth)
+            if text := " ".join("".join(texts).split()):
+                lines.extend([text, ""])
+
+    block(node)
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+
+def chunk(text: str, size: int) -> list[str]:
+    """Split a text into chunks of blocks (paragraphs) up to a size."""
+    chunks: list[str] = []
+    current = ""
+    for block in text.split("\n\n"):
+        while len(block) > size:  # split oversized blocks
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(block[:size])
+            block = block[size:]
+        if current and len(current) + len(block) + 2 > size:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n\n{block}" if current else block
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def tokenize(text: str) -> list[str]:
+    """Tokenize a text into lowercase words (without stop words)."""
+    return [word for word in re.findall(r"\w+", text.lower()) if word not in STOP_WORDS]
+
+
+def rank(chunks: list[str], query: str) -> list[int]:
+    """Rank the chunks by relevance to a query (BM25), in document order if no query."""
+    terms = set(tokenize(query))
+    if not terms:
+        return list(range(len(chunks)))
+    counts = [Counter(tokenize(chunk)) for chunk in chunks]
+    lengths = [sum(count.values()) for count in counts]
+    average = (sum(lengths) / len(lengths) if lengths else 0.0) or 1.0
+    idfs = {}
+    for term in terms:
+        found = sum(1 for count in counts if term in count)
+        idfs[term] = math.log(1 + (len(counts) - found + 0.5) / (found + 0.5))
+    scores = []
+    for count, length in zip(counts, lengths, strict=True):
+        norm = 1.2 * (0.25 + 0.75 * length / average)  # k1=1.2, b=0.75
+        scores.append(
+            sum(idf * count[term] * 2.2 / (count[term] + norm) for term, idf in idfs.items())
+        )
+    return sorted(range(len(chunks)), key=lambda index: (-scores[index], index))
+
+
+@functools.lru_cache(maxsize=8)
+def extract(source: str, base_url: str, size: int) -> tuple[str, ...]:
+    """Extract the main content of a page source as Markdown chunks (cached)."""
+    root = documents.parse(source)
+    markdown = to_markdown(find_main(root), base_url=base_url)
+    return tuple(chunk(markdown, size=size))
@@ -0,0 +1,150 @@
+"""Ground the agent actions with numbered marks on interactive elements."""
+
+# %% IMPORTS
+
+import functools
+
+import pydantic as pdt
+
+from bromate import drivers, types
+
+# %% CONSTANTS
+
+# attribute of the marked elements
+ATTRIBUTE = "data-bromate-mark"
+# selector of the interactive elements
+INTERACTIVES = (
+    "a[href], button, input:not([type=hidden]), select, textarea, "
+    "[role=button], [role=link], [onclick], [contenteditable=true]"
+)
+# script to mark the interactive elements in the viewport and overlay their ids
+MARK_SCRIPT = """
+const [attribute, selector, limit, size] = arguments;
+document.querySelectorAll('[data-bromate-overlay]').forEach((e) => e.remove());
+document.querySelectorAll(`[${attribute}]`).forEach((e) => e.removeAttribute(attribute));
+const marks = [];
+for (const element of document.querySelectorAll(selector)) {
+  if (marks.length >= limit) break;
+  const rect = element.getBoundingClientRect();
+  const style = getComputedStyle(element);
+  const visible = rect.width > 0 && rect.height > 0 && style.visibility !== 'hidden';
+  const inside = rect.bottom > 0 && rect.right > 0 && rect.top < innerHeight && rect.left < innerWidth;
+  if (!visible || !inside) continue;
+  const id = marks.length + 1;
+  element.setAttribute(attribute, id);
+  const box = document.createElement('div');
+  box.setAttribute('data-bromate-overlay', '');
+  box.style.cssText = `position:fixed;left:${rect.left}px;top:${rect.top}px;width:${rect.width}px;height:${rect.height}px;outline:2px solid #e11;pointer-events:none;z-index:2147483647;`;
+  const label = document.createElement('span');
+  label.textContent = id;
+  label.style.cssText = 'position:absolute;left:0;top:0;background:#e11;color:#fff;font:bold 11px monospace;padding:0 2px;';
+  box.appendChild(label);
+  document.documentElement.appendChild(box);
+  const text = element.innerText || element.value || element.getAttribute('aria-label')
+    || element.getAttribute('placeholder') || element.getAttribute('title') || '';
+  marks.push({
+    id: id,
+    tag: element.tagName.toLowerCase(),
+    text: text.trim().replace(/\\s+/g, ' ').slice(0, size),
+    type: element.getAttribute('type'),
+    name: element.getAttribute('name'),
+    href: element.getAttribute('href'),
+  });
+}
+return marks;
+"""
+# script to mark the first interactive elements in document order (as in HTTP mode)
+REMARK_SCRIPT = """
+const [attribute, selector, limit] = arguments;
+document.querySelectorAll(`[${attribute}]`).forEach((e) => e.removeAttribute(attribute));
+[...document.querySelectorAll(selector)].slice(0, limit).forEach((e, i) => e.setAttribute(attribute, i + 1));
+"""
+# script to remove the overlays (but keep the marks)
+UNMARK_SCRIPT = "document.querySelectorAll('[data-bromate-overlay]').forEach((e) => e.remove());"
+
+# %% CLASSES
+
+
+class GroundingConfig(types.ImmutableData):
+    """Config for the grounding."""
+
+    enabled: bool = types.Field(
+        default=False, description="Overlay numbered marks on the interactive elements"
+    )
+    max_marks: pdt.PositiveInt = types.Field(
+        default=100, description="Maximum number of marks per screenshot"
+    )
+    text_size: pdt.PositiveInt = types.Field(
+        default=40, description="Maximum text size of the elements in the marks table"
+    )
+
+
+class Mark(types.ImmutableData):
+    """Interactive element identified by a mark."""
+
+    id: int = types.Field(description="Number of the mark")
+    tag: str = types.Field(description="Tag name of the element")
+    text: str = types.Field(default="", description="Text of the element")
+    type: str | None = types.Field(default=None, description="Type attribute of the element")
+    name: str | None = types.Field(default=None, description="Name attribute of the element")
+    href: str | None = types.Field(default=None, description="Link target of the element")
+
+
+# %% FUNCTIONS
+
+
+def selector(mark: float) -> str:
+    """Return the CSS selector of a mark id (agent numbers are floats)."""
+    return f'[{ATTRIBUTE}="{int(mark)}"]'
+
+
+def mark_page(driver: drivers.Driver, config: GroundingConfig) -> list[Mark]:
+    """Mark the interactive elements of the current page (with overlays in browsers)."""
+    if isinstance(driver, drivers.HttpDriver) and driver.browser is None:
+        marks: list[Mark] = []
+        for node in driver.page.document.select(INTERACTIVES)[: config.max_marks]:
+            node.attrs[ATTRIBUTE] = str(len(marks) + 1)
+            attrs = node.attrs
+            text = node.text() or attrs.get("value") or attrs.get("aria-label") or ""
+            marks.append(
+                Mark(
+                    id=len(marks) + 1,
+                    tag=node.tag,
+                    text=text[: config.text_size],
+                    type=attrs.get("type"),
+                    name=attrs.get("name"),
+                    href=attrs.get("href"),
+                )
+            )
+        # keep the marks usable if the driver escalates to the browser on this page
+        driver.escalations["marks"] = functools.partial(remark, count=len(marks))
+        return marks
+    results = driver.execute_script(
+        MARK_SCRIPT, ATTRIBUTE, INTERACTIVES, config.max_marks, config.text_size
+    )
+    return [Mark.model_validate(result) for result in results or []]
+
+
+def remark(browser: drivers.Browser, count: int) -> None:
+    """Mark the browser page as it was marked in HTTP mode (after an escalation)."""
+    browser.execute_script(REMARK_SCRIPT, ATTRIBUTE, INTERACTIVES, count)
+
+
+def unmark_page(driver: drivers.Driver) -> None:
+    """Remove the overlays of the marks (the marks stay usable)."""
+    if not isinstance(driver, drivers.HttpDriver) or driver.browser is not None:
+        driver.execute_script(UNMARK_SCRIPT)
+
+
+def table(marks: list[Mark]) -> str:
+    """Render the marks as a compact table for the agent."""
+    lines = []
+    for mark in marks:
+        line = f"{mark.id}: {mark.tag}"
+        for key in ("type", "name", "href"):
+            if value := getattr(mark, key):
+                line += f" {key}={value}"
+        if mark.text:
+            line += f' "{mark.text}"'
+        lines.append(line)
+    return "\n".join(lines)
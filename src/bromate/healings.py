@@ -0,0 +1,297 @@
+"""Heal the failing CSS selectors with a knowledge base learned across runs."""
+
+# %% IMPORTS
+
+import os
+import re
+import sqlite3
+import threading
+import time
+import typing as T
+import urllib.parse
+import weakref
+
+import pydantic as pdt
+from loguru import logger
+from selenium.common import exceptions
+
+from bromate import documents, drivers, types
+
+# %% CONSTANTS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS selectors (
+    site TEXT NOT NULL,
+    page TEXT NOT NULL,
+    action TEXT NOT NULL,
+    selector TEXT NOT NULL,
+    candidate TEXT NOT NULL,
+    successes INTEGER NOT NULL,
+    failures INTEGER NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (site, page, action, selector, candidate)
+);
+"""
+# statements to record the successes or failures of candidates
+LEARN_SUCCESS = """
+INSERT INTO selectors VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (site, page, action, selector, candidate)
+DO UPDATE SET successes = successes + 1, updated = excluded.updated
+"""
+LEARN_FAILURE = """
+INSERT INTO selectors VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (site, page, action, selector, candidate)
+DO UPDATE SET failures = failures + 1, updated = excluded.updated
+"""
+# script to collect the attributes of an element
+ATTRIBUTES_SCRIPT = """
+return Object.fromEntries([...arguments[0].attributes].map((a) => [a.name, a.value]));
+"""
+# attributes that identify an element across page versions (most stable first)
+STABLE = ["id", "data-testid", "data-test", "data-qa", "name", "aria-label", "placeholder", "href"]
+# path segments that change between pages of the same kind (ids, hashes, dates)
+VOLATILE = re.compile(r"^(\d+|[0-9a-f]{8,}|[0-9a-f-]{36}|\d{4}-\d{2}-\d{2})$", re.IGNORECASE)
+# generated ids that are not stable (e.g., react, ember, long numbers)
+GENERATED = re.compile(r"^(:r|ember|ext-gen)|\d{4,}")
+# pseudo classes that depend on the position of an element
+POSITIONAL = re.compile(
+    r":(nth-child|nth-of-type|nth-last-child|first-child|last-child)(\([^)]*\))?"
+)
+# attribute selectors with an exact value
+EXACT = re.compile(r"\[\s*([\w:-]+)\s*=\s*(\"[^\"]*\"|'[^']*'|[^\]\s]+)\s*\]")
+
+# %% CLASSES
+
+
+class HealingConfig(types.ImmutableData):
+    """Config for the selector healing."""
+
+    enabled: bool = types.Field(
+        default=False, description="Try the known and variant selectors before failing"
+    )
+    path: str | None = types.Field(
+        default="~/.bromate/healings.db",
+        description="Path of the selector knowledge base (SQLite, in memory if null)",
+    )
+    max_candidates: pdt.PositiveInt = types.Field(
+        default=10, description="Maximum number of candidates to try per failing selector"
+    )
+
+
+class HealingMetrics(types.MutableData):
+    """Metrics of the selector healing."""
+
+    finds: int = types.Field(default=0, description="Number of elements found by selector")
+    misses: int = types.Field(default=0, description="Number of selectors that failed")
+    hits: int = types.Field(default=0, description="Number of misses healed by known selectors")
+    repairs: int = types.Field(default=0, description="Number of misses healed by variants")
+    failures: int = types.Field(default=0, description="Number of misses not healed")
+
+    @property
+    def hit_rate(self) -> float:
+        """Ratio of misses healed by the known selectors."""
+        return self.hits / self.misses if self.misses else 0.0
+
+    @property
+    def repair_rate(self) -> float:
+        """Ratio of misses healed (saving a round trip to the agent)."""
+        return (self.hits + self.repairs) / self.misses if self.misses else 0.0
+
+
+class Healer:
+    """Healer of the CSS selectors backed by a knowledge base (SQLite)."""
+
+    def __init__(self, config: HealingConfig) -> None:
+        """Open (or create) the knowledge base from config."""
+        self.config = config
+        self.metrics = HealingMetrics()
+        path = ":memory:"
+        if config.path is not None:
+            path = os.path.expanduser(config.path)
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+        self.keys: set[tuple[str, str, str, str]] = set()  # keys with known candidates
+
+    def learn(
+        self, key: tuple[str, str, str, str], candidates: list[str], success: bool = True
+    ) -> None:
+        """Record the successes (or failures) of candidates for a key (site, page, action, selector)."""
+        statement = LEARN_SUCCESS if success is True else LEARN_FAILURE
+        rows = [
+            (*key, candidate, int(success), int(not success), time.time())
+            for candidate in candidates
+        ]
+        with self.lock:
+            self.connection.executemany(statement, rows)
+        if success is True:
+            self.keys.add(key)
+
+    def known(self, key: tuple[str, str, str, str]) -> list[str]:
+        """Return the known candidates of a key (same action first, best record first)."""
+        site, page, action, selector = key
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT candidate FROM selectors WHERE site = ? AND page = ? AND selector = ? "
+                "AND candidate != selector GROUP BY candidate "
+                "ORDER BY MAX(action = ?) DESC, SUM(successes - failures) DESC LIMIT ?",
+                (site, page, selector, action, self.config.max_candidates),
+            ).fetchall()
+        return [candidate for (candidate,) in rows]
+
+    def learned(self, key: tuple[str, str, str, str]) -> bool:
+        """Check if the candidates of a key were already learned (cached in memory)."""
+        if key not in self.keys:
+            with self.lock:
+                row = self.connection.execute(
+                    "SELECT 1 FROM selectors WHERE site = ? AND page = ? AND action = ? "
+                    "AND selector = ? LIMIT 1",
+                    key,
+                ).fetchone()
+            if row is not None:
+                self.keys.add(key)
+        return key in self.keys
+
+    def find(self, driver: drivers.Driver, action: str, css_selector: str) -> T.Any:
+        """Find an element given its CSS selector, healing it if it fails."""
+        self.metrics.finds += 1
+        key = (*fingerprint(url=driver.current_url), action, css_selector)
+        try:
+            element = driver.find_element(by=drivers.CSS, value=css_selector)
+        except exceptions.NoSuchElementException:
+            self.metrics.misses += 1
+            knowns = self.known(key=key)
+            candidates = knowns + [v for v in variants(css_selector) if v not in knowns]
+            for candidate in candidates[: self.config.max_candidates]:
+                if len(elements := matches(driver=driver, css_selector=candidate)) == 1:
+                    if candidate in knowns:
+                        self.metrics.hits += 1
+                    else:
+                        self.metrics.repairs += 1
+                    candidates = [candidate, *alternatives(driver=driver, element=elements[0])]
+                    self.learn(key=key, candidates=list(dict.fromkeys(candidates)))
+                    logger.info("Selector healed: {} -> {}", css_selector, candidate)
+                    return elements[0]
+                if candidate in knowns:
+                    self.learn(key=key, candidates=[candidate], success=False)
+            self.metrics.failures += 1
+            raise
+        if not self.learned(key=key):  # learn the alternatives of new keys only
+            candidates = [css_selector, *alternatives(driver=driver, element=element)]
+            self.learn(key=key, candidates=list(dict.fromkeys(candidates)))
+        return element
+
+    def close(self) -> None:
+        """Close the knowledge base."""
+        with self.lock:
+            self.connection.close()
+
+
+# %% FUNCTIONS
+
+
+def fingerprint(url: str) -> tuple[str, str]:
+    """Return the site and page template of a URL (volatile path segments replaced)."""
+    parts = urllib.parse.urlsplit(url)
+    segments = []
+    for segment in parts.path.split("/"):
+        stem, dot, extension = segment.partition(".")
+        segments.append(f"*{dot}{extension}" if VOLATILE.match(stem) else segment)
+    return parts.netloc, "/".join(segments) or "/"
+
+
+def quote(value: str) -> str | None:
+    """Quote an attribute value for a CSS selector (None if it cannot be quoted simply)."""
+    if not value or '"' in value or "\\" in value or "\n" in value:
+        return None
+    return f'"{value}"'
+
+
+def alternatives(driver: drivers.Driver, element: T.Any) -> list[str]:
+    """Return the selectors of an element built from its stable attributes."""
+    if isinstance(element, drivers.HttpElement):
+        attrs = dict(element.node.attrs)
+    else:
+        attrs = dict(driver.execute_script(ATTRIBUTES_SCRIPT, element) or {})
+    tag = element.tag_name.lower()
+    selectors = []
+    for name in STABLE:
+        value = attrs.get(name)
+        if value is None or (name == "id" and GENERATED.search(value)):
+            continue
+        if (quoted := quote(value)) is not None:
+            selectors.append(
+                f"#{value}"
+                if name == "id" and re.fullmatch(r"[\w-]+", value)
+                else f"{tag}[{name}={quoted}]"
+            )
+    if tag in ("input", "button") and (value := quote(attrs.get("value", ""))) is not None:
+        kind = quote(attrs.get("type", ""))  # only if set: attribute selectors ignore defaults
+        selectors.append(f"{tag}[type={kind}][value={value}]" if kind else f"{tag}[value={value}]")
+    return selectors
+
+
+def variants(css_selector: str) -> list[str]:
+    """Return the relaxed variants of a CSS selector (attribute-based, least specific last)."""
+    selector = css_selector.strip()
+    found: list[str] = []
+    # without positional pseudo classes
+    found.append(POSITIONAL.sub("", selector))
+    # last compound only (without ancestors)
+    last = re.split(r"\s*[>+~]\s*|\s+", found[0])[-1]
+    found.append(last)
+    # partial attribute values
+    found.append(EXACT.sub(lambda m: f"[{m.group(1)}*={m.group(2)}]", last))
+    # ids as partial ids or names, without tags
+    for name in re.findall(r"#([\w-]+)", last):
+        found.extend([f'[id*="{name}"]', f'[name="{name}"]'])
+    if match := re.match(r"^[a-zA-Z][\w-]*(?=[#.\[])", last):
+        found.append(last[match.end() :])
+    # single classes
+    found.extend(f".{name}" for name in re.findall(r"\.([\w-]+)", last))
+    uniques = []
+    for variant in found:
+        if variant and variant != selector and variant not in uniques:
+            uniques.append(variant)
+    return uniques
+
+
+def matches(driver: drivers.Driver, css_selector: str) -> list[T.Any]:
+    """Return the elements matching a CSS selector (none if it is invalid)."""
+    browser = driver.browser if isinstance(driver, drivers.HttpDriver) else driver
+    if isinstance(driver, drivers.HttpDriver) and browser is None:
+        try:  # without escalating to the browser
+            nodes = driver.page.document.select(css=css_selector)
+        except documents.SelectorError:
+            return []
+        return [
+            drivers.HttpElement(driver=driver, node=node, css_selector=css_selector)
+            for node in nodes
+        ]
+    if browser is None:
+        raise ValueError(f"Cannot match selector (browser not started): {css_selector}!")
+    try:
+        return list(browser.find_elements(by=drivers.CSS, value=css_selector))
+    except exceptions.WebDriverException:  # e.g., invalid selector
+        return []
+
+
+HEALERS: "weakref.WeakKeyDictionary[drivers.Driver, Healer]" = weakref.WeakKeyDictionary()
+
+
+def healer(driver: drivers.Driver, config: HealingConfig) -> Healer:
+    """Return the healer of a driver (created on first use or when its config changes)."""
+    current = HEALERS.get(driver)
+    if current is None or current.config != config:
+        if current is not None:
+            current.close()
+        current = HEALERS[driver] = Healer(config=config)
+    return current
+
+
+def close(driver: drivers.Driver) -> None:
+    """Close the healer of a driver (if any)."""
+    if (current := HEALERS.pop(driver, None)) is not None:
+        current.close()
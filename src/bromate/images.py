@@ -0,0 +1,297 @@
+"""Analyze screenshots with vectorized perceptual diffs and fingerprints."""
+
+# %% IMPORTS
+
+import base64
+import struct
+import time
+import typing as T
+import zlib
+
+import numpy as np
+import numpy.typing as npt
+import pydantic as pdt
+
+from bromate import drivers, types
+
+# %% CONSTANTS
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# number of channels of the png color types (gray, rgb, palette, gray+alpha, rgba)
+PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+# luma weights of the rgb channels
+LUMA = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+# side of the hashes (64 bits)
+HASH_SIZE = 8
+
+# %% CLASSES
+
+
+class StabilityConfig(types.ImmutableData):
+    """Config for the visual stability."""
+
+    enabled: bool = types.Field(
+        default=False, description="Wait until the page is visually stable instead of sleeping"
+    )
+    interval: pdt.PositiveFloat = types.Field(
+        default=0.1, description="Interval (in seconds) between two captures"
+    )
+    timeout: pdt.PositiveFloat = types.Field(
+        default=5.0, description="Maximum time (in seconds) to wait for the stability"
+    )
+    threshold: float = types.Field(
+        default=0.01, ge=0.0, le=1.0, description="Maximum block difference of stable captures"
+    )
+    frames: pdt.PositiveInt = types.Field(
+        default=2, description="Number of consecutive stable captures"
+    )
+    scale: float = types.Field(
+        default=0.125,
+        gt=0.0,
+        le=1.0,
+        description="Scale of the captures (Chrome only, full size captures are slower to decode)",
+    )
+
+
+class Stability(T.NamedTuple):
+    """Outcome of a wait for the visual stability."""
+
+    stable: bool
+    captures: int
+    elapsed: float
+
+
+# %% ALIASES
+
+Frames: T.TypeAlias = npt.NDArray[np.float32]  # (..., height, width) in [0, 1]
+Hashes: T.TypeAlias = npt.NDArray[np.uint64]
+
+# %% FUNCTIONS
+
+
+def paeth(a: npt.NDArray[np.int16], b: npt.NDArray[np.int16], c: npt.NDArray[np.int16]) -> T.Any:
+    """Predict bytes from their left, up, and up-left bytes (png paeth filter)."""
+    up, left = b - c, a - c
+    pa, pb, pc = np.abs(up), np.abs(left), np.abs(up + left)  # distances of a + b - c
+    return np.where((pa <= pb) & (pa <= pc), a, np.where(pb <= pc, b, c))
+
+
+def unfilter(rows: npt.NDArray[np.uint8], width: int, bpp: int) -> npt.NDArray[np.uint8]:
+    """Reverse the png filters of rows (filter type byte followed by the filtered bytes)."""
+    height, kinds = rows.shape[0], rows[:, 0]
+    lines = rows[:, 1:].reshape(height, width, bpp)
+    if not (kinds >= 3).any():  # none, sub, and up: vectorized by row
+        pixels = np.zeros((height, width, bpp), dtype=np.uint8)
+        previous = np.zeros((width, bpp), dtype=np.uint8)
+        for y in range(height):
+            kind, line = kinds[y], lines[y]
+            if kind == 0:
+                pixels[y] = line
+            elif kind == 1:
+                pixels[y] = np.cumsum(line, axis=0, dtype=np.uint8)
+            else:
+                pixels[y] = line + previous
+            previous = pixels[y]
+        return pixels.reshape(height, -1)
+    # average and paeth are sequential in a row, but a pixel only depends on its left, up,
+    # and up-left pixels: the rows are sheared so that each anti-diagonal is a column, and
+    # the columns are unfiltered in order with vectorized slices (wavefront)
+    diagonals = height + width - 1
+    sheared = np.zeros((diagonals, height, bpp), dtype=np.int16)  # contiguous diagonals
+    for y in range(height):
+        sheared[y : y + width, y] = lines[y]
+    padded = np.zeros((diagonals + 2, height + 1, bpp), dtype=np.int16)  # zero borders
+    masks = [(kinds == kind)[:, None].astype(np.int16) for kind in (1, 2, 3, 4)]
+    for d in range(diagonals):
+        low, high = max(0, d - width + 1), min(height, d + 1)
+        a = padded[d + 1, low + 1 : high + 1]  # left
+        b = padded[d + 1, low:high]  # up
+        c = padded[d, low:high]  # up-left
+        sub, up, average, paeths = (mask[low:high] for mask in masks)
+        predictions = sub * a + up * b + average * ((a + b) >> 1) + paeths * paeth(a, b, c)
+        padded[d + 2, low + 1 : high + 1] = (sheared[d, low:high] + predictions) & 0xFF
+    pixels = np.empty((height, width, bpp), dtype=np.uint8)
+    for y in range(height):
+        pixels[y] = padded[y + 2 : y + 2 + width, y + 1]
+    return pixels.reshape(height, -1)
+
+
+def encode_png(pixels: npt.NDArray[np.uint8]) -> bytes:
+    """Encode grayscale pixels (height x width) to a png image with the paeth filter."""
+    height, width = pixels.shape
+    padded = np.pad(pixels.astype(np.int16), ((1, 0), (1, 0)))
+    a, b, c = padded[1:, :-1], padded[:-1, 1:], padded[:-1, :-1]  # left, up, up-left
+    filtered = ((pixels - paeth(a, b, c)) & 0xFF).astype(np.uint8)
+    rows = np.hstack([np.full((height, 1), 4, dtype=np.uint8), filtered])
+
+    def chunk(kind: bytes, body: bytes) -> bytes:
+        return (
+            struct.pack(">I", len(body)) + kind + body + struct.pack(">I", zlib.crc32(kind + body))
+        )
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)
+    return (
+        PNG_SIGNATURE
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(rows.tobytes()))
+        + chunk(b"IEND", b"")
+    )
+
+
+def decode_png(data: bytes) -> Frames:
+    """Decode a png image (8 or 16 bits, not interlaced) to a grayscale frame."""
+    if not data.startswith(PNG_SIGNATURE):
+        raise ValueError("Cannot decode png (invalid signature)!")
+    offset, chunks, palette = len(PNG_SIGNATURE), [], b""
+    width = height = depth = color = 0
+    while offset < len(data):
+        (length,), kind = (
+            struct.unpack(">I", data[offset : offset + 4]),
+            data[offset + 4 : offset + 8],
+        )
+        body = data[offset + 8 : offset + 8 + length]
+        offset += length + 12
+        if kind == b"IHDR":
+            width, height, depth, color, _, _, interlace = struct.unpack(">IIBBBBB", body)
+            if interlace or depth not in (8, 16) or color not in PNG_CHANNELS:
+                raise ValueError(f"Cannot decode png (unsupported format): {depth}/{color}!")
+        elif kind == b"PLTE":
+            palette = body
+        elif kind == b"IDAT":
+            chunks.append(body)
+        elif kind == b"IEND":
+            break
+    bpp = PNG_CHANNELS[color] * depth // 8
+    stride = width * bpp
+    raw = np.frombuffer(zlib.decompress(b"".join(chunks)), dtype=np.uint8)
+    pixels = unfilter(rows=raw.reshape(height, stride + 1), width=width, bpp=bpp)
+    if depth == 16:
+        pixels = pixels.reshape(height, -1, 2)[..., 0].reshape(height, -1)  # high bytes
+    channels = pixels.reshape(height, width, -1).astype(np.float32) / 255.0
+    if color == 3:
+        colors = np.frombuffer(palette, dtype=np.uint8).reshape(-1, 3).astype(np.float32) / 255.0
+        channels = colors[pixels.reshape(height, width)]
+    if channels.shape[-1] in (3, 4):
+        return T.cast(Frames, channels[..., :3] @ LUMA)
+    return T.cast(Frames, channels[..., 0])
+
+
+def downsample(frames: Frames, height: int, width: int) -> Frames:
+    """Downsample frames to a size by averaging blocks (after cropping the remainders)."""
+    *batch, h, w = frames.shape
+    if h < height or w < width:
+        raise ValueError(f"Cannot downsample frames (too small): {h}x{w} < {height}x{width}!")
+    bh, bw = h // height, w // width
+    cropped = frames[..., : height * bh, : width * bw]
+    return cropped.reshape(*batch, height, bh, width, bw).mean(axis=(-3, -1))
+
+
+def block_diff(a: Frames, b: Frames, blocks: int = 8) -> Frames:
+    """Compute the mean absolute difference of frames by blocks (blocks x blocks map)."""
+    return downsample(np.abs(a - b), height=blocks, width=blocks)
+
+
+def pack(bits: npt.NDArray[np.bool_]) -> Hashes:
+    """Pack the last two axes of bits (8x8) to 64-bit hashes."""
+    flat = bits.reshape(*bits.shape[:-2], -1).astype(np.uint64)
+    weights = np.left_shift(np.uint64(1), np.arange(flat.shape[-1], dtype=np.uint64))
+    return T.cast(Hashes, np.bitwise_or.reduce(flat * weights, axis=-1))
+
+
+def dhash(frames: Frames) -> Hashes:
+    """Compute the difference hashes of frames (gradients of a 8x9 thumbnail)."""
+    thumbnails = downsample(frames, height=HASH_SIZE, width=HASH_SIZE + 1)
+    return pack(thumbnails[..., 1:] > thumbnails[..., :-1])
+
+
+def dct_matrix(size: int) -> Frames:
+    """Return the orthonormal DCT-II matrix of a size."""
+    k, n = np.meshgrid(np.arange(size), np.arange(size), indexing="ij")
+    matrix = np.sqrt(2.0 / size) * np.cos(np.pi * (2 * n + 1) * k / (2 * size))
+    matrix[0] /= np.sqrt(2.0)
+    return T.cast(Frames, matrix.astype(np.float32))
+
+
+DCT = dct_matrix(size=4 * HASH_SIZE)
+
+
+def phash(frames: Frames) -> Hashes:
+    """Compute the perceptual hashes of frames (low frequencies of a 32x32 DCT)."""
+    thumbnails = downsample(frames, height=4 * HASH_SIZE, width=4 * HASH_SIZE)
+    coefficients = (DCT @ thumbnails @ DCT.T)[..., :HASH_SIZE, :HASH_SIZE]
+    flat = coefficients.reshape(*coefficients.shape[:-2], -1)[..., 1:]  # without the DC term
+    medians = np.median(flat, axis=-1)[..., None, None]
+    return pack(coefficients > medians)
+
+
+def hamming(a: Hashes, b: Hashes) -> npt.NDArray[np.uint8]:
+    """Compute the hamming distances between hashes (0 to 64 bits)."""
+    return T.cast(npt.NDArray[np.uint8], np.bitwise_count(np.bitwise_xor(a, b)))
+
+
+def capture(driver: drivers.Driver, scale: float = 1.0) -> Frames | None:
+    """Capture a grayscale frame of the browser window (None in HTTP mode)."""
+    if isinstance(driver, drivers.HttpDriver) and driver.browser is None:
+        return None
+    if scale < 1.0 and hasattr(driver, "execute_cdp_cmd"):  # chrome: cheap small captures
+        size = driver.execute_script("return [innerWidth, innerHeight];")
+        clip = {"x": 0, "y": 0, "width": size[0], "height": size[1], "scale": scale}
+        params = {"format": "png", "clip": clip, "optimizeForSpeed": True}
+        result = driver.execute_cdp_cmd("Page.captureScreenshot", params)
+        return decode_png(base64.b64decode(result["data"]))
+    return decode_png(driver.get_screenshot_as_png())
+
+
+def wait_until_stable(driver: drivers.Driver, config: StabilityConfig) -> Stability:
+    """Wait until consecutive captures of the browser window are visually stable."""
+    start = time.perf_counter()
+    previous, captures, stables = None, 0, 0
+    while time.perf_counter() - start < config.timeout:
+        frame = capture(driver=driver, scale=config.scale)
+        if frame is None:
+            return Stability(stable=True, captures=captures, elapsed=0.0)
+        captures += 1
+        if previous is not None and previous.shape == frame.shape:
+            difference = block_diff(previous, frame).max()
+            stables = stables + 1 if difference <= config.threshold else 0
+            if stables >= config.frames:
+                return Stability(True, captures, time.perf_counter() - start)
+        previous = frame
+        time.sleep(config.interval)
+    return Stability(False, captures, time.perf_counter() - start)
+
+
+def benchmark(
+    frames: int = 4096, height: int = 64, width: int = 64, captures: int = 32, scale: float = 0.125
+) -> dict[str, float]:
+    """Benchmark the decoding of captures (at a scale of 1920x1080) and the analyses of frames.
+
+    Speeds are in frames per second. The captures are paeth filtered (worst case to decode),
+    and the pipeline decodes, compares, and hashes each capture like the stability waits.
+    """
+    rng = np.random.default_rng(seed=0)
+    batch = rng.random((frames, height, width), dtype=np.float32)
+    size = (int(1080 * scale), int(1920 * scale))
+    pixels = rng.integers(0, 256, size=(captures, *size), dtype=np.uint8)
+    pngs = [encode_png(pixels=frame) for frame in pixels]
+    decoded = [decode_png(data=png) for png in pngs[:2]]
+    analyses: dict[str, tuple[int, T.Callable[[], T.Any]]] = {
+        "decode_png": (captures, lambda: [decode_png(data=png) for png in pngs]),
+        "pipeline": (
+            captures,
+            lambda: [
+                (block_diff(decoded[0], frame).max(), dhash(frame))
+                for frame in map(decode_png, pngs)
+            ],
+        ),
+        "block_diff": (frames, lambda: block_diff(batch[1:], batch[:-1])),
+        "dhash": (frames, lambda: dhash(batch)),
+        "phash": (frames, lambda: phash(batch)),
+        "hamming": (frames, lambda: hamming(dhash(batch[1:]), dhash(batch[:-1]))),
+    }
+    speeds = {}
+    for name, (count, analysis) in analyses.items():
+        start = time.perf_counter()
+        analysis()
+        speeds[name] = count / (time.perf_counter() - start)
+    return speeds
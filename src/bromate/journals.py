@@ -0,0 +1,216 @@
+"""Journal the execution steps to resume and analyze the runs."""
+
+# %% IMPORTS
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import typing as T
+import uuid
+
+from bromate import agents, types
+
+# %% CONSTANTS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id TEXT PRIMARY KEY,
+    query TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS steps (
+    run_id TEXT NOT NULL REFERENCES runs (id),
+    step INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    response TEXT NOT NULL,
+    request TEXT NOT NULL,
+    payloads TEXT NOT NULL,
+    duration REAL NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (run_id, step)
+);
+"""
+
+# %% CLASSES
+
+
+class JournalConfig(types.ImmutableData):
+    """Config for the journal."""
+
+    path: str | None = types.Field(
+        default=None, description="Path of the journal database (SQLite, disabled if null)"
+    )
+    resume: str | None = types.Field(
+        default=None, description="Run id to resume from the journal ('last' for the latest run)"
+    )
+
+
+class Run(types.ImmutableData):
+    """Run recorded in the journal."""
+
+    id: str = types.Field(description="Id of the run")
+    query: str = types.Field(description="User query of the run")
+    status: str = types.Field(description="Status of the run (running, done)")
+    steps: int = types.Field(description="Number of recorded steps")
+    duration: float = types.Field(description="Total duration of the recorded steps")
+    created: float = types.Field(description="Creation time of the run")
+
+
+class Step(T.NamedTuple):
+    """Step recorded in the journal."""
+
+    step: int
+    digest: str
+    response: agents.Content
+    request: agents.Content
+    payloads: list[str]
+    duration: float
+
+
+class Journal:
+    """Append-only journal of the execution steps (SQLite)."""
+
+    def __init__(self, path: str) -> None:
+        """Open (or create) the journal database."""
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+
+    def start(self, query: str) -> str:
+        """Start a new run and return its id."""
+        run_id, now = uuid.uuid4().hex, time.time()
+        with self.lock:
+            self.connection.execute(
+                "INSERT INTO runs VALUES (?, ?, ?, ?, ?)", (run_id, query, "running", now, now)
+            )
+        return run_id
+
+    def begin(self, query: str | None, resume: str | None = None) -> str:
+        """Resume a run if it exists, or start a new run, and return its id."""
+        if resume is not None and (run_id := self.resolve(run_id=resume)):
+            return run_id
+        if query is None:
+            raise ValueError(f"Cannot start a run without a query (run not found): {resume}!")
+        return self.start(query=query)
+
+    def resolve(self, run_id: str) -> str | None:
+        """Resolve a run id ('last' for the latest run), or None if not found."""
+        if run_id == "last":
+            sql, args = "SELECT id FROM runs ORDER BY created DESC LIMIT 1", []
+        else:
+            sql, args = "SELECT id FROM runs WHERE id = ?", [run_id]
+        with self.lock:
+            row = self.connection.execute(sql, args).fetchone()
+        return row[0] if row else None
+
+    def query(self, run_id: str) -> str:
+        """Return the user query of a run."""
+        with self.lock:
+            row = self.connection.execute("SELECT query FROM runs WHERE id = ?", (run_id,))
+            return str(row.fetchone()[0])
+
+    def record(
+        self,
+        run_id: str,
+        step: int,
+        digest: str,
+        response: agents.Content,
+        request: agents.Content,
+        payloads: list[str],
+        duration: float,
+    ) -> None:
+        """Record a complete step (agent response and user request) of a run."""
+        now = time.time()
+        with self.lock:
+            self.connection.execute("BEGIN")
+            self.connection.execute(
+                "INSERT OR REPLACE INTO steps VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    run_id,
+                    step,
+                    digest,
+                    agents.Content.to_json(response, indent=None),
+                    agents.Content.to_json(request, indent=None),
+                    json.dumps(payloads),
+                    duration,
+                    now,
+                ),
+            )
+            self.connection.execute("UPDATE runs SET updated = ? WHERE id = ?", (now, run_id))
+            self.connection.execute("COMMIT")
+
+    def finish(self, run_id: str, status: str = "done") -> None:
+        """Finish a run with a status."""
+        with self.lock:
+            self.connection.execute(
+                "UPDATE runs SET status = ?, updated = ? WHERE id = ?",
+                (status, time.time(), run_id),
+            )
+
+    def steps(self, run_id: str) -> list[Step]:
+        """Return the recorded steps of a run in order."""
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT step, digest, response, request, payloads, duration FROM steps "
+                "WHERE run_id = ? ORDER BY step",
+                (run_id,),
+            ).fetchall()
+        return [
+            Step(
+                step=step,
+                digest=digest,
+                response=agents.Content.from_json(response),
+                request=agents.Content.from_json(request),
+                payloads=json.loads(payloads),
+                duration=duration,
+            )
+            for step, digest, response, request, payloads, duration in rows
+        ]
+
+    def runs(self, limit: int = 100) -> list[Run]:
+        """Return the latest runs with their step statistics (for analysis)."""
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT r.id, r.query, r.status, COUNT(s.step), COALESCE(SUM(s.duration), 0), "
+                "r.created FROM runs r LEFT JOIN steps s ON s.run_id = r.id "
+                "GROUP BY r.id ORDER BY r.created DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        keys = ["id", "query", "status", "steps", "duration", "created"]
+        return [Run.model_validate(dict(zip(keys, row, strict=True))) for row in rows]
+
+    def close(self) -> None:
+        """Close the journal database."""
+        with self.lock:
+            self.connection.close()
+
+
+# %% FUNCTIONS
+
+
+def origin(query: str) -> str:
+    """Return the digest of a run history from its user query (without session hints)."""
+    return chain("", agents.Content(role=agents.Role.USER.value, parts=[agents.Part(text=query)]))
+
+
+def chain(digest: str, *contents: agents.Content) -> str:
+    """Chain the digest of a request history with new contents."""
+    hasher = hashlib.sha256(digest.encode())
+    for content in contents:
+        hasher.update(agents.Content.to_json(content, indent=None, sort_keys=True).encode())
+    return hasher.hexdigest()
+
+
+def init_journal_from_config(config: JournalConfig) -> Journal | None:
+    """Initialize a journal from config (None if disabled)."""
+    if config.path is None:
+        return None
+    return Journal(path=os.path.expanduser(config.path))
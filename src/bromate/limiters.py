@@ -0,0 +1,242 @@
+"""Limit the request rate of the agent and retry on quota errors."""
+
+# %% IMPORTS
+
+import fcntl
+import json
+import os
+import random
+import threading
+import time
+import typing as T
+
+import pydantic as pdt
+from google.api_core import exceptions
+from loguru import logger
+
+from bromate import agents, types
+
+# %% CLASSES
+
+
+class LimiterConfig(types.ImmutableData):
+    """Config for the limiter."""
+
+    requests_per_minute: pdt.PositiveInt = types.Field(
+        default=15, description="Maximum number of agent requests per minute"
+    )
+    tokens_per_minute: pdt.PositiveInt = types.Field(
+        default=1_000_000, description="Maximum number of agent tokens per minute"
+    )
+    tokens_per_request: pdt.PositiveInt = types.Field(
+        default=2_000, description="Estimated tokens of the first request (before any usage)"
+    )
+    state_path: str | None = types.Field(
+        default=None,
+        description="Path of a state file to share the limits across processes (in-memory if null)",
+    )
+    max_retries: pdt.NonNegativeInt = types.Field(
+        default=5, description="Maximum number of retries on transient agent errors"
+    )
+    backoff_base: pdt.PositiveFloat = types.Field(
+        default=1.0, description="Base delay (in seconds) of the exponential backoff"
+    )
+    backoff_max: pdt.PositiveFloat = types.Field(
+        default=60.0, description="Maximum delay (in seconds) of the exponential backoff"
+    )
+    deadline: pdt.PositiveFloat | None = types.Field(
+        default=None, description="Maximum time (in seconds) to spend on a single agent request"
+    )
+
+
+class LimiterMetrics(types.MutableData):
+    """Metrics of the limiter."""
+
+    requests: int = types.Field(default=0, description="Number of requests sent to the agent")
+    retries: int = types.Field(default=0, description="Number of retries on transient errors")
+    queued_time: float = types.Field(default=0.0, description="Total time spent waiting in queue")
+    queued_max: float = types.Field(default=0.0, description="Maximum time spent waiting in queue")
+    backoff_time: float = types.Field(default=0.0, description="Total time spent in backoff")
+
+    @property
+    def queued_mean(self) -> float:
+        """Mean time spent waiting in queue per request."""
+        return self.queued_time / self.requests if self.requests else 0.0
+
+
+class TokenBucket:
+    """Token buckets for requests and tokens, shared across threads and processes.
+
+    The state is kept in memory, or in a state file locked with `flock` for
+    processes of the same host when a path is given.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int, path: str | None) -> None:
+        """Initialize the buckets with full capacity."""
+        self.capacities = {
+            "requests": float(requests_per_minute),
+            "tokens": float(tokens_per_minute),
+        }
+        self.path = path
+        self.lock = threading.Lock()
+        self.state: dict[str, float] = {**self.capacities, "updated": time.time()}
+
+    def _load(self, file: T.IO[str]) -> dict[str, float]:
+        """Load the state from a locked file (or the initial state if empty)."""
+        file.seek(0)
+        text = file.read()
+        return json.loads(text) if text else {**self.capacities, "updated": time.time()}
+
+    def _save(self, file: T.IO[str], state: dict[str, float]) -> None:
+        """Save the state to a locked file."""
+        file.seek(0)
+        file.truncate()
+        file.write(json.dumps(state))
+        file.flush()
+
+    def _take(self, state: dict[str, float], tokens: float) -> float:
+        """Refill the state and take from it, or return the time to wait before retrying."""
+        now = time.time()
+        elapsed = max(0.0, now - state["updated"])
+        waits = []
+        for key, capacity in self.capacities.items():
+            state[key] = min(capacity, state[key] + elapsed * capacity / 60.0)
+        state["updated"] = now
+        needs = {"requests": 1.0, "tokens": min(tokens, self.capacities["tokens"])}
+        for key, need in needs.items():
+            if state[key] < need:
+                waits.append((need - state[key]) * 60.0 / self.capacities[key])
+        if waits:
+            return max(waits)
+        state["requests"] -= needs["requests"]
+        state["tokens"] -= needs["tokens"]
+        return 0.0
+
+    def _transact(self, action: T.Callable[[dict[str, float]], float]) -> float:
+        """Run an action on the state while holding the thread and file locks."""
+        with self.lock:
+            if self.path is None:
+                return action(self.state)
+            with open(self.path, "a+", encoding="utf-8") as file:
+                fcntl.flock(file, fcntl.LOCK_EX)
+                try:
+                    state = self._load(file)
+                    result = action(state)
+                    self._save(file, state)
+                    return result
+                finally:
+                    fcntl.flock(file, fcntl.LOCK_UN)
+
+    def acquire(self, tokens: float, deadline: float | None = None) -> float:
+        """Block until a request of tokens can be sent (before a deadline) and return the time waited."""
+        start = time.monotonic()
+        while wait := self._transact(lambda state: self._take(state, tokens)):
+            if deadline is not None and time.monotonic() + wait > deadline:
+                raise TimeoutError(
+                    f"Cannot acquire the rate limits before the deadline (wait {wait:.2f}s)!"
+                )
+            time.sleep(wait)
+        return time.monotonic() - start
+
+    def adjust(self, tokens: float) -> None:
+        """Debit (or refund if negative) tokens after the actual usage is known."""
+
+        def action(state: dict[str, float]) -> float:
+            state["tokens"] = min(self.capacities["tokens"], state["tokens"] - tokens)
+            return 0.0
+
+        self._transact(action)
+
+
+class LimitedAgent:
+    """Agent wrapper that limits the request rate and retries transient errors."""
+
+    RETRYABLES: tuple[type[Exception], ...] = (
+        exceptions.TooManyRequests,
+        exceptions.ResourceExhausted,
+        exceptions.ServiceUnavailable,
+        exceptions.InternalServerError,
+        exceptions.DeadlineExceeded,
+    )
+
+    def __init__(self, agent: agents.Agent, config: LimiterConfig, bucket: TokenBucket) -> None:
+        """Initialize the wrapper from an agent, a config, and a (shared) bucket."""
+        self.agent = agent
+        self.config = config
+        self.bucket = bucket
+        self.metrics = LimiterMetrics()
+        self.estimate = float(config.tokens_per_request)
+
+    def backoff(self, attempt: int) -> float:
+        """Compute a jittered exponential delay for the given attempt (full jitter)."""
+        delay = min(self.config.backoff_max, self.config.backoff_base * 2**attempt)
+        return random.uniform(0, delay)  # nosec B311
+
+    def queue(self, deadline: float | None = None) -> None:
+        """Wait for a slot in the buckets (before a deadline) and track the queueing delay."""
+        queued = self.bucket.acquire(tokens=self.estimate, deadline=deadline)
+        self.metrics.requests += 1
+        self.metrics.queued_time += queued
+        self.metrics.queued_max = max(self.metrics.queued_max, queued)
+
+    def generate_content(
+        self, contents: list[agents.Content], tools: list[agents.Tool]
+    ) -> agents.Response:
+        """Generate content with the agent under rate limits and retries."""
+        start = time.monotonic()
+        deadline = start + self.config.deadline if self.config.deadline else None
+        attempt = 0
+        while True:
+            self.queue(deadline=deadline)
+            try:
+                response = self.agent.generate_content(contents=contents, tools=tools)
+            except self.RETRYABLES as error:
+                delay = self.backoff(attempt=attempt)
+                attempt += 1
+                if attempt > self.config.max_retries:
+                    raise
+                if deadline is not None and time.monotonic() + delay > deadline:
+                    logger.error("Agent deadline exceeded after {} attempts: {}", attempt, error)
+                    raise
+                logger.warning(
+                    "Agent error (attempt {}), retrying in {:.2f}s: {}", attempt, delay, error
+                )
+                self.metrics.retries += 1
+                self.metrics.backoff_time += delay
+                time.sleep(delay)
+                continue
+            if usage := response.usage_metadata:
+                self.bucket.adjust(tokens=usage.total_token_count - self.estimate)
+                self.estimate = float(usage.total_token_count)
+            logger.debug("Limiter metrics: {}", self.metrics)
+            return response
+
+    def stream_content(
+        self, contents: list[agents.Content], tools: list[agents.Tool]
+    ) -> T.Iterator[agents.Response]:
+        """Stream response chunks from contents and tools (limited, not retried)."""
+        self.queue()
+        yield from self.agent.stream_content(contents=contents, tools=tools)
+
+    def count_tokens(self, contents: list[agents.Content], tools: list[agents.Tool]) -> int:
+        """Count the input tokens of contents and tools."""
+        return self.agent.count_tokens(contents=contents, tools=tools)
+
+
+# %% FUNCTIONS
+
+
+def init_bucket_from_config(config: LimiterConfig) -> TokenBucket:
+    """Initialize a token bucket from config."""
+    path = os.path.expanduser(config.state_path) if config.state_path else None
+    return TokenBucket(
+        requests_per_minute=config.requests_per_minute,
+        tokens_per_minute=config.tokens_per_minute,
+        path=path,
+    )
+
+
+def init_limited_agent_from_config(agent: agents.Agent, config: LimiterConfig) -> LimitedAgent:
+    """Initialize a limited agent from an agent and a config."""
+    bucket = init_bucket_from_config(config=config)
+    return LimitedAgent(agent=agent, config=config, bucket=bucket)
@@ -0,0 +1,265 @@
+"""Store large payloads (e.g., screenshots) once and reference them in contents."""
+
+# %% IMPORTS
+
+import hashlib
+import os
+import resource
+import threading
+import typing as T
+
+import pydantic as pdt
+
+from bromate import agents, types
+
+# %% CONSTANTS
+
+# URI scheme of the payload references
+SCHEME = "payload://"
+
+# %% CLASSES
+
+
+class PayloadConfig(types.ImmutableData):
+    """Config for the payloads."""
+
+    spill_path: str | None = types.Field(
+        default=None, description="Folder to spill large payloads on disk (in memory if null)"
+    )
+    spill_size: pdt.NonNegativeInt = types.Field(
+        default=64 * 1024, description="Minimum size (in bytes) of the payloads to spill on disk"
+    )
+    fields: list[str] = types.Field(
+        default=["page_source"], description="Fields of the action results stored as payloads"
+    )
+    max_inline: pdt.PositiveInt | None = types.Field(
+        default=None,
+        description="Number of latest payloads sent to the agent (older ones omitted, all if null)",
+    )
+
+
+class PayloadMetrics(types.MutableData):
+    """Metrics of the payloads."""
+
+    puts: int = types.Field(default=0, description="Number of payloads put in the store")
+    hits: int = types.Field(default=0, description="Number of payloads already in the store")
+    stored_bytes: int = types.Field(default=0, description="Bytes stored in memory")
+    spilled_bytes: int = types.Field(default=0, description="Bytes spilled on disk")
+    saved_bytes: int = types.Field(default=0, description="Bytes saved by deduplication")
+    inlined: int = types.Field(default=0, description="Number of payloads copied in requests")
+    omitted: int = types.Field(default=0, description="Number of older payloads omitted")
+
+
+class PayloadStore:
+    """Content-addressed store of payloads (in memory or spilled on disk)."""
+
+    def __init__(
+        self,
+        spill_path: str | None = None,
+        spill_size: int = 0,
+        fields: list[str] | None = None,
+        max_inline: int | None = None,
+    ) -> None:
+        """Initialize an empty store."""
+        self.spill_path = spill_path
+        self.spill_size = spill_size
+        self.fields = fields or []
+        self.max_inline = max_inline
+        self.blobs: dict[str, bytes] = {}
+        self.files: dict[str, str] = {}
+        self.cache: dict[int, tuple[agents.Content, int, bool, agents.Content]] = {}
+        self.lock = threading.Lock()
+        self.metrics = PayloadMetrics()
+        if spill_path is not None:
+            os.makedirs(spill_path, exist_ok=True)
+
+    def __contains__(self, digest: str) -> bool:
+        """Check if a payload is in the store (or spilled by a previous run)."""
+        if digest in self.blobs or digest in self.files:
+            return True
+        if self.spill_path is not None and os.path.exists(path := self.path(digest)):
+            self.files[digest] = path
+            return True
+        return False
+
+    def path(self, digest: str) -> str:
+        """Return the spill path of a payload."""
+        return os.path.join(T.cast(str, self.spill_path), f"{digest}.bin")
+
+    def put(self, data: bytes) -> str:
+        """Put a payload in the store and return its digest."""
+        digest = hashlib.sha256(data).hexdigest()
+        with self.lock:
+            self.metrics.puts += 1
+            if digest in self:
+                self.metrics.hits += 1
+                self.metrics.saved_bytes += len(data)
+            elif self.spill_path is not None and len(data) >= self.spill_size:
+                path = self.path(digest)
+                if not os.path.exists(path):
+                    with open(path, "wb") as file:
+                        file.write(data)
+                self.files[digest] = path
+                self.metrics.spilled_bytes += len(data)
+            else:
+                self.blobs[digest] = data
+                self.metrics.stored_bytes += len(data)
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        """Get a payload from the store given its digest."""
+        if digest in self.blobs:
+            return self.blobs[digest]
+        if digest in self and (path := self.files.get(digest)):
+            with open(path, "rb") as file:
+                return file.read()
+        raise KeyError(f"Cannot get payload from store (unknown digest): {digest}!")
+
+    def reference(self, data: bytes, mime_type: str) -> agents.Part:
+        """Put a payload in the store and return a part that references it."""
+        digest = self.put(data=data)
+        uri = f"{SCHEME}{digest}"
+        return agents.Part(file_data=agents.FileData(mime_type=mime_type, file_uri=uri))
+
+    def refer(self, structure: agents.Structure) -> agents.Structure:
+        """Put the payload fields of a result in the store and reference them."""
+        response = dict(structure.response)
+        keys = [key for key in self.fields if isinstance(response.get(key), str)]
+        if not keys:
+            return structure
+        for key in keys:
+            response[key] = f"{SCHEME}{self.put(data=response[key].encode())}"
+        return agents.Structure(name=structure.name, response=response)
+
+    def inline(self, part: agents.Part, omit: bool) -> agents.Part:
+        """Replace the payload references of a part with their data (or omit them)."""
+        if is_reference(part):
+            uri = part.file_data.file_uri
+            if omit is True or digest(part) not in self:
+                self.metrics.omitted += 1
+                return agents.Part(text=f"[{part.file_data.mime_type} omitted: {uri}]")
+            self.metrics.inlined += 1
+            data = self.get(digest=digest(part))
+            return agents.Part(
+                inline_data=agents.Blob(mime_type=part.file_data.mime_type, data=data)
+            )
+        structure = part.function_response
+        response = dict(structure.response)
+        for key, uri in fields(part).items():
+            if omit is True or uri.removeprefix(SCHEME) not in self:
+                self.metrics.omitted += 1
+                response[key] = f"[{key} omitted: {uri}]"
+            else:
+                self.metrics.inlined += 1
+                response[key] = self.get(digest=uri.removeprefix(SCHEME)).decode()
+        return agents.Part(
+            function_response=agents.Structure(name=structure.name, response=response)
+        )
+
+    def materialize(self, contents: list[agents.Content]) -> list[agents.Content]:
+        """Replace the payload references of contents with their data (the latest ones only).
+
+        The materialized contents are cached while their payloads stay in (or out of) the
+        latest ones, so each payload is copied in the requests once instead of every step.
+        """
+        entries = [
+            entry
+            if (entry := self.cache.get(id(content))) is not None and entry[0] is content
+            else None
+            for content in contents
+        ]
+        counts = [
+            entry[1] if entry is not None else sum(references(part) for part in content.parts)
+            for content, entry in zip(contents, entries, strict=True)
+        ]
+        omitted = 0 if self.max_inline is None else max(sum(counts) - self.max_inline, 0)
+        cache, materialized, seen = {}, [], 0
+        for content, entry, count in zip(contents, entries, counts, strict=True):
+            omit = seen + count <= omitted  # all the payloads of the content are older
+            seen += count
+            if count == 0:
+                result = content  # shared: no copy
+            elif entry is not None and entry[2] == omit:
+                result = entry[3]
+            else:
+                parts = [
+                    self.inline(part=part, omit=omit) if references(part) else part
+                    for part in content.parts
+                ]
+                result = agents.Content(role=content.role, parts=parts)
+            cache[id(content)] = (content, count, omit, result)
+            materialized.append(result)
+        self.cache = cache  # forget the contents of the previous requests
+        return materialized
+
+
+# %% FUNCTIONS
+
+
+def is_reference(part: agents.Part) -> bool:
+    """Check if a part references a payload."""
+    return bool(part.file_data) and part.file_data.file_uri.startswith(SCHEME)
+
+
+def digest(part: agents.Part) -> str:
+    """Return the payload digest of a reference part."""
+    return T.cast(str, part.file_data.file_uri).removeprefix(SCHEME)
+
+
+def fields(part: agents.Part) -> dict[str, str]:
+    """Return the payload references of the result fields of a part."""
+    if not part.function_response:
+        return {}
+    return {
+        key: val
+        for key, val in part.function_response.response.items()
+        if isinstance(val, str) and val.startswith(SCHEME)
+    }
+
+
+def references(part: agents.Part) -> int:
+    """Return the number of payloads referenced by a part (file or result fields)."""
+    return 1 if is_reference(part) else len(fields(part))
+
+
+def digests(part: agents.Part) -> list[str]:
+    """Return the payload digests referenced by a part."""
+    if is_reference(part):
+        return [digest(part)]
+    return [uri.removeprefix(SCHEME) for uri in fields(part).values()]
+
+
+def describe(part: agents.Part, size: int = 200) -> str:
+    """Describe a part for logs without stringifying its payloads."""
+    if part.text:
+        text = part.text.strip()
+        return text if len(text) <= size else f"{text[:size]}... [{len(text)} chars]"
+    if part.inline_data:
+        return f"<{part.inline_data.mime_type}: {len(part.inline_data.data)} bytes>"
+    if part.file_data:
+        return f"<{part.file_data.mime_type}: {part.file_data.file_uri}>"
+    if call := part.function_call:
+        kwargs_text = ", ".join(f"{key}={str(val)[:size]}" for key, val in call.args.items())
+        return f"{call.name}({kwargs_text})"
+    if structure := part.function_response:
+        sizes = ", ".join(
+            f"{key}=[{len(str(val))} chars]" for key, val in structure.response.items()
+        )
+        return f"{structure.name} -> {{{sizes}}}"
+    return f"<{type(part).__name__}>"
+
+
+def peak_rss() -> int:
+    """Return the peak resident set size of the process (in bytes)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # KiB on Linux
+
+
+def init_store_from_config(config: PayloadConfig) -> PayloadStore:
+    """Initialize a payload store from config."""
+    spill_path = os.path.expanduser(config.spill_path) if config.spill_path else None
+    return PayloadStore(
+        spill_path=spill_path,
+        spill_size=config.spill_size,
+        fields=config.fields,
+        max_inline=config.max_inline,
+    )
@@ -0,0 +1,159 @@
+"""Prefetch the pages of the links the agent is likely to follow next."""
+
+# %% IMPORTS
+
+import re
+import urllib.parse
+import weakref
+
+import pydantic as pdt
+
+from bromate import documents, drivers, extractions, types
+
+# %% CONSTANTS
+
+# links with side effects that must not be prefetched
+UNSAFE = re.compile(
+    r"log-?out|sign-?out|delete|remove|unsubscribe|add-?to-?cart|checkout", re.IGNORECASE
+)
+# classes of the links styled as prominent buttons
+PROMINENT = re.compile(r"btn|button|cta|primary|hero", re.IGNORECASE)
+# script to inject prefetch hints in the page
+PREFETCH_SCRIPT = """
+for (const url of arguments[0]) {
+  if (document.querySelector(`link[rel=prefetch][href="${CSS.escape(url)}"]`)) continue;
+  const link = document.createElement('link');
+  link.rel = 'prefetch';
+  link.href = url;
+  document.head.appendChild(link);
+}
+"""
+
+# %% CLASSES
+
+
+class PrefetchConfig(types.ImmutableData):
+    """Config for the prefetches."""
+
+    enabled: bool = types.Field(
+        default=False, description="Prefetch the most prominent links after loading a page"
+    )
+    max_links: pdt.PositiveInt = types.Field(
+        default=3, description="Maximum number of links to prefetch per page"
+    )
+    same_host: bool = types.Field(
+        default=True, description="Only prefetch the links to the host of the page"
+    )
+
+
+class PrefetchMetrics(types.MutableData):
+    """Metrics of the prefetches."""
+
+    navigations: int = types.Field(default=0, description="Number of navigations")
+    prefetched: int = types.Field(default=0, description="Number of links prefetched")
+    hits: int = types.Field(default=0, description="Number of navigations to a prefetched link")
+    hit_time: float = types.Field(default=0.0, description="Total latency of the hits")
+    miss_time: float = types.Field(default=0.0, description="Total latency of the misses")
+
+    @property
+    def hit_rate(self) -> float:
+        """Ratio of navigations to a prefetched link."""
+        return self.hits / self.navigations if self.navigations else 0.0
+
+    @property
+    def hit_latency(self) -> float:
+        """Mean latency of the navigations to a prefetched link."""
+        return self.hit_time / self.hits if self.hits else 0.0
+
+    @property
+    def miss_latency(self) -> float:
+        """Mean latency of the other navigations."""
+        misses = self.navigations - self.hits
+        return self.miss_time / misses if misses else 0.0
+
+
+class Prefetcher:
+    """Prefetcher of the links of a driver."""
+
+    def __init__(self, config: PrefetchConfig) -> None:
+        """Initialize the prefetcher from config."""
+        self.config = config
+        self.metrics = PrefetchMetrics()
+        self.url: str | None = None
+        self.urls: list[str] = []
+
+    def visit(self, driver: drivers.Driver, latency: float) -> None:
+        """Record a navigation to the current page (hit if its link was prefetched)."""
+        url = urllib.parse.urldefrag(driver.current_url).url
+        if url == self.url:
+            return  # no navigation
+        if self.url is not None:
+            if isinstance(driver, drivers.HttpDriver) and driver.browser is None:
+                hit = driver.warm  # the requested url can redirect
+            else:
+                hit = url in self.urls
+            self.metrics.navigations += 1
+            if hit is True:
+                self.metrics.hits += 1
+                self.metrics.hit_time += latency
+            else:
+                self.metrics.miss_time += latency
+        self.url = url
+
+    def warm(self, driver: drivers.Driver) -> list[str]:
+        """Prefetch the most prominent links of the current page and return them."""
+        if isinstance(driver, drivers.HttpDriver) and driver.browser is None:
+            document = driver.page.document
+        else:
+            document = documents.parse(driver.page_source)
+        self.urls = rank(
+            document=document,
+            base_url=driver.current_url,
+            max_links=self.config.max_links,
+            same_host=self.config.same_host,
+        )
+        if isinstance(driver, drivers.HttpDriver) and driver.browser is None:
+            driver.prefetch(urls=self.urls)
+        elif self.urls:
+            driver.execute_script(PREFETCH_SCRIPT, self.urls)
+        self.metrics.prefetched += len(self.urls)
+        return self.urls
+
+
+# %% FUNCTIONS
+
+
+def rank(document: documents.Node, base_url: str, max_links: int, same_host: bool) -> list[str]:
+    """Rank the links of a page by prominence (position, main content, button style)."""
+    current = urllib.parse.urlsplit(base_url)
+    contents = {id(node) for node in extractions.find_main(document).iter()}
+    scores: dict[str, float] = {}
+    for index, node in enumerate(document.select("a[href]")):
+        href = node.attrs["href"].strip()
+        if not href or href.startswith(("#", "javascript:", "mailto:", "tel:")):
+            continue
+        url = urllib.parse.urldefrag(urllib.parse.urljoin(base_url, href)).url
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ("http", "https") or url == base_url or UNSAFE.search(url):
+            continue
+        if same_host is True and parts.netloc != current.netloc:
+            continue
+        score = 1.0 / (1.0 + index / 10)  # earlier links are more prominent
+        if id(node) in contents:
+            score *= 2.0
+        if PROMINENT.search(node.attrs.get("class", "")):
+            score *= 1.5
+        if not node.text():
+            score *= 0.5
+        scores[url] = scores.get(url, 0.0) + score  # repeated links add up
+    return sorted(scores, key=lambda url: -scores[url])[:max_links]
+
+
+PREFETCHERS: "weakref.WeakKeyDictionary[drivers.Driver, Prefetcher]" = weakref.WeakKeyDictionary()
+
+
+def prefetcher(driver: drivers.Driver, config: PrefetchConfig) -> Prefetcher:
+    """Return the prefetcher of a driver (created on first use)."""
+    if driver not in PREFETCHERS:
+        PREFETCHERS[driver] = Prefetcher(config=config)
+    return PREFETCHERS[driver]
@@ -0,0 +1,173 @@
+"""Shape the action results within byte budgets before sending them to the agent."""
+
+# %% IMPORTS
+
+import typing as T
+import weakref
+
+import pydantic as pdt
+
+from bromate import agents, drivers, payloads, types
+
+# %% CONSTANTS
+
+# size (in bytes) reserved for the truncation marker
+MARKER_SIZE = 128
+# window (in bytes) to look for an element or line boundary around a cut
+WINDOW = 256
+
+# %% CLASSES
+
+
+class ResultConfig(types.ImmutableData):
+    """Config for the results."""
+
+    enabled: bool = types.Field(
+        default=False, description="Truncate the action results that exceed their budgets"
+    )
+    field_size: pdt.PositiveInt = types.Field(
+        default=16 * 1024, description="Maximum size (in bytes) of a result field"
+    )
+    response_size: pdt.PositiveInt = types.Field(
+        default=32 * 1024, description="Maximum size (in bytes) of all the result fields"
+    )
+    error_size: pdt.PositiveInt = types.Field(
+        default=1024, description="Maximum size (in bytes) of an error (without stack traces)"
+    )
+    policy: T.Literal["head", "head_tail"] = types.Field(
+        default="head_tail", description="Part of a truncated field to keep (head and/or tail)"
+    )
+    head_ratio: float = types.Field(
+        default=0.8, ge=0.0, le=1.0, description="Ratio of the head in the head_tail policy"
+    )
+
+
+class ResultMetrics(types.MutableData):
+    """Metrics of the results."""
+
+    responses: int = types.Field(default=0, description="Number of results shaped")
+    truncated: int = types.Field(default=0, description="Number of fields truncated")
+    original_bytes: int = types.Field(default=0, description="Bytes of the original fields")
+    removed_bytes: int = types.Field(default=0, description="Bytes removed by truncation")
+
+    @property
+    def removed_ratio(self) -> float:
+        """Ratio of bytes removed by truncation."""
+        return self.removed_bytes / self.original_bytes if self.original_bytes else 0.0
+
+
+class Shaper:
+    """Shaper of the action results (the overflows are kept in a payload store)."""
+
+    def __init__(self, config: ResultConfig, store: payloads.PayloadStore) -> None:
+        """Initialize the shaper from config and a store for the overflows."""
+        self.config = config
+        self.store = store
+        self.metrics = ResultMetrics()
+        self.handles: dict[str, str] = {}  # handle -> digest
+
+    def fit(self, value: str, size: int) -> str:
+        """Fit a value within a size, keeping the overflow behind a handle."""
+        data = value.encode()
+        if len(data) <= size:
+            return value
+        digest = self.store.put(data=data)
+        handle = digest[:12]
+        self.handles[handle] = digest
+        keep = max(size - MARKER_SIZE, 0)
+        head_size = (
+            int(keep * self.config.head_ratio) if self.config.policy == "head_tail" else keep
+        )
+        head_end = cut(data=data, index=head_size, backward=True)
+        tail_start = len(data)
+        if self.config.policy == "head_tail":
+            tail_start = max(cut(data=data, index=len(data) - (keep - head_size)), head_end)
+        removed = tail_start - head_end
+        marker = (
+            f"\n[... {removed} bytes truncated: call read_more with "
+            f"handle={handle} and offset={head_end} ...]\n"
+        )
+        self.metrics.truncated += 1
+        self.metrics.removed_bytes += removed
+        return data[:head_end].decode() + marker + data[tail_start:].decode()
+
+    def shape(self, structure: agents.Structure) -> agents.Structure:
+        """Shape the string fields of a result within the field and response budgets."""
+        if self.config.enabled is False:
+            return structure
+        self.metrics.responses += 1
+        response = dict(structure.response)
+        texts = {key: val for key, val in response.items() if isinstance(val, str)}
+        sizes = {key: len(val.encode()) for key, val in texts.items()}
+        self.metrics.original_bytes += sum(sizes.values())
+        budgets = {
+            key: self.config.error_size if key == "error" else self.config.field_size
+            for key in texts
+        }
+        if "error" in texts:
+            texts["error"] = clean_error(error=texts["error"])
+        for key in sorted(texts, key=lambda key: sizes[key], reverse=True):  # largest first
+            others = sum(min(sizes[other], budgets[other]) for other in texts if other != key)
+            budget = min(budgets[key], max(self.config.response_size - others, MARKER_SIZE))
+            texts[key] = self.fit(value=texts[key], size=budget)
+            sizes[key] = len(texts[key].encode())
+        if all(texts[key] == response[key] for key in texts):
+            return structure
+        response.update(texts)
+        return agents.Structure(name=structure.name, response=response)
+
+    def read(self, handle: str, offset: int = 0) -> dict[str, T.Any]:
+        """Read a page of an overflow given its handle and a byte offset."""
+        if handle not in self.handles:
+            raise ValueError(f"Cannot read more (unknown handle): {handle}!")
+        data = self.store.get(digest=self.handles[handle])
+        start = cut(data=data, index=max(0, min(offset, len(data))), boundary=False)
+        end = cut(data=data, index=start + self.config.field_size - MARKER_SIZE, backward=True)
+        end = end if end > start else min(len(data), start + self.config.field_size)
+        return {
+            "handle": handle,
+            "offset": start,
+            "next_offset": end if end < len(data) else None,
+            "total": len(data),
+            "content": data[start:end].decode(errors="replace"),
+        }
+
+
+# %% FUNCTIONS
+
+
+def clean_error(error: str) -> str:
+    """Remove the stack traces and session infos of a driver error."""
+    error = error.split("\nStacktrace:", 1)[0]
+    lines = [line for line in error.splitlines() if "(Session info:" not in line]
+    return "\n".join(lines).strip()
+
+
+def cut(data: bytes, index: int, backward: bool = False, boundary: bool = True) -> int:
+    """Move a cut to an element or line boundary (and always to a character boundary)."""
+    index = max(0, min(index, len(data)))
+    if boundary is True and 0 < index < len(data):
+        if backward is True:
+            start = max(0, index - WINDOW)
+            found = max(data.rfind(b">", start, index), data.rfind(b"\n", start, index))
+            index = found + 1 if found >= 0 else index
+        else:
+            end = min(len(data), index + WINDOW)
+            starts = (data.find(b"<", index, end), data.find(b"\n", index, end))
+            index = min((i for i in starts if i >= 0), default=index)
+    while 0 < index < len(data) and data[index] & 0xC0 == 0x80:  # utf-8 continuation byte
+        index += -1 if backward is True else 1
+    return index
+
+
+# shapers of the running executions (registered by the executions)
+SHAPERS: "weakref.WeakKeyDictionary[drivers.Driver, Shaper]" = weakref.WeakKeyDictionary()
+
+
+def shaper(
+    driver: drivers.Driver, config: ResultConfig, store: payloads.PayloadStore | None = None
+) -> Shaper:
+    """Return the shaper of the execution running on a driver (a new one if none)."""
+    if (current := SHAPERS.get(driver)) is not None:
+        return current
+    return Shaper(config=config, store=store or payloads.PayloadStore())
@@ -0,0 +1,130 @@
+"""Decide when to attach screenshots of the browser window to the agent."""
+
+# %% IMPORTS
+
+import typing as T
+
+import pydantic as pdt
+
+from bromate import backends, drivers, images, types
+
+# %% CLASSES
+
+
+class ScreenshotConfig(types.ImmutableData):
+    """Config for the screenshots."""
+
+    policy: T.Literal["always", "navigation", "change", "visual", "interval", "request"] = (
+        types.Field(
+            default="always",
+            description="When to attach a screenshot (the screenshot action always requests one)",
+        )
+    )
+    interval: pdt.PositiveInt = types.Field(
+        default=3, description="Number of steps between screenshots (interval policy)"
+    )
+    change_threshold: float = types.Field(
+        default=0.1,
+        ge=0.0,
+        le=1.0,
+        description="Ratio of changed page lines to attach a screenshot (change policy)",
+    )
+    visual_threshold: int = types.Field(
+        default=4,
+        ge=0,
+        le=64,
+        description="Bits of perceptual hash changed to attach a screenshot (visual policy)",
+    )
+    asynchronous: bool = types.Field(
+        default=False,
+        description="Capture the screenshot in the background while waiting for the user input",
+    )
+
+
+class ScreenshotMetrics(types.MutableData):
+    """Metrics of the screenshots."""
+
+    steps: int = types.Field(default=0, description="Number of decisions")
+    captured: int = types.Field(default=0, description="Number of screenshots attached")
+    skipped: int = types.Field(default=0, description="Number of screenshots skipped by policy")
+    unavailable: int = types.Field(
+        default=0, description="Number of screenshots decided but not available (HTTP mode)"
+    )
+
+    @property
+    def avoided_tokens(self) -> int:
+        """Number of image tokens avoided by skipping screenshots."""
+        return self.skipped * backends.IMAGE_TOKENS
+
+
+class ScreenshotPolicy:
+    """Policy that decides at each step whether to attach a screenshot."""
+
+    def __init__(self, config: ScreenshotConfig) -> None:
+        """Initialize the policy from config (the first step is always captured)."""
+        self.config = config
+        self.metrics = ScreenshotMetrics()
+        self.url: str | None = None
+        self.lines: set[int] = set()
+        self.hash: images.Hashes | None = None  # perceptual hash of the last capture
+        self.since = 0  # steps since the last capture
+
+    def changed(self, lines: set[int]) -> bool:
+        """Check if the page lines changed beyond the threshold since the last capture."""
+        union = len(lines | self.lines) or 1
+        return 1.0 - len(lines & self.lines) / union >= self.config.change_threshold
+
+    def fingerprint(self, driver: drivers.Driver) -> images.Hashes | None:
+        """Compute the perceptual hash of a cheap capture of the window (None over HTTP)."""
+        frame = images.capture(driver=driver, scale=0.25)
+        return images.phash(frame) if frame is not None else None
+
+    def moved(self, fingerprint: images.Hashes | None) -> bool:
+        """Check if the perceptual hash changed beyond the threshold since the last capture."""
+        if fingerprint is None or self.hash is None:
+            return True
+        return int(images.hamming(fingerprint, self.hash)) >= self.config.visual_threshold
+
+    def decide(self, driver: drivers.Driver, names: list[str]) -> bool:
+        """Decide whether to capture a screenshot given the names of the actions."""
+        self.metrics.steps += 1
+        self.since += 1
+        url = driver.current_url
+        fingerprint = self.fingerprint(driver=driver) if self.config.policy == "visual" else None
+        lines = hashes(source=driver.page_source) if self.config.policy == "change" else set()
+        if self.url is None or "screenshot" in names or self.config.policy == "always":
+            capture = True
+        elif self.config.policy == "navigation":
+            capture = url != self.url
+        elif self.config.policy == "change":
+            capture = self.changed(lines=lines)
+        elif self.config.policy == "visual":
+            capture = self.moved(fingerprint=fingerprint)
+        elif self.config.policy == "interval":
+            capture = self.since >= self.config.interval
+        else:  # request
+            capture = False
+        if capture is True:
+            self.url, self.since = url, 0
+            self.lines, self.hash = lines, fingerprint
+        return capture
+
+    def capture(self, driver: drivers.Driver, names: list[str]) -> bytes:
+        """Capture a screenshot if the policy decides so (empty bytes otherwise)."""
+        if self.decide(driver=driver, names=names) is False:
+            self.metrics.skipped += 1
+            return b""
+        png = driver.get_screenshot_as_png()  # empty in http mode
+        if png:
+            self.metrics.captured += 1
+        else:
+            self.metrics.unavailable += 1
+        return png
+
+
+# %% FUNCTIONS
+
+
+def hashes(source: str) -> set[int]:
+    """Return the hashes of the non-empty lines of a page source."""
+    return {hash(line) for line in source.splitlines() if line.strip()}
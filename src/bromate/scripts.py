@@ -2,9 +2,25 @@
 
 # %% IMPORTS
 
+import multiprocessing
+import os
+import time
+
 from loguru import logger
 
-from bromate import agents, drivers, executions, interactions, settings
+from bromate import (
+    backends,
+    brokers,
+    drivers,
+    executions,
+    interactions,
+    journals,
+    limiters,
+    payloads,
+    settings,
+    traces,
+    workers,
+)
 
 # %% FUNCTIONS
 
@@ -15,15 +31,146 @@ def main(args: list[str] | None = None) -> int:
     setting = settings.ApplicationSetting(_cli_parse_args=args)
     logger.debug("Application setting: {}", setting)
     # init
-    agent = agents.init_agent_from_config(config=setting.agent)
+    agent = backends.init_agent_from_config(config=setting.agent)
+    if setting.agent.backend != "stub":  # offline agents have no quotas
+        agent = limiters.init_limited_agent_from_config(agent=agent, config=setting.limiter)
     driver = drivers.init_driver_from_config(config=setting.driver)
+    store = payloads.init_store_from_config(config=setting.payload)
+    journal = journals.init_journal_from_config(config=setting.journal)
+    run_id = journal.begin(query=setting.query, resume=setting.journal.resume) if journal else None
+    query = journal.query(run_id=run_id) if journal and run_id else setting.query
+    if query is None:
+        raise ValueError("Cannot execute without a query (or a journal run to resume)!")
     # run
     execution = executions.execute(
-        query=setting.query,
+        query=query,
         agent=agent,
         driver=driver,
         config=setting.execution,
         action_config=setting.action,
+        store=store,
+        grounding_config=setting.grounding,
+        journal=journal,
+        run_id=run_id,
+        screenshot_config=setting.screenshot,
+        session_config=setting.session,
+        trace_config=setting.trace,
     )
     # return
     return interactions.interact(execution=execution, config=setting.interaction)
+
+
+def work(setting: settings.WorkerSetting) -> int:
+    """Run a worker process with its own agent and driver."""
+    # init
+    broker = brokers.init_broker_from_config(config=setting.broker)
+    agent = backends.init_agent_from_config(config=setting.agent)
+    if setting.agent.backend != "stub":  # offline agents have no quotas
+        agent = limiters.init_limited_agent_from_config(agent=agent, config=setting.limiter)
+    driver = drivers.init_driver_from_config(config=setting.driver)
+
+    def execute(query: str) -> executions.Execution:
+        """Execute the query of a job (with a payload store released after the job)."""
+        return executions.execute(
+            query=query,
+            agent=agent,
+            driver=driver,
+            config=setting.execution,
+            action_config=setting.action,
+            store=payloads.init_store_from_config(config=setting.payload),
+            grounding_config=setting.grounding,
+            screenshot_config=setting.screenshot,
+            session_config=setting.session,
+            trace_config=setting.trace,
+        )
+
+    # run
+    try:
+        workers.work(broker=broker, execute=execute, driver=driver, config=setting.worker)
+    finally:
+        driver.quit()
+    return 0
+
+
+def worker(args: list[str] | None = None) -> int:
+    """Run the worker processes of a broker with arguments."""
+    # parse
+    setting = settings.WorkerSetting(_cli_parse_args=args)
+    logger.debug("Worker setting: {}", setting)
+    if setting.worker.processes == 1:
+        return work(setting=setting)
+    # spawn
+    context = multiprocessing.get_context("spawn")  # fresh browser per process
+    processes = [
+        context.Process(target=work, args=(setting,)) for _ in range(setting.worker.processes)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    return max(process.exitcode or 0 for process in processes)
+
+
+def enqueue(args: list[str] | None = None) -> int:
+    """Enqueue query jobs in a broker with arguments."""
+    # parse
+    setting = settings.EnqueueSetting(_cli_parse_args=args)
+    logger.debug("Enqueue setting: {}", setting)
+    # init
+    broker = brokers.init_broker_from_config(config=setting.broker)
+    # enqueue
+    job_ids = [broker.enqueue(query=query) for query in setting.queries]
+    for job_id, query in zip(job_ids, setting.queries, strict=True):
+        print(f"{job_id}\t{query}", flush=True)
+    if setting.wait is False:
+        return 0
+    # wait
+    results = workers.wait(broker=broker, job_ids=job_ids, interval=1.0, timeout=setting.timeout)
+    for job_id, result in zip(job_ids, results, strict=True):
+        print(result.model_dump_json() if result else f"{job_id}\tpending", flush=True)
+    logger.info("Broker stats: {}", broker.stats())
+    return 0 if all(result and result.status == "done" for result in results) else 1
+
+
+def runs(args: list[str] | None = None) -> int:
+    """List the runs recorded in a journal with arguments."""
+    # parse
+    setting = settings.RunsSetting(_cli_parse_args=args)
+    logger.debug("Runs setting: {}", setting)
+    # list
+    path = os.path.expanduser(setting.path)
+    if not os.path.exists(path):
+        logger.error("No journal found at: {}", setting.path)
+        return 1
+    journal = journals.Journal(path=path)
+    try:
+        for run in journal.runs(limit=setting.limit):
+            created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(run.created))
+            print(
+                f"{run.id}\t{run.status}\t{run.steps}\t{run.duration:.2f}s\t{created}\t{run.query}",
+                flush=True,
+            )
+    finally:
+        journal.close()
+    return 0
+
+
+def trace(args: list[str] | None = None) -> int:
+    """Summarize the run traces and render their viewer with arguments."""
+    # parse
+    setting = settings.TraceSetting(_cli_parse_args=args)
+    logger.debug("Trace setting: {}", setting)
+    # load
+    loaded = [traces.load(directory=directory) for directory in traces.find(setting.paths)]
+    if not loaded:
+        logger.error("No traces found in: {}", setting.paths)
+        return 1
+    # summarize
+    print(traces.summarize(traces=loaded, top=setting.top), flush=True)
+    # render
+    if setting.output is not None:
+        with open(setting.output, "w", encoding="utf-8") as writer:
+            directory = os.path.dirname(os.path.abspath(setting.output))
+            writer.write(traces.render(traces=loaded, directory=directory))
+        logger.info("Trace viewer rendered: {}", setting.output)
+    return 0
@@ -4,7 +4,22 @@
 
 import pydantic_settings as pdts
 
-from bromate import actions, agents, drivers, executions, interactions, types
+from bromate import (
+    actions,
+    agents,
+    brokers,
+    drivers,
+    executions,
+    groundings,
+    interactions,
+    journals,
+    limiters,
+    payloads,
+    screenshots,
+    traces,
+    types,
+    workers,
+)
 
 # %% CLASSES
 
@@ -13,22 +28,95 @@ class Setting(pdts.BaseSettings, env_prefix="bromate", cli_parse_args=True):
     """Base class for setting."""
 
 
-class ApplicationSetting(Setting):
-    """Execute actions on web browser from a user query in natural language."""
+class RunnerSetting(Setting):
+    """Base setting to run queries with an agent and a web driver."""
 
-    query: pdts.CliPositionalArg[str] = types.Field(description="User query in natural language")
     agent: agents.AgentConfig = types.Field(
         default=agents.AgentConfig(), description="Configuration of the agent"
     )
+    limiter: limiters.LimiterConfig = types.Field(
+        default=limiters.LimiterConfig(), description="Configuration of the agent limiter"
+    )
     action: actions.ActionConfig = types.Field(
         default=actions.ActionConfig(), description="Configuration for all actions"
     )
     driver: drivers.DriverConfig = types.Field(
         default=drivers.DriverConfig(), description="Configuration of the web driver"
     )
+    session: drivers.SessionConfig = types.Field(
+        default=drivers.SessionConfig(), description="Configuration of the session snapshots"
+    )
     execution: executions.ExecutionConfig = types.Field(
         default=executions.ExecutionConfig(), description="Configuration of the execution"
     )
+    grounding: groundings.GroundingConfig = types.Field(
+        default=groundings.GroundingConfig(), description="Configuration of the grounding"
+    )
+    screenshot: screenshots.ScreenshotConfig = types.Field(
+        default=screenshots.ScreenshotConfig(), description="Configuration of the screenshots"
+    )
+    payload: payloads.PayloadConfig = types.Field(
+        default=payloads.PayloadConfig(), description="Configuration of the payloads"
+    )
+    trace: traces.TraceConfig = types.Field(
+        default=traces.TraceConfig(), description="Configuration of the run traces"
+    )
+
+
+class ApplicationSetting(RunnerSetting):
+    """Execute actions on web browser from a user query in natural language."""
+
+    query: pdts.CliPositionalArg[str | None] = types.Field(
+        default=None, description="User query in natural language (optional to resume a run)"
+    )
+    journal: journals.JournalConfig = types.Field(
+        default=journals.JournalConfig(), description="Configuration of the journal"
+    )
     interaction: interactions.InteractionConfig = types.Field(
         default=interactions.InteractionConfig(), description="Configuration of the interaction"
     )
+
+
+class WorkerSetting(RunnerSetting):
+    """Execute the query jobs of a broker with workers."""
+
+    broker: brokers.BrokerConfig = types.Field(
+        default=brokers.BrokerConfig(), description="Configuration of the broker"
+    )
+    worker: workers.WorkerConfig = types.Field(
+        default=workers.WorkerConfig(), description="Configuration of the workers"
+    )
+
+
+class EnqueueSetting(Setting):
+    """Enqueue query jobs in a broker for the workers."""
+
+    queries: pdts.CliPositionalArg[list[str]] = types.Field(
+        description="User queries in natural language"
+    )
+    broker: brokers.BrokerConfig = types.Field(
+        default=brokers.BrokerConfig(), description="Configuration of the broker"
+    )
+    wait: bool = types.Field(default=False, description="Wait for the results of the jobs")
+    timeout: float | None = types.Field(
+        default=None, description="Maximum time (in seconds) to wait for the results"
+    )
+
+
+class RunsSetting(Setting):
+    """List the runs recorded in a journal."""
+
+    path: pdts.CliPositionalArg[str] = types.Field(description="Path of the journal database")
+    limit: int = types.Field(default=100, description="Maximum number of runs to list")
+
+
+class TraceSetting(Setting):
+    """Analyze the run traces offline."""
+
+    paths: pdts.CliPositionalArg[list[str]] = types.Field(
+        description="Trace directories (or their parents)"
+    )
+    top: int = types.Field(default=10, description="Number of slowest steps to list")
+    output: str | None = types.Field(
+        default=None, description="Path of the HTML viewer to render (not rendered if null)"
+    )
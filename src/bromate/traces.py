@@ -0,0 +1,270 @@
+"""Trace the timeline of the runs and analyze them offline."""
+
+# %% IMPORTS
+
+import contextlib
+import html
+import json
+import os
+import statistics
+import threading
+import time
+import typing as T
+import urllib.parse
+import uuid
+import weakref
+
+from bromate import drivers, types
+
+# %% CONSTANTS
+
+# name of the events file in a trace directory
+EVENTS = "trace.jsonl"
+# colors of the event kinds in the timeline
+COLORS = {
+    "model": "#4e79a7",
+    "action": "#f28e2b",
+    "wait": "#bab0ac",
+    "observe": "#59a14f",
+    "screenshot": "#76b7b2",
+    "input": "#edc948",
+}
+
+# %% CLASSES
+
+
+class TraceConfig(types.ImmutableData):
+    """Config for the traces."""
+
+    path: str | None = types.Field(
+        default=None, description="Directory of the run traces (disabled if null)"
+    )
+    screenshots: bool = types.Field(
+        default=True, description="Save the screenshots referenced by the traces"
+    )
+
+
+class Event(types.ImmutableData):
+    """Event of a run timeline."""
+
+    step: int = types.Field(description="Step of the event (0 before the first response)")
+    kind: str = types.Field(description="Kind of the event (model, action, wait, ...)")
+    name: str = types.Field(description="Name of the event (e.g., action name)")
+    start: float = types.Field(description="Start of the event (in seconds since the run start)")
+    duration: float = types.Field(default=0.0, description="Duration of the event (in seconds)")
+    size: int = types.Field(default=0, description="Payload size of the event (in bytes)")
+    error: str | None = types.Field(default=None, description="Error of the event (if any)")
+    file: str | None = types.Field(default=None, description="File of the event (screenshot)")
+
+
+class Trace(T.NamedTuple):
+    """Trace of a run loaded from its directory."""
+
+    run_id: str
+    query: str
+    directory: str
+    events: list[Event]
+
+    @property
+    def duration(self) -> float:
+        """Duration of the run (end of its last event)."""
+        return max((event.start + event.duration for event in self.events), default=0.0)
+
+
+class Tracer:
+    """Tracer that appends the events of a run to its trace directory."""
+
+    def __init__(self, config: TraceConfig, run_id: str, query: str) -> None:
+        """Initialize the trace directory of a run."""
+        if config.path is None:
+            raise ValueError(f"Cannot initialize tracer (missing trace path): {run_id}!")
+        self.config = config
+        self.run_id = run_id
+        self.directory = os.path.join(os.path.expanduser(config.path), run_id)
+        os.makedirs(self.directory, exist_ok=True)
+        self.lock = threading.Lock()  # observations are traced in the background
+        self.origin = time.perf_counter()
+        self.step = 0
+        self.file = open(os.path.join(self.directory, EVENTS), "a", encoding="utf-8")  # noqa: SIM115
+        if self.file.tell() == 0:  # resumed runs append to their trace
+            header = {"run_id": run_id, "query": query, "created": time.time()}
+            self.write(line=json.dumps(header))
+
+    def write(self, line: str) -> None:
+        """Append a line to the events file (flushed to keep the partial runs)."""
+        with self.lock:
+            self.file.write(line + "\n")
+            self.file.flush()
+
+    def record(self, kind: str, name: str, start: float, **fields: T.Any) -> Event:
+        """Record an event that started at a perf counter."""
+        event = Event(step=self.step, kind=kind, name=name, start=start - self.origin, **fields)
+        self.write(line=event.model_dump_json(exclude_defaults=True))
+        return event
+
+    @contextlib.contextmanager
+    def span(self, kind: str, name: str) -> T.Iterator[dict[str, T.Any]]:
+        """Trace the duration of a block (the block can set the size of the event)."""
+        fields: dict[str, T.Any] = {}
+        start = time.perf_counter()
+        try:
+            yield fields
+        except Exception as error:
+            fields["error"] = str(error)
+            raise
+        finally:
+            self.record(
+                kind=kind, name=name, start=start, duration=time.perf_counter() - start, **fields
+            )
+
+    def screenshot(self, png: bytes, start: float) -> None:
+        """Record a screenshot captured since a perf counter (and save it if enabled)."""
+        file = None
+        if self.config.screenshots is True:
+            file = f"{self.step:04d}.png"
+            with open(os.path.join(self.directory, file), "wb") as writer:
+                writer.write(png)
+        duration = time.perf_counter() - start  # capture time
+        self.record(
+            kind="screenshot", name="png", start=start, duration=duration, size=len(png), file=file
+        )
+
+    def close(self) -> None:
+        """Close the events file."""
+        with self.lock:
+            self.file.close()
+
+
+# %% FUNCTIONS
+
+
+TRACERS: "weakref.WeakKeyDictionary[drivers.Driver, Tracer]" = weakref.WeakKeyDictionary()
+
+
+def span(driver: drivers.Driver, kind: str, name: str) -> T.ContextManager[dict[str, T.Any]]:
+    """Trace a block with the tracer of a driver (if any)."""
+    if tracer := TRACERS.get(driver):
+        return tracer.span(kind=kind, name=name)
+    return contextlib.nullcontext({})
+
+
+def init_tracer_from_config(
+    config: TraceConfig, query: str, run_id: str | None = None
+) -> Tracer | None:
+    """Initialize a tracer from config (None if disabled)."""
+    if config.path is None:
+        return None
+    return Tracer(config=config, run_id=run_id or uuid.uuid4().hex, query=query)
+
+
+def load(directory: str) -> Trace:
+    """Load the trace of a run from its directory."""
+    with open(os.path.join(directory, EVENTS), encoding="utf-8") as reader:
+        header, *lines = reader.read().splitlines()
+    infos = json.loads(header)
+    events = [Event.model_validate_json(line) for line in lines if line]
+    return Trace(run_id=infos["run_id"], query=infos["query"], directory=directory, events=events)
+
+
+def find(paths: list[str]) -> list[str]:
+    """Find the trace directories under paths (recursively)."""
+    directories = []
+    for path in paths:
+        for root, _, files in os.walk(os.path.expanduser(path)):
+            if EVENTS in files:
+                directories.append(root)
+    return sorted(directories)
+
+
+def breakdown(trace: Trace) -> dict[int, dict[str, float]]:
+    """Return the durations of a trace by step and event kind (with the step wall time)."""
+    steps: dict[int, dict[str, float]] = {}
+    bounds: dict[int, tuple[float, float]] = {}
+    for event in trace.events:
+        kinds = steps.setdefault(event.step, {})
+        kinds[event.kind] = kinds.get(event.kind, 0.0) + event.duration
+        low, high = bounds.get(event.step, (event.start, event.start))
+        bounds[event.step] = (min(low, event.start), max(high, event.start + event.duration))
+    for step, (low, high) in bounds.items():
+        steps[step]["total"] = high - low  # waits are nested in actions, observations overlap
+    return steps
+
+
+def summarize(traces: list[Trace], top: int = 10) -> str:
+    """Summarize the latency of traces by event kind and list their slowest steps."""
+    durations: dict[str, list[float]] = {}
+    for trace in traces:
+        for event in trace.events:
+            durations.setdefault(f"{event.kind}:{event.name}", []).append(event.duration)
+    lines = [f"Runs: {len(traces)}, events: {sum(len(trace.events) for trace in traces)}"]
+    lines.append(f"{'event':<32} {'count':>7} {'total':>10} {'mean':>8} {'p95':>8}")
+    for key, values in sorted(durations.items(), key=lambda item: -sum(item[1])):
+        p95 = statistics.quantiles(values, n=20)[-1] if len(values) > 1 else values[0]
+        lines.append(
+            f"{key:<32} {len(values):>7} {sum(values):>9.2f}s "
+            f"{statistics.fmean(values):>7.3f}s {p95:>7.3f}s"
+        )
+    slowest = [
+        (kinds.pop("total"), trace.run_id, step, kinds)
+        for trace in traces
+        for step, kinds in breakdown(trace=trace).items()
+    ]
+    lines.append(f"Slowest steps (top {top}):")
+    for total, run_id, step, kinds in sorted(slowest, key=lambda item: -item[0])[:top]:
+        parts = ", ".join(f"{kind}={value:.2f}s" for kind, value in kinds.items())
+        lines.append(f"{run_id} step {step}: {total:.2f}s ({parts})")
+    return "\n".join(lines)
+
+
+def source(trace: Trace, file: str, directory: str) -> str:
+    """Return the URL of a trace file relative to a directory."""
+    path = os.path.relpath(os.path.join(trace.directory, file), start=directory)
+    return urllib.parse.quote(path.replace(os.sep, "/"))
+
+
+def render(traces: list[Trace], width: int = 1200, directory: str = ".") -> str:
+    """Render the timelines (of a width in pixels) and steps of traces to an HTML page.
+
+    The screenshots are linked relative to the directory of the HTML page.
+    """
+    sections = []
+    for trace in traces:
+        scale = width / max(trace.duration, 1e-3)  # pixels per second
+        bars = "".join(
+            f'<div class="bar" title="{html.escape(f"{e.kind}:{e.name} {e.duration:.3f}s")}" '
+            f'style="left:{e.start * scale:.1f}px;width:{max(e.duration * scale, 1):.1f}px;'
+            f"top:{list(COLORS).index(e.kind) * 14 if e.kind in COLORS else 0}px;"
+            f'background:{COLORS.get(e.kind, "#999")}"></div>'
+            for e in trace.events
+        )
+        rows, previous = [], 0.0
+        for step, kinds in breakdown(trace=trace).items():
+            total = kinds["total"]
+            screenshots = [
+                e.file for e in trace.events if e.step == step and e.file and e.kind == "screenshot"
+            ]
+            image = (
+                f'<img src="{html.escape(source(trace=trace, file=screenshots[0], directory=directory))}">'
+                if screenshots
+                else ""
+            )
+            cells = "".join(f"<td>{kinds.get(kind, 0.0):.3f}</td>" for kind in COLORS)
+            rows.append(
+                f"<tr><td>{step}</td><td>{total:.3f}</td><td>{total - previous:+.3f}</td>"
+                f"{cells}<td>{image}</td></tr>"
+            )
+            previous = total
+        header = "".join(f'<th style="color:{color}">{kind}</th>' for kind, color in COLORS.items())
+        sections.append(
+            f"<h2>{html.escape(trace.run_id)} ({trace.duration:.2f}s)</h2>"
+            f"<p>{html.escape(trace.query)}</p>"
+            f'<div class="timeline" style="width:{width}px">{bars}</div>'
+            f"<table><tr><th>step</th><th>total</th><th>delta</th>{header}<th>screenshot</th></tr>"
+            f"{''.join(rows)}</table>"
+        )
+    style = (
+        "body{font-family:sans-serif}.timeline{position:relative;height:90px;"
+        "border:1px solid #ddd;overflow:hidden}.bar{position:absolute;height:12px}"
+        "td,th{padding:2px 8px;text-align:right}img{max-width:240px}"
+    )
+    return f"<!DOCTYPE html><html><head><style>{style}</style></head><body>{''.join(sections)}</body></html>"
@@ -0,0 +1,165 @@
+"""Observe long pages one viewport at a time and scroll through them."""
+
+# %% IMPORTS
+
+import typing as T
+
+import pydantic as pdt
+
+from bromate import documents, drivers, types
+
+# %% CONSTANTS
+
+# attribute of the elements already sent to the agent
+ATTRIBUTE = "data-bromate-seen"
+# attribute of the scroll position (in characters) of a document in HTTP mode
+POSITION = "data-bromate-position"
+# selector of the elements with content
+CONTENTS = (
+    "h1, h2, h3, h4, h5, h6, p, li, pre, blockquote, table, dt, dd, figcaption, label, "
+    "a, button, input, select, textarea, img"
+)
+# script to collect the new elements in or near the viewport (and lazy-loaded ones)
+VIEWPORT_SCRIPT = """
+const [attribute, selector, margin, size] = arguments;
+const top = -margin * innerHeight, bottom = (1 + margin) * innerHeight;
+const lines = [];
+for (const element of document.body.querySelectorAll(selector)) {
+  if (element.closest(`[${attribute}]`)) continue;
+  const rect = element.getBoundingClientRect();
+  if (rect.width === 0 || rect.height === 0 || rect.bottom < top || rect.top > bottom) continue;
+  let html = element.outerHTML.replace(/\\s+/g, ' ');
+  if (html.length > size) {
+    const start = html.slice(0, html.indexOf('>') + 1).slice(0, size);
+    const text = (element.innerText || '').replace(/\\s+/g, ' ').slice(0, size);
+    html = `${start}${text}...</${element.tagName.toLowerCase()}>`;
+  }
+  element.setAttribute(attribute, '');
+  lines.push(html);
+}
+return {
+  scroll_y: Math.round(scrollY),
+  viewport_height: innerHeight,
+  page_height: document.documentElement.scrollHeight,
+  content: lines.join('\\n'),
+};
+"""
+# script to forget the elements already sent to the agent (e.g., page restored from cache)
+FORGET_SCRIPT = """
+const [attribute] = arguments;
+for (const element of document.querySelectorAll(`[${attribute}]`)) element.removeAttribute(attribute);
+"""
+# script to scroll the window by a number of viewports
+SCROLL_SCRIPT = "window.scrollBy(0, arguments[0] * innerHeight);"
+# script to scroll an element to the center of the viewport
+SCROLL_TO_SCRIPT = "arguments[0].scrollIntoView({block: 'center'});"
+
+# %% CLASSES
+
+
+class ViewportConfig(types.ImmutableData):
+    """Config for the viewports."""
+
+    enabled: bool = types.Field(
+        default=False,
+        description="Return the new content in or near the viewport instead of the page source",
+    )
+    margin: pdt.NonNegativeFloat = types.Field(
+        default=0.5, description="Margin (in viewports) above and below the viewport to include"
+    )
+    element_size: pdt.PositiveInt = types.Field(
+        default=500, description="Maximum size (in characters) of an element in the content"
+    )
+    http_size: pdt.PositiveInt = types.Field(
+        default=4000, description="Size (in characters) of a viewport in HTTP mode"
+    )
+
+
+# %% FUNCTIONS
+
+
+def is_http(driver: drivers.Driver) -> T.TypeGuard[drivers.HttpDriver]:
+    """Check if a driver emulates the pages over HTTP (no layout)."""
+    return isinstance(driver, drivers.HttpDriver) and driver.browser is None
+
+
+def to_html(node: documents.Node, size: int) -> str:
+    """Render a node as a compact HTML element."""
+    start = repr(node)[:size]
+    if node.tag in documents.VOID_TAGS:
+        return start
+    text = node.text()
+    text = text if len(text) <= size else f"{text[:size]}..."
+    return f"{start}{text}</{node.tag}>"
+
+
+def layout(document: documents.Node) -> list[tuple[int, int, documents.Node]]:
+    """Lay out the outermost content nodes by their offsets (in characters)."""
+    nodes = document.select(CONTENTS)
+    selected = {id(node) for node in nodes}
+    spans, offset = [], 0
+    for node in nodes:
+        if any(id(ancestor) in selected for ancestor in node.ancestors()):
+            continue
+        length = len(node.text()) or 1
+        spans.append((offset, offset + length, node))
+        offset += length
+    return spans
+
+
+def observe(driver: drivers.Driver, config: ViewportConfig) -> dict[str, T.Any]:
+    """Observe the new content in or near the viewport (and mark it as seen)."""
+    if not is_http(driver):
+        result = driver.execute_script(
+            VIEWPORT_SCRIPT, ATTRIBUTE, CONTENTS, config.margin, config.element_size
+        )
+        return dict(result)
+    document = driver.page.document
+    spans = layout(document=document)
+    position = int(document.attrs.get(POSITION, 0))
+    margin = int(config.margin * config.http_size)
+    top, bottom = position - margin, position + config.http_size + margin
+    lines = []
+    for start, end, node in spans:
+        if end > top and start < bottom and ATTRIBUTE not in node.attrs:
+            lines.append(to_html(node=node, size=config.element_size))
+            node.attrs[ATTRIBUTE] = ""
+    return {
+        "scroll_y": position,
+        "viewport_height": config.http_size,
+        "page_height": spans[-1][1] if spans else 0,
+        "content": "\n".join(lines),
+    }
+
+
+def forget(driver: drivers.Driver) -> None:
+    """Forget the content seen on the current page (to observe it again after a navigation)."""
+    if not is_http(driver):
+        driver.execute_script(FORGET_SCRIPT, ATTRIBUTE)
+        return
+    for node in driver.page.document.iter():  # pages are reused by the history
+        node.attrs.pop(ATTRIBUTE, None)
+
+
+def scroll(driver: drivers.Driver, config: ViewportConfig, screens: float) -> None:
+    """Scroll the page by a number of viewports (negative to scroll up)."""
+    if not is_http(driver):
+        driver.execute_script(SCROLL_SCRIPT, screens)
+        return
+    document = driver.page.document
+    spans = layout(document=document)
+    height = spans[-1][1] if spans else 0
+    position = int(document.attrs.get(POSITION, 0)) + int(screens * config.http_size)
+    document.attrs[POSITION] = str(max(0, min(position, height - config.http_size)))
+
+
+def scroll_to(driver: drivers.Driver, config: ViewportConfig, element: T.Any) -> None:
+    """Scroll an element (found by the driver) to the center of the viewport."""
+    if not is_http(driver):
+        driver.execute_script(SCROLL_TO_SCRIPT, element)
+        return
+    document, target = driver.page.document, element.node
+    for start, _, node in layout(document=document):
+        if node is target or node in target.ancestors() or target in node.ancestors():
+            document.attrs[POSITION] = str(max(0, start - config.http_size // 2))
+            break
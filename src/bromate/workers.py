@@ -0,0 +1,216 @@
+"""Execute the query jobs of a broker with workers (one browser per worker)."""
+
+# %% IMPORTS
+
+import threading
+import time
+import typing as T
+
+import pydantic as pdt
+import urllib3
+from google.api_core import exceptions as api_exceptions
+from loguru import logger
+from selenium.common import exceptions as driver_exceptions
+
+from bromate import agents, brokers, drivers, executions, types
+
+# %% CONSTANTS
+
+# errors of the jobs that fail them (retried until dead), others stop the worker
+ERRORS = (
+    api_exceptions.GoogleAPIError,  # agent (e.g., quota, deadline)
+    driver_exceptions.WebDriverException,  # browser (e.g., crash, timeout)
+    urllib3.exceptions.HTTPError,  # pages in HTTP mode (e.g., connection, retries)
+    OSError,  # network or files (e.g., timeout, connection)
+    ValueError,  # invalid values (e.g., unknown action, bad response)
+)
+
+# %% CLASSES
+
+
+class WorkerConfig(types.ImmutableData):
+    """Config for the workers."""
+
+    processes: pdt.PositiveInt = types.Field(
+        default=1, description="Number of worker processes to start (one browser each)"
+    )
+    lease: pdt.PositiveFloat = types.Field(
+        default=60.0, description="Duration (in seconds) of a job lease"
+    )
+    heartbeat: pdt.PositiveFloat = types.Field(
+        default=15.0, description="Interval (in seconds) between the lease extensions"
+    )
+    poll_interval: pdt.PositiveFloat = types.Field(
+        default=1.0, description="Interval (in seconds) between polls of an empty queue"
+    )
+    max_steps: pdt.PositiveInt = types.Field(
+        default=10, description="Maximum number of execution steps per job"
+    )
+    max_jobs: pdt.PositiveInt | None = types.Field(
+        default=None, description="Stop after this number of jobs (never if null)"
+    )
+    idle_timeout: pdt.PositiveFloat | None = types.Field(
+        default=None,
+        description="Stop after this duration (in seconds) without jobs (never if null)",
+    )
+
+
+class WorkerMetrics(types.MutableData):
+    """Metrics of a worker."""
+
+    jobs: int = types.Field(default=0, description="Number of jobs leased")
+    done: int = types.Field(default=0, description="Number of jobs done")
+    truncated: int = types.Field(default=0, description="Number of jobs stopped at max steps")
+    retried: int = types.Field(default=0, description="Number of jobs failed and retried")
+    dead: int = types.Field(default=0, description="Number of jobs failed without retries")
+    busy_time: float = types.Field(default=0.0, description="Time spent executing jobs")
+    idle_time: float = types.Field(default=0.0, description="Time spent waiting for jobs")
+
+    @property
+    def throughput(self) -> float:
+        """Number of jobs completed (done or truncated) per minute of work (busy or idle)."""
+        elapsed = self.busy_time + self.idle_time
+        return 60.0 * (self.done + self.truncated) / elapsed if elapsed else 0.0
+
+
+class Heartbeat(threading.Thread):
+    """Thread that extends the lease of a job until stopped."""
+
+    def __init__(self, broker: brokers.Broker, job: brokers.Job, config: WorkerConfig) -> None:
+        """Initialize the heartbeat of a job."""
+        super().__init__(daemon=True)
+        self.broker = broker
+        self.job = job
+        self.config = config
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        """Extend the lease at every interval."""
+        while not self.stopped.wait(timeout=self.config.heartbeat):
+            if not self.broker.heartbeat(job=self.job, duration=self.config.lease):
+                logger.warning("Worker lost the lease of job: {}", self.job.id)
+                return
+
+    def stop(self) -> None:
+        """Stop the heartbeat."""
+        self.stopped.set()
+        self.join()
+
+
+# %% ALIASES
+
+Executor: T.TypeAlias = T.Callable[[str], executions.Execution]
+
+# %% FUNCTIONS
+
+
+def to_text(content: agents.Content) -> str:
+    """Return the texts of an agent content."""
+    return "\n".join(part.text for part in content.parts if part.text)
+
+
+def run(
+    job: brokers.Job, execute: Executor, driver: drivers.Driver, config: WorkerConfig
+) -> brokers.Result:
+    """Run the execution of a job without user input."""
+    start = time.perf_counter()
+    execution = execute(job.query)
+    steps, status = 1, "truncated"
+    try:
+        content = next(execution)  # also done in the first step
+        while steps < config.max_steps:
+            steps += 1
+            content = execution.send(None)
+    except StopIteration as stop:
+        content, status = stop.value, "done"
+    else:
+        execution.close()  # release the resources of the execution
+    return brokers.Result(
+        job_id=job.id,
+        status=status,
+        worker=job.worker,
+        output=to_text(content=content),
+        url=driver.current_url,
+        steps=steps,
+        duration=time.perf_counter() - start,
+    )
+
+
+def report(broker: brokers.Broker, name: str, metrics: WorkerMetrics) -> None:
+    """Publish the metrics of a worker with its throughput."""
+    broker.report(worker=name, metrics=metrics.model_dump() | {"throughput": metrics.throughput})
+
+
+def work(
+    broker: brokers.Broker,
+    execute: Executor,
+    driver: drivers.Driver,
+    config: WorkerConfig,
+    name: str | None = None,
+) -> WorkerMetrics:
+    """Lease and run the jobs of a broker until stopped (max jobs or idle timeout)."""
+    name = name or brokers.worker_name()
+    metrics = WorkerMetrics()
+    idle_since = time.perf_counter()
+    logger.info("Worker started: {}", name)
+    while config.max_jobs is None or metrics.jobs < config.max_jobs:
+        start = time.perf_counter()
+        job = broker.lease(worker=name, duration=config.lease)
+        if job is None:
+            if config.idle_timeout is not None and start - idle_since >= config.idle_timeout:
+                break
+            time.sleep(config.poll_interval)
+            metrics.idle_time += time.perf_counter() - start
+            continue
+        metrics.jobs += 1
+        logger.info("Worker leased job: {} (attempt {})", job.id, job.attempts)
+        heartbeat = Heartbeat(broker=broker, job=job, config=config)
+        heartbeat.start()
+        try:
+            result = run(job=job, execute=execute, driver=driver, config=config)
+        except ERRORS as error:
+            heartbeat.stop()
+            if broker.fail(job=job, error=str(error)):
+                metrics.retried += 1
+                logger.warning("Worker failed job (retry): {}: {}", job.id, error)
+            else:
+                metrics.dead += 1
+                logger.error("Worker failed job (dead): {}: {}", job.id, error)
+        except BaseException as error:  # unexpected: release the job and stop the worker
+            heartbeat.stop()
+            broker.fail(job=job, error=str(error))
+            logger.exception("Worker stopped on job: {}", job.id)
+            raise
+        else:
+            heartbeat.stop()
+            if not broker.complete(job=job, result=result):
+                logger.warning("Worker lost the lease of job: {} (result dropped)", job.id)
+            elif result.status == "truncated":
+                metrics.truncated += 1
+                logger.warning("Worker truncated job: {} at {} steps", job.id, result.steps)
+            else:
+                metrics.done += 1
+                logger.info("Worker completed job: {} in {:.2f}s", job.id, result.duration)
+        metrics.busy_time += time.perf_counter() - start
+        idle_since = time.perf_counter()
+        report(broker=broker, name=name, metrics=metrics)
+    report(broker=broker, name=name, metrics=metrics)
+    logger.info("Worker stopped: {}, metrics={}", name, metrics)
+    return metrics
+
+
+def wait(
+    broker: brokers.Broker, job_ids: list[str], interval: float, timeout: float | None = None
+) -> list[brokers.Result | None]:
+    """Wait for the results of jobs (None for the jobs not finished before the timeout)."""
+    deadline = None if timeout is None else time.perf_counter() + timeout
+    results: dict[str, brokers.Result] = {}
+    while len(results) < len(job_ids):
+        for job_id in job_ids:
+            if job_id not in results and (result := broker.result(job_id=job_id)):
+                results[job_id] = result
+        if deadline is not None and time.perf_counter() >= deadline:
+            break
+        if len(results) < len(job_ids):
+            time.sleep(interval)
+    return [results.get(job_id) for job_id in job_ids]
@@ -1 +1,300 @@
 """Configuration for the tests."""
+
+# %% IMPORTS
+
+import http.server
+import json
+import threading
+import typing as T
+
+import google.generativeai as genai
+import pytest
+
+from bromate import agents, backends, drivers
+
+# %% CLASSES
+
+
+class FakeGemini(http.server.ThreadingHTTPServer):
+    """Fake Gemini API that fails the first requests with quota errors (429)."""
+
+    def __init__(self, failures: int = 0) -> None:
+        """Start the fake server on a free local port."""
+        super().__init__(("127.0.0.1", 0), FakeGeminiHandler)
+        self.failures = failures
+        self.requests: list[str] = []
+
+    @property
+    def endpoint(self) -> str:
+        """Endpoint of the fake server."""
+        return f"http://127.0.0.1:{self.server_port}"
+
+
+class FakeGeminiHandler(http.server.BaseHTTPRequestHandler):
+    """Handler of the fake Gemini API requests."""
+
+    server: FakeGemini
+
+    def do_POST(self) -> None:
+        """Answer a generate content request (or fail it while failures remain)."""
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.requests.append(self.path)
+        body: dict[str, T.Any]
+        if len(self.server.requests) <= self.server.failures:
+            status, body = 429, {"error": {"code": 429, "status": "RESOURCE_EXHAUSTED"}}
+        else:
+            content = {"role": "model", "parts": [{"text": "done"}]}
+            usage = {"totalTokenCount": 100}
+            status, body = 200, {"candidates": [{"content": content}], "usageMetadata": usage}
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args: T.Any) -> None:
+        """Silence the request logs."""
+
+
+class FakeRedis:
+    """Fake Redis server (in memory) with the commands used by the broker."""
+
+    def __init__(self) -> None:
+        """Initialize an empty server."""
+        self.lock = threading.Lock()
+        self.lists: dict[str, list[str]] = {}
+        self.zsets: dict[str, dict[str, float]] = {}
+        self.hashes: dict[str, dict[str, str]] = {}
+
+    def lpush(self, name: str, *values: str) -> int:
+        """Push values at the head of a list."""
+        with self.lock:
+            items = self.lists.setdefault(name, [])
+            for value in values:
+                items.insert(0, value)
+            return len(items)
+
+    def rpoplpush(self, src: str, dst: str) -> str | None:
+        """Pop a value from the tail of a list and push it at the head of another."""
+        with self.lock:
+            if not (items := self.lists.get(src)):
+                return None
+            value = items.pop()
+            self.lists.setdefault(dst, []).insert(0, value)
+            return value
+
+    def lrem(self, name: str, count: int, value: str) -> int:
+        """Remove values from a list."""
+        with self.lock:
+            items = self.lists.get(name, [])
+            removed = 0
+            while value in items and (count == 0 or removed < abs(count)):
+                items.remove(value)
+                removed += 1
+            return removed
+
+    def llen(self, name: str) -> int:
+        """Return the length of a list."""
+        with self.lock:
+            return len(self.lists.get(name, []))
+
+    def zadd(self, name: str, mapping: dict[str, float]) -> int:
+        """Add members with scores to a sorted set."""
+        with self.lock:
+            zset = self.zsets.setdefault(name, {})
+            added = len(mapping.keys() - zset.keys())
+            zset.update(mapping)
+            return added
+
+    def zrem(self, name: str, *values: str) -> int:
+        """Remove members from a sorted set."""
+        with self.lock:
+            zset = self.zsets.get(name, {})
+            return sum(1 for value in values if zset.pop(value, None) is not None)
+
+    def zrangebyscore(self, name: str, min: float | str, max: float | str) -> list[str]:
+        """Return the members of a sorted set within a score range."""
+        low, high = float(min), float(max)  # '-inf' and '+inf' are valid floats
+        with self.lock:
+            members = sorted(self.zsets.get(name, {}).items(), key=lambda item: item[1])
+            return [member for member, score in members if low <= score <= high]
+
+    def zscore(self, name: str, value: str) -> float | None:
+        """Return the score of a member of a sorted set (None if missing)."""
+        with self.lock:
+            return self.zsets.get(name, {}).get(value)
+
+    def hset(self, name: str, mapping: dict[str, str]) -> int:
+        """Set the fields of a hash."""
+        with self.lock:
+            fields = self.hashes.setdefault(name, {})
+            added = len(mapping.keys() - fields.keys())
+            fields.update(mapping)
+            return added
+
+    def hget(self, name: str, key: str) -> str | None:
+        """Get a field of a hash."""
+        with self.lock:
+            return self.hashes.get(name, {}).get(key)
+
+    def hgetall(self, name: str) -> dict[str, str]:
+        """Get all the fields of a hash."""
+        with self.lock:
+            return dict(self.hashes.get(name, {}))
+
+    def hincrby(self, name: str, key: str, amount: int = 1) -> int:
+        """Increment a field of a hash."""
+        with self.lock:
+            fields = self.hashes.setdefault(name, {})
+            fields[key] = str(int(fields.get(key, 0)) + amount)
+            return int(fields[key])
+
+
+class FakeSite(http.server.ThreadingHTTPServer):
+    """Fake web site that serves static pages and echoes the form submissions."""
+
+    def __init__(self, pages: dict[str, str] | None = None) -> None:
+        """Start the fake server on a free local port."""
+        super().__init__(("127.0.0.1", 0), FakeSiteHandler)
+        self.pages = pages or {}
+        self.cookies: dict[str, str] = {}  # set on every response
+        self.redirects: dict[str, str] = {}  # path -> location (302)
+        self.requests: list[tuple[str, str, str, str]] = []  # method, path, body, cookie
+
+    def url(self, path: str = "/") -> str:
+        """Return the URL of a path on the fake server."""
+        return f"http://127.0.0.1:{self.server_port}{path}"
+
+
+class FakeSiteHandler(http.server.BaseHTTPRequestHandler):
+    """Handler of the fake web site requests."""
+
+    server: FakeSite
+
+    def answer(self, body: str) -> None:
+        """Answer a request with its page (or a redirect, or a not found)."""
+        self.server.requests.append((self.command, self.path, body, self.headers.get("Cookie", "")))
+        path = self.path.split("?")[0]
+        if location := self.server.redirects.get(path):
+            status, html = 302, ""
+        elif self.command == "POST":
+            status, html = 200, f"<html><body><p id='echo'>{body}</p></body></html>"
+        elif path in self.server.pages:
+            status, html = 200, self.server.pages[path]
+        else:
+            status, html = 404, "<html><body>Not found</body></html>"
+        data = html.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for key, val in self.server.cookies.items():
+            self.send_header("Set-Cookie", f"{key}={val}; Path=/")
+        if location:
+            self.send_header("Location", location)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:
+        """Answer a GET request."""
+        self.answer(body="")
+
+    def do_POST(self) -> None:
+        """Answer a POST request (echo its body)."""
+        self.answer(body=self.rfile.read(int(self.headers.get("Content-Length", 0))).decode())
+
+    def log_message(self, format: str, *args: T.Any) -> None:
+        """Silence the request logs."""
+
+
+class FakeBrowser:
+    """Fake browser that records the calls of an escalated HTTP driver."""
+
+    def __init__(self) -> None:
+        """Initialize the browser without calls."""
+        self.calls: list[tuple[T.Any, ...]] = []
+
+    def get(self, url: str) -> None:
+        """Record a navigation."""
+        self.calls.append(("get", url))
+
+    def add_cookie(self, cookie: dict[str, T.Any]) -> None:
+        """Record a cookie."""
+        self.calls.append(("add_cookie", cookie["name"], cookie["value"]))
+
+    def find_element(self, by: str, value: str) -> "FakeElement":
+        """Return a fake element given its selector."""
+        return FakeElement(browser=self, selector=value)
+
+    def execute_script(self, script: str, *args: T.Any) -> None:
+        """Record a script with its arguments."""
+        self.calls.append(("script", script, *args))
+
+    def quit(self) -> None:
+        """Record the end of the browser."""
+        self.calls.append(("quit",))
+
+
+class FakeElement(T.NamedTuple):
+    """Fake element of the fake browser."""
+
+    browser: FakeBrowser
+    selector: str
+
+    def click(self) -> None:
+        """Record a click."""
+        self.browser.calls.append(("click", self.selector))
+
+    def submit(self) -> None:
+        """Record a submission."""
+        self.browser.calls.append(("submit", self.selector))
+
+
+# %% FIXTURES
+
+
+@pytest.fixture
+def gemini() -> T.Iterator[FakeGemini]:
+    """Fake Gemini API served locally (the failures can be set by the tests)."""
+    server = FakeGemini()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def agent(gemini: FakeGemini) -> agents.Agent:
+    """Gemini agent backend connected to the fake Gemini API."""
+    genai.configure(
+        api_key="test", transport="rest", client_options={"api_endpoint": gemini.endpoint}
+    )
+    return backends.GeminiAgent(model=genai.GenerativeModel(model_name="gemini-test"))
+
+
+@pytest.fixture
+def site() -> T.Iterator[FakeSite]:
+    """Fake web site served locally (the pages can be set by the tests)."""
+    server = FakeSite()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def driver() -> T.Iterator[drivers.HttpDriver]:
+    """Web driver in HTTP mode (escalations to a browser are not available)."""
+    driver = drivers.HttpDriver(config=drivers.DriverConfig(http_mode=True))
+    yield driver
+    driver.quit()
+
+
+@pytest.fixture
+def browser(monkeypatch: pytest.MonkeyPatch) -> FakeBrowser:
+    """Fake browser started by the HTTP drivers when they escalate."""
+    browser = FakeBrowser()
+    monkeypatch.setattr(drivers, "init_browser_from_config", lambda config: browser)
+    return browser
@@ -0,0 +1,100 @@
+# %% IMPORTS
+
+import pathlib
+
+import pytest
+from conftest import FakeSite
+
+from bromate import actions, agents, backends, drivers, executions, limiters
+
+# %% CONSTANTS
+
+PAGE = "<html><head><title>{title}</title></head><body><p>{title}</p></body></html>"
+
+# %% HELPERS
+
+
+def run(agent: agents.Agent, driver: drivers.Driver, query: str) -> agents.Content:
+    execution = executions.execute(
+        query=query,
+        agent=agent,
+        driver=driver,
+        config=executions.ExecutionConfig(),
+        action_config=actions.ActionConfig(),
+    )
+    try:
+        next(execution)
+        while True:
+            execution.send(None)
+    except StopIteration as stop:
+        return stop.value
+
+
+def calls(content: agents.Content) -> list[str]:
+    return [part.function_call.name for part in content.parts if part.function_call]
+
+
+# %% TESTS
+
+
+def test_stub_agent_opens_the_query_url_then_stops() -> None:
+    # given
+    agent = backends.StubAgent()
+    query = agents.Content(
+        role=agents.Role.USER.value, parts=[agents.Part(text="open https://example.com now")]
+    )
+    # when
+    first = agent.generate_content(contents=[query], tools=[])
+    second = agent.generate_content(contents=[query, first.candidates[0].content], tools=[])
+    # then
+    assert calls(first.candidates[0].content) == ["get"]
+    assert first.candidates[0].content.parts[0].function_call.args["url"] == "https://example.com"
+    assert calls(second.candidates[0].content) == ["done"]
+    assert first.usage_metadata.total_token_count == agent.count_tokens([query], tools=[]) + (
+        backends.estimate_tokens(contents=[first.candidates[0].content])
+    )
+
+
+def test_estimate_tokens_bills_the_images_at_a_flat_rate() -> None:
+    # given
+    image = agents.Part(inline_data=agents.Blob(mime_type="image/png", data=b"x" * 10_000))
+    content = agents.Content(role=agents.Role.USER.value, parts=[image])
+    # when
+    tokens = backends.estimate_tokens(contents=[content])
+    # then
+    assert tokens == backends.IMAGE_TOKENS
+
+
+def test_recorded_responses_are_replayed_by_the_stub_backend(
+    driver: drivers.HttpDriver, site: FakeSite, tmp_path: pathlib.Path
+) -> None:
+    # given
+    site.pages["/"] = PAGE.format(title="Home")
+    path = str(tmp_path / "records.jsonl")
+    query = f"open {site.url('/')}"
+    recorder = backends.init_agent_from_config(
+        config=agents.AgentConfig(backend="stub", record_path=path)
+    )
+    limited = limiters.init_limited_agent_from_config(
+        agent=recorder, config=limiters.LimiterConfig()
+    )
+    run(agent=limited, driver=driver, query=query)  # recorded through the limiter
+    # when
+    replayer = backends.init_agent_from_config(
+        config=agents.AgentConfig(backend="stub", stub_path=path)
+    )
+    output = run(agent=replayer, driver=driver, query="the records ignore the query")
+    # then
+    records = backends.load_records(path=path)
+    assert [calls(record) for record in records] == [["get"], ["done"]]
+    assert isinstance(replayer, backends.StubAgent) and replayer.records == records
+    assert calls(output) == ["done"] and driver.title == "Home"
+    assert [request[1] for request in site.requests] == ["/", "/"]
+
+
+def test_init_agent_from_config_rejects_the_unknown_backends() -> None:
+    # given
+    config = agents.AgentConfig.model_construct(backend="unknown", record_path=None)  # type: ignore[arg-type]
+    # when
+    with pytest.raises(ValueError, match="unknown backend name"):
+        backends.init_agent_from_config(config=config)
@@ -0,0 +1,75 @@
+# %% IMPORTS
+
+import pathlib
+import time
+
+import pytest
+from conftest import FakeRedis
+
+from bromate import brokers
+
+# %% FIXTURES
+
+
+@pytest.fixture(params=["sqlite", "filesystem", "redis"])
+def broker(request: pytest.FixtureRequest, tmp_path: pathlib.Path) -> brokers.Broker:
+    if request.param == "sqlite":
+        return brokers.SQLiteBroker(path=str(tmp_path / "queue.db"), max_attempts=2)
+    if request.param == "filesystem":
+        return brokers.FileBroker(path=str(tmp_path / "queue"), max_attempts=2)
+    return brokers.RedisBroker(client=FakeRedis(), prefix="test", max_attempts=2)
+
+
+# %% TESTS
+
+
+def test_broker_completes_leased_jobs(broker: brokers.Broker) -> None:
+    # given
+    job_id = broker.enqueue(query="query")
+    job = broker.lease(worker="worker", duration=60.0)
+    assert job is not None and job.id == job_id and job.attempts == 1
+    # when
+    completed = broker.complete(job=job, result=brokers.Result(job_id=job_id, status="done"))
+    # then
+    assert completed is True
+    assert broker.lease(worker="worker", duration=60.0) is None
+    result = broker.result(job_id=job_id)
+    assert result is not None and result.status == "done"
+    assert broker.stats() == {"queued": 0, "leased": 0, "done": 1, "dead": 0}
+
+
+def test_broker_retries_failed_jobs_until_dead(broker: brokers.Broker) -> None:
+    # given
+    job_id = broker.enqueue(query="query")
+    # when
+    first = broker.lease(worker="worker", duration=60.0)
+    assert first is not None
+    retried = broker.fail(job=first, error="error")
+    second = broker.lease(worker="worker", duration=60.0)
+    assert second is not None
+    dead = not broker.fail(job=second, error="error")
+    # then
+    assert retried is True and dead is True
+    result = broker.result(job_id=job_id)
+    assert result is not None and result.status == "dead" and result.error == "error"
+    assert broker.lease(worker="worker", duration=60.0) is None
+
+
+def test_broker_ignores_workers_that_lost_their_lease(broker: brokers.Broker) -> None:
+    # given
+    job_id = broker.enqueue(query="query")
+    old = broker.lease(worker="old", duration=0.0)
+    time.sleep(0.01)  # expire the lease
+    new = broker.lease(worker="new", duration=0.0)
+    assert old is not None and new is not None and new.id == old.id
+    # when
+    heartbeat = broker.heartbeat(job=old, duration=60.0)
+    completed = broker.complete(job=old, result=brokers.Result(job_id=job_id, status="done"))
+    retried = broker.fail(job=old, error="error")
+    # then
+    assert heartbeat is False and completed is False and retried is True
+    assert broker.result(job_id=job_id) is None
+    assert broker.stats()["leased"] == 1
+    assert broker.complete(job=new, result=brokers.Result(job_id=job_id, status="done"))
+    result = broker.result(job_id=job_id)
+    assert result is not None and result.status == "done"
@@ -0,0 +1,109 @@
+# %% IMPORTS
+
+import threading
+import typing as T
+
+import google.generativeai as genai
+import pytest
+from conftest import FakeBrowser, FakeSite
+
+from bromate import actions, agents, backends, candidates, drivers
+
+# %% CONSTANTS
+
+PAGE = "<html><body><input id='q' name='q'><button id='go'>Go</button></body></html>"
+
+# %% HELPERS
+
+
+def response(*contents: agents.Content) -> agents.Response:
+    proto = genai.protos.GenerateContentResponse(
+        candidates=[
+            agents.Candidate(content=content, index=index) for index, content in enumerate(contents)
+        ]
+    )
+    return agents.Response.from_response(proto)
+
+
+# %% FIXTURES
+
+
+@pytest.fixture
+def chooser() -> T.Iterator[candidates.Chooser]:
+    chooser = candidates.Chooser(config=candidates.CandidateConfig(enabled=True))
+    yield chooser
+    chooser.close()
+
+
+# %% TESTS
+
+
+def test_validate_reports_the_invalid_calls(driver: drivers.HttpDriver, site: FakeSite) -> None:
+    # given
+    site.pages["/"] = PAGE
+    driver.get(site.url())
+    config = actions.ActionConfig()
+    # when
+    valid = candidates.validate(backends.to_call("click", css_selector="#go"), driver, config)
+    missing = candidates.validate(backends.to_call("click", css_selector="#no"), driver, config)
+    unknown = candidates.validate(backends.to_call("fly"), driver, config)
+    invalid = candidates.validate(backends.to_call("write", css_selector="#q"), driver, config)
+    # then
+    assert valid == []
+    assert missing == ["Selector does not resolve for click: #no"]
+    assert unknown == ["Unknown action: fly"]
+    assert len(invalid) == 1 and invalid[0].startswith("Invalid arguments for write")
+
+
+def test_validate_skips_the_selectors_after_a_navigation(
+    driver: drivers.HttpDriver, site: FakeSite
+) -> None:
+    # given
+    site.pages["/"] = PAGE
+    driver.get(site.url())
+    get = backends.to_call("get", url=site.url("/next"))
+    click = backends.to_call("click", css_selector="#next")
+    content = agents.Content(role=agents.Role.AGENT.value, parts=[*get.parts, *click.parts])
+    # when
+    errors = candidates.validate(content, driver, actions.ActionConfig())
+    # then
+    assert errors == []
+
+
+def test_chooser_recovers_an_invalid_first_candidate(
+    chooser: candidates.Chooser, driver: drivers.HttpDriver, site: FakeSite
+) -> None:
+    # given
+    site.pages["/"] = PAGE
+    driver.get(site.url())
+    first = backends.to_call("click", css_selector="#no")
+    second = backends.to_call("click", css_selector="#go")
+    # when
+    chosen = chooser.choose(response(first, second), driver, actions.ActionConfig())
+    # then
+    assert chosen == second
+    assert (chooser.metrics.invalid, chooser.metrics.recovered) == (1, 1)
+    assert chooser.metrics.recovery_rate == 1.0
+
+
+def test_chooser_validates_browser_candidates_one_at_a_time(
+    chooser: candidates.Chooser,
+    driver: drivers.HttpDriver,
+    browser: FakeBrowser,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    # given
+    driver.escalate(reason="test")
+    threads: list[threading.Thread] = []
+
+    def validate(*args: object) -> list[str]:
+        threads.append(threading.current_thread())
+        return []
+
+    monkeypatch.setattr(candidates, "validate", validate)
+    contents = [backends.to_call("click", css_selector=f"#{i}") for i in range(3)]
+    # when
+    chosen = chooser.choose(response(*contents), driver, actions.ActionConfig())
+    # then
+    assert chosen == contents[0]
+    assert threads == [threading.current_thread()] * 3
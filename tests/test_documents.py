@@ -0,0 +1,84 @@
+# %% IMPORTS
+
+import pytest
+
+from bromate import documents
+
+# %% CONSTANTS
+
+PAGE = """<!DOCTYPE html><html><head><title>Shop</title><script>var x = "<p>";</script></head>
+<body><div id="main" class="page wide">
+<p>First<p>Second <b>bold</b>
+<ul><li class="item">One<li class="item sale" data-sku="A-1">Two<li class="item">Three</ul>
+<form><input name="q" value="shoes" disabled><input type="checkbox" checked></form>
+<a href="/next" lang="en-US">Next</a><a href="https://other.com/page.pdf">PDF</a>
+</div></body></html>"""
+
+# %% FIXTURES
+
+
+@pytest.fixture
+def root() -> documents.Node:
+    return documents.parse(PAGE)
+
+
+# %% TESTS
+
+
+def test_parse_closes_the_implicit_elements(root: documents.Node) -> None:
+    # when
+    paragraphs = root.select("p")
+    items = root.select("li")
+    # then
+    assert [p.text() for p in paragraphs] == ["First", "Second bold"]
+    assert [li.text() for li in items] == ["One", "Two", "Three"]
+    assert all(li.parent is not None and li.parent.tag == "ul" for li in items)
+
+
+def test_text_skips_the_hidden_elements(root: documents.Node) -> None:
+    # when
+    text = root.text()
+    # then
+    assert "var x" not in text and "Shop" not in text and text.startswith("First")
+
+
+@pytest.mark.parametrize(
+    "css, expected",
+    [
+        ("#main > p", ["First", "Second bold"]),
+        ("div .item", ["One", "Two", "Three"]),
+        (".item.sale", ["Two"]),
+        ("li + li", ["Two", "Three"]),
+        (".sale ~ li", ["Three"]),
+        ("li:nth-child(odd)", ["One", "Three"]),
+        ("li:not(.sale)", ["One", "Three"]),
+        ("li:last-child, p:first-child", ["First", "Three"]),
+        ("[data-sku^='A-'], [class~=page]", ["Two"]),
+        ("a[href$='.pdf']", ["PDF"]),
+        ("a[lang|=en]", ["Next"]),
+        ("a[href*=other]", ["PDF"]),
+    ],
+)
+def test_select_matches_the_supported_selectors(
+    root: documents.Node, css: str, expected: list[str]
+) -> None:
+    # when
+    nodes = root.select(css=css)
+    # then
+    texts = [node.text() for node in nodes if node.tag != "div"]
+    assert texts == expected
+
+
+def test_select_matches_the_form_states(root: documents.Node) -> None:
+    # when
+    disabled = root.select_one("input:disabled")
+    checked = root.select_one("input:checked")
+    # then
+    assert disabled is not None and disabled.attrs["value"] == "shoes"
+    assert checked is not None and checked.attrs["type"] == "checkbox"
+
+
+@pytest.mark.parametrize("css", ["a:hover", "li:nth-child(x)", "p >", "div, ,p", "!"])
+def test_select_rejects_the_unsupported_selectors(root: documents.Node, css: str) -> None:
+    with pytest.raises(documents.SelectorError):
+        root.select(css=css)
@@ -0,0 +1,175 @@
+# %% IMPORTS
+
+import pathlib
+
+import pytest
+from conftest import FakeBrowser, FakeElement, FakeSite
+
+from bromate import drivers
+
+# %% CONSTANTS
+
+FORM = """<html><head><title>Form</title></head><body>
+<a id="next" href="/next">Next</a>
+<form id="search" action="/search" method="{method}"{onsubmit}>
+<input id="q" name="q"><input type="hidden" name="page" value="1">
+<button id="go" type="submit">Go</button>
+</form></body></html>"""
+PAGE = "<html><head><title>{title}</title></head><body><p>{title}</p></body></html>"
+
+# %% TESTS
+
+
+def test_http_driver_follows_links_and_keeps_cookies(
+    driver: drivers.HttpDriver, site: FakeSite
+) -> None:
+    # given
+    site.pages |= {"/": FORM.format(method="get", onsubmit=""), "/next": PAGE.format(title="Next")}
+    site.cookies["sid"] = "abc"
+    # when
+    driver.get(site.url("/"))
+    driver.find_element(value="#next").click()
+    # then
+    assert driver.title == "Next" and driver.current_url == site.url("/next")
+    assert site.requests[-1][3] == "sid=abc"
+    driver.back()
+    assert driver.title == "Form"
+
+
+@pytest.mark.parametrize("method", ["get", "post"])
+def test_http_driver_submits_forms_with_typed_values(
+    driver: drivers.HttpDriver, site: FakeSite, method: str
+) -> None:
+    # given
+    site.pages |= {
+        "/": FORM.format(method=method, onsubmit=""),
+        "/search": PAGE.format(title="Results"),
+    }
+    driver.get(site.url("/"))
+    # when
+    driver.find_element(value="#q").send_keys("bromate")
+    driver.find_element(value="#go").click()
+    # then
+    assert driver.browser is None
+    verb, path, body, _ = site.requests[-1]
+    if method == "get":
+        assert (verb, path, body) == ("GET", "/search?q=bromate&page=1", "")
+    else:
+        assert (verb, path, body) == ("POST", "/search", "q=bromate&page=1")
+        assert "q=bromate&page=1" in driver.page_source
+
+
+def test_http_driver_replays_typed_values_when_escalating(
+    driver: drivers.HttpDriver, site: FakeSite, browser: FakeBrowser
+) -> None:
+    # given
+    site.pages["/"] = FORM.format(method="post", onsubmit=' onsubmit="check()"')
+    site.cookies["sid"] = "abc"
+    driver.get(site.url("/"))
+    driver.find_element(value="#q").send_keys("bromate")
+    # when
+    driver.find_element(value="#go").submit()
+    # then
+    assert driver.browser is browser  # type: ignore[comparison-overlap]
+    assert browser.calls == [
+        ("get", site.url("/")),  # to set the cookies
+        ("add_cookie", "sid", "abc"),
+        ("get", site.url("/")),
+        ("script", drivers.TYPE_SCRIPT, FakeElement(browser, "#q"), "bromate"),
+        ("submit", "#go"),
+    ]
+    assert len(site.requests) == 1  # no submission over HTTP
+
+
+def test_http_driver_writes_the_page_of_a_submission_when_escalating(
+    driver: drivers.HttpDriver, site: FakeSite, browser: FakeBrowser
+) -> None:
+    # given
+    site.pages["/"] = FORM.format(method="post", onsubmit="")
+    driver.get(site.url("/"))
+    driver.find_element(value="#go").click()
+    source = driver.page_source
+    # when
+    driver.escalate(reason="test")
+    # then
+    assert ("get", site.url("/search")) not in browser.calls  # not submitted again
+    assert browser.calls[-1] == ("script", drivers.WRITE_SCRIPT, site.url("/search"), source)
+    assert [request[0] for request in site.requests] == ["GET", "POST"]
+
+
+def test_http_driver_escalates_pages_that_require_scripts(
+    driver: drivers.HttpDriver, site: FakeSite, browser: FakeBrowser
+) -> None:
+    # given
+    site.pages["/app"] = (
+        "<html><body><div id='root'></div><script src='app.js'></script></body></html>"
+    )
+    # when
+    driver.get(site.url("/app"))
+    # then
+    assert driver.browser is browser  # type: ignore[comparison-overlap]
+    assert browser.calls == [("get", site.url("/app"))]
+
+
+def test_http_driver_serves_prefetched_pages_warm(
+    driver: drivers.HttpDriver, site: FakeSite
+) -> None:
+    # given
+    site.pages |= {"/": PAGE.format(title="Home"), "/next": PAGE.format(title="Next")}
+    driver.get(site.url("/"))
+    # when
+    driver.prefetch(urls=[site.url("/next")])
+    driver.prefetches[site.url("/next")].result()
+    driver.get(site.url("/next"))
+    # then
+    assert driver.warm is True and driver.title == "Next"
+    assert [request[1] for request in site.requests] == ["/", "/next"]
+
+
+@pytest.mark.parametrize(
+    "content_type, expected",
+    [
+        ("text/html; charset=ISO-8859-1", "iso8859-1"),
+        ('text/html; charset="utf-8"', "utf-8"),
+        ("text/html; charset=unknown", "utf-8"),
+        ("text/html", "utf-8"),
+    ],
+)
+def test_charset_parses_the_content_type(content_type: str, expected: str) -> None:
+    assert drivers.charset(headers={"Content-Type": content_type}) == expected
+
+
+@pytest.mark.parametrize(
+    "netloc, expected",
+    [
+        ("www.example.com", "example.com"),
+        ("login.example.co.uk:8080", "example.co.uk:8080"),
+        ("127.0.0.1:8000", "127.0.0.1:8000"),
+    ],
+)
+def test_registrable_returns_the_registrable_domain(netloc: str, expected: str) -> None:
+    assert drivers.registrable(netloc=netloc) == expected
+
+
+def test_sessions_are_saved_and_restored_over_http(
+    driver: drivers.HttpDriver, site: FakeSite, tmp_path: pathlib.Path
+) -> None:
+    # given
+    site.pages["/"] = PAGE.format(title="Home")
+    site.cookies["sid"] = "abc"
+    config = drivers.SessionConfig(path=str(tmp_path))
+    driver.get(site.url("/"))
+    session = drivers.save_session(driver=driver, config=config)
+    other = drivers.HttpDriver(config=drivers.DriverConfig(http_mode=True))
+    site.cookies.clear()
+    # when
+    try:
+        restored = drivers.restore_sessions(
+            driver=other, query=f"open {site.url('/')}", config=config
+        )
+        other.get(site.url("/"))
+    finally:
+        other.quit()
+    # then
+    assert session is not None and restored == [session.site]
+    assert site.requests[-1][3] == "sid=abc"
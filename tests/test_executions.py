@@ -0,0 +1,110 @@
+# %% IMPORTS
+
+import pathlib
+
+import pytest
+from conftest import FakeSite
+
+from bromate import actions, agents, backends, drivers, executions
+
+# %% CONSTANTS
+
+PAGE = "<html><head><title>{title}</title></head><body><p>{title}</p></body></html>"
+
+# %% HELPERS
+
+
+def execute(agent: agents.Agent, driver: drivers.Driver, query: str) -> executions.Execution:
+    return executions.execute(
+        query=query,
+        agent=agent,
+        driver=driver,
+        config=executions.ExecutionConfig(),
+        action_config=actions.ActionConfig(),
+    )
+
+
+# %% TESTS
+
+
+def test_execute_runs_the_declared_actions(driver: drivers.HttpDriver, site: FakeSite) -> None:
+    # given
+    site.pages["/"] = PAGE.format(title="Home")
+    execution = execute(backends.StubAgent(), driver, query=f"open {site.url('/')}")
+    # when
+    next(execution)
+    with pytest.raises(StopIteration) as stop:
+        execution.send(None)
+    # then
+    assert driver.title == "Home"
+    assert stop.value.value.parts[0].function_call.name == actions.done.__name__
+
+
+@pytest.mark.parametrize("name", ["_wait", "declare", "time", "unknown"])
+def test_execute_rejects_the_undeclared_actions(driver: drivers.HttpDriver, name: str) -> None:
+    # given
+    agent = backends.StubAgent(rules=[lambda contents: backends.to_call(name)])
+    execution = execute(agent, driver, query="call a helper")
+    # when
+    with pytest.raises(ValueError, match="unknown action name") as error:
+        next(execution)
+    # then
+    assert name in str(error.value)
+
+
+def test_replay_skips_the_undeclared_actions(driver: drivers.HttpDriver, site: FakeSite) -> None:
+    # given
+    site.pages["/"] = PAGE.format(title="Home")
+    content = agents.Content(
+        role=agents.Role.AGENT.value,
+        parts=[
+            *backends.to_call("_wait").parts,
+            *backends.to_call("get", url=site.url("/")).parts,
+        ],
+    )
+    # when
+    executions.replay(content=content, driver=driver, action_config=actions.ActionConfig())
+    # then
+    assert driver.title == "Home"
+
+
+def test_execute_finishes_when_the_session_cannot_be_saved(
+    driver: drivers.HttpDriver, monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path
+) -> None:
+    # given
+    def save_session(driver: drivers.Driver, config: drivers.SessionConfig) -> None:
+        raise PermissionError("read-only folder")
+
+    monkeypatch.setattr(drivers, "save_session", save_session)
+    execution = executions.execute(
+        query="say hello",
+        agent=backends.StubAgent(),
+        driver=driver,
+        config=executions.ExecutionConfig(),
+        action_config=actions.ActionConfig(),
+        session_config=drivers.SessionConfig(path=str(tmp_path)),
+    )
+    # when
+    with pytest.raises(StopIteration) as stop:
+        next(execution)
+    # then
+    assert stop.value.value.parts[0].function_call.name == actions.done.__name__
+
+
+def test_replay_continues_after_the_failed_actions(
+    driver: drivers.HttpDriver, site: FakeSite
+) -> None:
+    # given
+    site.pages |= {"/": PAGE.format(title="Home"), "/next": PAGE.format(title="Next")}
+    content = agents.Content(
+        role=agents.Role.AGENT.value,
+        parts=[
+            *backends.to_call("get", url=site.url("/")).parts,
+            *backends.to_call("click", css_selector="#missing").parts,
+            *backends.to_call("get", url=site.url("/next")).parts,
+        ],
+    )
+    # when
+    executions.replay(content=content, driver=driver, action_config=actions.ActionConfig())
+    # then
+    assert driver.title == "Next"
@@ -0,0 +1,97 @@
+# %% IMPORTS
+
+from conftest import FakeSite
+
+from bromate import actions, documents, drivers, extractions
+
+# %% CONSTANTS
+
+ARTICLE = """<html><head><title>Recipe</title><script>var tracking = 1;</script></head><body>
+<nav><a href="/">Home</a> <a href="/recipes">Recipes</a></nav>
+<main>
+<h1>Bread</h1>
+<p>A <b>simple</b> bread, see the <a href="/flour">flour guide</a>.</p>
+<ul><li>Flour<ul><li>Wheat</li></ul></li><li>Water</li></ul>
+<table><tr><th>Step</th><th>Time</th></tr><tr><td>Rise</td><td>2h</td></tr></table>
+<pre>knead(
+  dough)</pre>
+</main>
+<footer>Copyright</footer>
+</body></html>"""
+MARKDOWN = """# Bread
+
+A **simple** bread, see the [flour guide](https://example.com/flour).
+
+- Flour
+  - Wheat
+- Water
+
+| Step | Time |
+| --- | --- |
+| Rise | 2h |
+
+```
+knead(
+  dough)
+```"""
+
+# %% TESTS
+
+
+def test_to_markdown_converts_the_main_content() -> None:
+    # given
+    root = documents.parse(ARTICLE)
+    # when
+    markdown = extractions.to_markdown(
+        extractions.find_main(root), base_url="https://example.com/bread"
+    )
+    # then
+    assert markdown == MARKDOWN
+
+
+def test_find_main_prefers_the_dense_text_over_the_links() -> None:
+    # given
+    links = "".join(f"<p><a href='/{i}'>Link number {i}</a></p>" for i in range(20))
+    text = "<p>" + "Some long paragraph of text. " * 20 + "</p>"
+    root = documents.parse(
+        f"<html><body><div id='menu'>{links}</div><div id='story'>{text}</div></body></html>"
+    )
+    # when
+    main = extractions.find_main(root)
+    # then
+    assert main.attrs.get("id") == "story"
+
+
+def test_chunk_splits_the_blocks_within_the_size() -> None:
+    # given
+    text = "\n\n".join(["a" * 30, "b" * 30, "c" * 100])
+    # when
+    chunks = extractions.chunk(text, size=64)
+    # then
+    assert chunks == ["a" * 30 + "\n\n" + "b" * 30, "c" * 64, "c" * 36]
+
+
+def test_rank_orders_the_chunks_by_relevance() -> None:
+    # given
+    chunks = ["Shipping and returns.", "Bread needs flour and water.", "Water the plants."]
+    # when
+    ranks = extractions.rank(chunks=chunks, query="what is the flour for bread?")
+    # then
+    assert ranks[0] == 1
+    assert extractions.rank(chunks=chunks, query="the") == [0, 1, 2]
+
+
+def test_read_returns_the_most_relevant_page(driver: drivers.HttpDriver, site: FakeSite) -> None:
+    # given
+    sections = [f"<h2>Section {i}</h2><p>{'filler words ' * 20}</p>" for i in range(5)]
+    sections[3] = "<h2>Section 3</h2><p>The sourdough starter ferments overnight.</p>"
+    site.pages["/"] = f"<html><body><article>{''.join(sections)}</article></body></html>"
+    config = actions.ActionConfig(read_size=300)
+    driver.get(site.url("/"))
+    # when
+    structure = actions.read(driver=driver, config=config, query="sourdough starter")
+    # then
+    response = dict(structure.response)
+    assert response["page"] == 1 and response["pages"] > 1
+    assert "sourdough starter" in response["content"]
+    assert len(response["content"]) <= 300
@@ -0,0 +1,106 @@
+# %% IMPORTS
+
+from conftest import FakeBrowser, FakeSite
+
+from bromate import actions, drivers, executions, groundings, screenshots
+
+# %% CONSTANTS
+
+PAGE = """<html><head><title>Home</title></head><body>
+<a href="/next">Next page</a>
+<form action="/search"><input type="hidden" name="token" value="x">
+<input type="search" name="q" aria-label="Search"><button>Go</button></form>
+</body></html>"""
+NEXT = "<html><head><title>Next</title></head><body><p>Next</p></body></html>"
+
+# %% TESTS
+
+
+def test_mark_page_marks_the_interactive_elements_over_http(
+    driver: drivers.HttpDriver, site: FakeSite
+) -> None:
+    # given
+    site.pages["/"] = PAGE
+    driver.get(site.url("/"))
+    # when
+    marks = groundings.mark_page(driver=driver, config=groundings.GroundingConfig(text_size=4))
+    # then
+    assert groundings.table(marks=marks).splitlines() == [
+        '1: a href=/next "Next"',
+        '2: input type=search name=q "Sear"',
+        '3: button "Go"',
+    ]
+    assert driver.find_element(value=groundings.selector(mark=2.0)).get_attribute("name") == "q"
+
+
+def test_mark_page_stops_at_the_maximum_marks(driver: drivers.HttpDriver, site: FakeSite) -> None:
+    # given
+    site.pages["/"] = PAGE
+    driver.get(site.url("/"))
+    # when
+    marks = groundings.mark_page(driver=driver, config=groundings.GroundingConfig(max_marks=1))
+    # then
+    assert [mark.tag for mark in marks] == ["a"]
+
+
+def test_click_targets_the_marked_elements(driver: drivers.HttpDriver, site: FakeSite) -> None:
+    # given
+    site.pages |= {"/": PAGE, "/next": NEXT}
+    driver.get(site.url("/"))
+    groundings.mark_page(driver=driver, config=groundings.GroundingConfig())
+    # when
+    structure = actions.click(driver=driver, config=actions.ActionConfig(), mark=1)
+    # then
+    assert structure.response["title"] == "Next"
+
+
+def test_escalation_marks_the_browser_page_again(
+    driver: drivers.HttpDriver, site: FakeSite, browser: FakeBrowser
+) -> None:
+    # given
+    site.pages["/"] = PAGE
+    driver.get(site.url("/"))
+    marks = groundings.mark_page(driver=driver, config=groundings.GroundingConfig())
+    # when
+    driver.escalate(reason="test")
+    # then
+    assert browser.calls[-1] == (
+        "script",
+        groundings.REMARK_SCRIPT,
+        groundings.ATTRIBUTE,
+        groundings.INTERACTIVES,
+        len(marks),
+    )
+
+
+def test_escalation_forgets_the_marks_of_the_previous_pages(
+    driver: drivers.HttpDriver, site: FakeSite, browser: FakeBrowser
+) -> None:
+    # given
+    site.pages |= {"/": PAGE, "/next": NEXT}
+    driver.get(site.url("/"))
+    groundings.mark_page(driver=driver, config=groundings.GroundingConfig())
+    driver.get(site.url("/next"))
+    # when
+    driver.escalate(reason="test")
+    # then
+    assert not any(call[0] == "script" for call in browser.calls)
+
+
+def test_observe_returns_the_marks_table_without_screenshots_over_http(
+    driver: drivers.HttpDriver, site: FakeSite
+) -> None:
+    # given
+    site.pages["/"] = PAGE
+    driver.get(site.url("/"))
+    policy = screenshots.ScreenshotPolicy(config=screenshots.ScreenshotConfig())
+    # when
+    marks_text, png = executions.observe(
+        driver=driver,
+        names=["get"],
+        policy=policy,
+        grounding_config=groundings.GroundingConfig(enabled=True),
+    )
+    # then
+    assert marks_text is not None and '3: button "Go"' in marks_text
+    assert png == b""
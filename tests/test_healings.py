@@ -0,0 +1,139 @@
+# %% IMPORTS
+
+import typing as T
+
+import pytest
+from conftest import FakeSite
+from selenium.common import exceptions
+
+from bromate import actions, drivers, healings
+
+# %% CONSTANTS
+
+PAGE = """<html><head><title>Product</title></head><body>
+<div class="actions"><a href="/cart">Cart</a>{button}</div>
+</body></html>"""
+
+# %% FIXTURES
+
+
+@pytest.fixture
+def healer() -> T.Iterator[healings.Healer]:
+    healer = healings.Healer(config=healings.HealingConfig(enabled=True, path=None))
+    yield healer
+    healer.close()
+
+
+# %% TESTS
+
+
+@pytest.mark.parametrize(
+    "css_selector, expected",
+    [
+        ("ul > li:nth-child(2) a.link", ["ul > li a.link", "a.link", ".link"]),
+        ("form input[name='q']", ["input[name='q']", "input[name*='q']", "[name='q']"]),
+        ("button#buy-now", ['[id*="buy-now"]', '[name="buy-now"]', "#buy-now"]),
+    ],
+)
+def test_variants_relax_the_selectors(css_selector: str, expected: list[str]) -> None:
+    assert healings.variants(css_selector=css_selector) == expected
+
+
+@pytest.mark.parametrize(
+    "url, expected",
+    [
+        ("https://shop.com/products/12345/reviews", ("shop.com", "/products/*/reviews")),
+        ("https://shop.com/orders/2024-06-01.html", ("shop.com", "/orders/*.html")),
+        ("https://shop.com", ("shop.com", "/")),
+    ],
+)
+def test_fingerprint_replaces_the_volatile_segments(url: str, expected: tuple[str, str]) -> None:
+    assert healings.fingerprint(url=url) == expected
+
+
+def test_alternatives_skip_the_generated_ids(driver: drivers.HttpDriver, site: FakeSite) -> None:
+    # given
+    site.pages["/"] = PAGE.format(
+        button='<button id=":r1:" data-testid="buy" value="Buy">Buy</button>'
+    )
+    driver.get(site.url("/"))
+    element = driver.find_element(value="button")
+    # when
+    selectors = healings.alternatives(driver=driver, element=element)
+    # then
+    assert selectors == ['button[data-testid="buy"]', 'button[value="Buy"]']
+
+
+def test_healer_repairs_the_selectors_with_variants(
+    driver: drivers.HttpDriver, site: FakeSite, healer: healings.Healer
+) -> None:
+    # given
+    site.pages["/"] = PAGE.format(button='<button id="buy-now-2">Buy</button>')
+    driver.get(site.url("/"))
+    # when
+    element = healer.find(driver=driver, action="click", css_selector="div > button#buy-now")
+    # then
+    assert element.text == "Buy"
+    assert (healer.metrics.misses, healer.metrics.repairs, healer.metrics.failures) == (1, 1, 0)
+
+
+def test_healer_heals_the_selectors_with_the_learned_ones(
+    driver: drivers.HttpDriver, site: FakeSite, healer: healings.Healer
+) -> None:
+    # given
+    site.pages |= {
+        "/products/1": PAGE.format(button='<button id="buy" data-testid="buy">Buy</button>'),
+        "/products/2": PAGE.format(button='<button id="order" data-testid="buy">Buy</button>'),
+    }
+    driver.get(site.url("/products/1"))
+    healer.find(driver=driver, action="click", css_selector="#buy")  # learned
+    driver.get(site.url("/products/2"))  # same page template, new version
+    # when
+    element = healer.find(driver=driver, action="click", css_selector="#buy")
+    # then
+    assert element.get_attribute("id") == "order"
+    assert (healer.metrics.misses, healer.metrics.hits) == (1, 1)
+
+
+def test_healer_fails_when_no_candidate_matches(
+    driver: drivers.HttpDriver, site: FakeSite, healer: healings.Healer
+) -> None:
+    # given
+    site.pages["/"] = PAGE.format(button="")
+    driver.get(site.url("/"))
+    # when
+    with pytest.raises(exceptions.NoSuchElementException):
+        healer.find(driver=driver, action="click", css_selector="#checkout")
+    # then
+    assert healer.metrics.failures == 1
+
+
+def test_click_heals_its_selector_when_enabled(driver: drivers.HttpDriver, site: FakeSite) -> None:
+    # given
+    site.pages |= {
+        "/": PAGE.format(button=""),
+        "/cart": "<html><head><title>Cart</title></head><body></body></html>",
+    }
+    config = actions.ActionConfig(healing=healings.HealingConfig(enabled=True, path=None))
+    driver.get(site.url("/"))
+    # when
+    try:
+        structure = actions.click(
+            driver=driver, config=config, css_selector="main > div > a[href='/cart']"
+        )
+    finally:
+        healings.close(driver=driver)
+    # then
+    assert structure.response["title"] == "Cart"
+
+
+def test_alternatives_select_the_typed_inputs(driver: drivers.HttpDriver, site: FakeSite) -> None:
+    # given
+    site.pages["/"] = PAGE.format(button='<input type="submit" value="Buy">')
+    driver.get(site.url("/"))
+    element = driver.find_element(value="input")
+    # when
+    selectors = healings.alternatives(driver=driver, element=element)
+    # then
+    assert selectors == ['input[type="submit"][value="Buy"]']
+    assert healings.matches(driver=driver, css_selector=selectors[0])
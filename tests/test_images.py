@@ -0,0 +1,153 @@
+# %% IMPORTS
+
+import struct
+import typing as T
+import zlib
+
+import numpy as np
+import numpy.typing as npt
+import pytest
+
+from bromate import drivers, images
+
+# %% HELPERS
+
+
+def png(pixels: npt.NDArray[T.Any], color: int, depth: int = 8, palette: bytes = b"") -> bytes:
+    height, width = pixels.shape[:2]
+    data = pixels.astype(">u2" if depth == 16 else np.uint8).reshape(height, -1).tobytes()
+    stride = len(data) // height
+    rows = b"".join(b"\x00" + data[y * stride : (y + 1) * stride] for y in range(height))
+
+    def chunk(kind: bytes, body: bytes) -> bytes:
+        return (
+            struct.pack(">I", len(body)) + kind + body + struct.pack(">I", zlib.crc32(kind + body))
+        )
+
+    header = struct.pack(">IIBBBBB", width, height, depth, color, 0, 0, 0)
+    plte = chunk(b"PLTE", palette) if palette else b""
+    return (
+        images.PNG_SIGNATURE
+        + chunk(b"IHDR", header)
+        + plte
+        + chunk(b"IDAT", zlib.compress(rows))
+        + chunk(b"IEND", b"")
+    )
+
+
+def scene(shift: int = 0, size: int = 64) -> images.Frames:
+    frame = np.tile(np.linspace(0.0, 0.5, size, dtype=np.float32), (size, 1))
+    frame[16:40, 16 + shift : 40 + shift] = 1.0
+    return frame
+
+
+class FakeScreen:
+    """Driver that captures a sequence of frames (the last one repeats)."""
+
+    def __init__(self, frames: list[images.Frames]) -> None:
+        self.pngs = [images.encode_png((frame * 255).astype(np.uint8)) for frame in frames]
+        self.captures = 0
+
+    def get_screenshot_as_png(self) -> bytes:
+        self.captures += 1
+        return self.pngs[min(self.captures, len(self.pngs)) - 1]
+
+
+# %% TESTS
+
+
+def test_encode_png_round_trips_with_decode_png() -> None:
+    # given
+    pixels = np.random.default_rng(seed=0).integers(0, 256, size=(27, 40), dtype=np.uint8)
+    # when
+    frame = images.decode_png(data=images.encode_png(pixels=pixels))
+    # then
+    np.testing.assert_allclose(frame, pixels / 255.0, atol=1e-6)
+
+
+@pytest.mark.parametrize(
+    "color, depth, channels",
+    [(0, 8, 1), (0, 16, 1), (2, 8, 3), (4, 8, 2), (6, 8, 4), (6, 16, 4)],
+)
+def test_decode_png_converts_the_formats_to_grayscale(
+    color: int, depth: int, channels: int
+) -> None:
+    # given
+    rng = np.random.default_rng(seed=0)
+    gray = rng.integers(0, 256, size=(5, 7), dtype=np.uint8)
+    pixels: npt.NDArray[T.Any] = np.repeat(gray[..., None], channels, axis=-1)
+    if channels in (2, 4):
+        pixels[..., -1] = 255  # opaque
+    if depth == 16:
+        pixels = pixels.astype(np.uint16) * 257
+    # when
+    frame = images.decode_png(data=png(pixels=pixels, color=color, depth=depth))
+    # then
+    np.testing.assert_allclose(frame, gray / 255.0, atol=1e-3)
+
+
+def test_decode_png_maps_the_palettes() -> None:
+    # given
+    palette = bytes([0, 0, 0, 255, 255, 255])
+    indexes = np.array([[0, 1], [1, 0]], dtype=np.uint8)
+    # when
+    frame = images.decode_png(data=png(pixels=indexes, color=3, palette=palette))
+    # then
+    np.testing.assert_allclose(frame, indexes.astype(np.float32), atol=1e-3)
+
+
+@pytest.mark.parametrize(
+    "data, message",
+    [
+        (b"GIF89a", "invalid signature"),
+        (png(np.zeros((2, 2), dtype=np.uint8), color=0, depth=1), "unsupported format"),
+    ],
+)
+def test_decode_png_rejects_the_unsupported_images(data: bytes, message: str) -> None:
+    with pytest.raises(ValueError, match=message):
+        images.decode_png(data=data)
+
+
+@pytest.mark.parametrize("hash_", [images.dhash, images.phash])
+def test_hashes_are_robust_to_noise_but_not_to_changes(hash_: type) -> None:
+    # given
+    noise = np.random.default_rng(seed=0).normal(0.0, 0.01, size=(64, 64)).astype(np.float32)
+    frames = np.stack([scene(), scene() + noise, scene(shift=20)])
+    # when
+    hashes = hash_(frames)
+    # then
+    distances = images.hamming(hashes[0], hashes[1:])
+    assert hashes.shape == (3,) and hashes.dtype == np.uint64
+    assert distances[0] <= 4 < distances[1]
+
+
+def test_hamming_counts_the_different_bits() -> None:
+    # given
+    a = np.array([0b1011, 2**64 - 1], dtype=np.uint64)
+    b = np.array([0b0001, 0], dtype=np.uint64)
+    # when
+    distances = images.hamming(a, b)
+    # then
+    assert distances.tolist() == [2, 64]
+
+
+def test_downsample_rejects_the_small_frames() -> None:
+    with pytest.raises(ValueError, match="too small"):
+        images.downsample(np.zeros((4, 4), dtype=np.float32), height=8, width=8)
+
+
+def test_wait_until_stable_waits_for_the_stable_captures() -> None:
+    # given
+    screen = FakeScreen(frames=[scene(shift=0), scene(shift=10), scene(shift=20)])
+    config = images.StabilityConfig(enabled=True, interval=0.001, frames=2, scale=1.0)
+    # when
+    stability = images.wait_until_stable(driver=screen, config=config)  # type: ignore[arg-type]
+    # then
+    assert stability.stable is True and stability.captures == 5
+
+
+def test_wait_until_stable_does_not_capture_in_http_mode(driver: drivers.HttpDriver) -> None:
+    # when
+    stability = images.wait_until_stable(driver=driver, config=images.StabilityConfig())
+    # then
+    assert stability == images.Stability(stable=True, captures=0, elapsed=0.0)
@@ -0,0 +1,148 @@
+# %% IMPORTS
+
+import pathlib
+import typing as T
+
+import pytest
+from conftest import FakeSite
+
+from bromate import actions, agents, backends, drivers, executions, journals
+
+# %% CONSTANTS
+
+PAGE = "<html><head><title>{title}</title></head><body><p>{title}</p></body></html>"
+
+# %% HELPERS
+
+
+def execute(
+    agent: agents.Agent, driver: drivers.Driver, journal: journals.Journal, run_id: str
+) -> executions.Execution:
+    return executions.execute(
+        query="",  # replaced by the query of the run
+        agent=agent,
+        driver=driver,
+        config=executions.ExecutionConfig(),
+        action_config=actions.ActionConfig(),
+        journal=journal,
+        run_id=run_id,
+    )
+
+
+# %% FIXTURES
+
+
+@pytest.fixture
+def journal(tmp_path: pathlib.Path) -> T.Iterator[journals.Journal]:
+    journal = journals.Journal(path=str(tmp_path / "journal.db"))
+    yield journal
+    journal.close()
+
+
+# %% TESTS
+
+
+def test_journal_begins_and_resolves_the_runs(journal: journals.Journal) -> None:
+    # given
+    first = journal.begin(query="first query")
+    last = journal.begin(query="last query")
+    # when
+    resumed = journal.begin(query=None, resume="last")
+    # then
+    assert resumed == last != first
+    assert journal.begin(query=None, resume=first) == first
+    assert journal.query(run_id=first) == "first query"
+    with pytest.raises(ValueError, match="run not found"):
+        journal.begin(query=None, resume="unknown")
+
+
+def test_journal_records_the_steps_and_the_runs(journal: journals.Journal) -> None:
+    # given
+    run_id = journal.start(query="open the page")
+    response = backends.to_call("get", url="https://example.com")
+    request = agents.Content(role=agents.Role.USER.value, parts=[agents.Part(text="continue")])
+    digest = journals.chain(journals.origin(query="open the page"), response, request)
+    # when
+    journal.record(
+        run_id=run_id,
+        step=1,
+        digest=digest,
+        response=response,
+        request=request,
+        payloads=["abc"],
+        duration=0.5,
+    )
+    journal.finish(run_id=run_id)
+    # then
+    [step] = journal.steps(run_id=run_id)
+    assert step == journals.Step(1, digest, response, request, ["abc"], 0.5)
+    [run] = journal.runs()
+    assert (run.id, run.status, run.steps, run.duration) == (run_id, "done", 1, 0.5)
+
+
+def test_chain_depends_on_the_history() -> None:
+    # given
+    content = backends.to_call("done")
+    origin = journals.origin(query="query")
+    # when
+    digest = journals.chain(origin, content)
+    # then
+    assert digest == journals.chain(journals.origin(query="query"), content)
+    assert digest != journals.chain(journals.origin(query="other"), content)
+
+
+def test_execute_resumes_an_interrupted_run(
+    driver: drivers.HttpDriver, site: FakeSite, journal: journals.Journal
+) -> None:
+    # given
+    site.pages["/"] = PAGE.format(title="Home")
+    run_id = journal.start(query=f"open {site.url('/')}")
+    execution = execute(backends.StubAgent(rules=[backends.rule_open_url]), driver, journal, run_id)
+    next(execution)
+    with pytest.raises(StopIteration):
+        execution.send(None)  # step 1 is recorded before the agent stops
+    other = drivers.HttpDriver(config=drivers.DriverConfig(http_mode=True))
+    histories: list[int] = []
+
+    def rule(contents: list[agents.Content]) -> agents.Content:
+        histories.append(len(contents))
+        return backends.to_call("done")
+
+    # when
+    try:
+        with pytest.raises(StopIteration):
+            next(execute(backends.StubAgent(rules=[rule]), other, journal, run_id))
+        title = other.title
+    finally:
+        other.quit()
+    # then
+    assert title == "Home"  # replayed
+    assert histories == [3]  # query, response, request
+
+
+def test_execute_resumes_before_an_inconsistent_step(
+    driver: drivers.HttpDriver, journal: journals.Journal
+) -> None:
+    # given
+    run_id = journal.start(query="say hello")
+    request = agents.Content(role=agents.Role.USER.value, parts=[agents.Part(text="continue")])
+    journal.record(
+        run_id=run_id,
+        step=1,
+        digest="tampered",
+        response=backends.to_call("get", url="https://example.com"),
+        request=request,
+        payloads=[],
+        duration=0.0,
+    )
+    histories: list[int] = []
+
+    def rule(contents: list[agents.Content]) -> agents.Content:
+        histories.append(len(contents))
+        return backends.to_call("done")
+
+    # when
+    with pytest.raises(StopIteration):
+        next(execute(backends.StubAgent(rules=[rule]), driver, journal, run_id))
+    # then
+    assert histories == [1]  # not replayed
@@ -0,0 +1,92 @@
+# %% IMPORTS
+
+import pathlib
+import time
+
+import pytest
+from conftest import FakeGemini
+from google.api_core import exceptions
+
+from bromate import agents, limiters
+
+# %% HELPERS
+
+
+def limited(agent: agents.Agent, **kwargs: float) -> limiters.LimitedAgent:
+    config = limiters.LimiterConfig.model_validate(
+        {"requests_per_minute": 600, "backoff_base": 0.01, "backoff_max": 0.05} | kwargs
+    )
+    return limiters.init_limited_agent_from_config(agent=agent, config=config)
+
+
+def contents() -> list[agents.Content]:
+    return [agents.Content(role=agents.Role.USER.value, parts=[agents.Part(text="query")])]
+
+
+# %% TESTS
+
+
+def test_limited_agent_retries_quota_errors(agent: agents.Agent, gemini: FakeGemini) -> None:
+    # given
+    gemini.failures = 2
+    limiter = limited(agent=agent, max_retries=3)
+    # when
+    response = limiter.generate_content(contents=contents(), tools=[])
+    # then
+    assert response.text == "done"
+    assert len(gemini.requests) == 3
+    assert limiter.metrics.requests == 3
+    assert limiter.metrics.retries == 2
+
+
+def test_limited_agent_raises_after_max_retries(agent: agents.Agent, gemini: FakeGemini) -> None:
+    # given
+    gemini.failures = 10
+    limiter = limited(agent=agent, max_retries=2)
+    # when
+    with pytest.raises(exceptions.TooManyRequests):
+        limiter.generate_content(contents=contents(), tools=[])
+    # then
+    assert len(gemini.requests) == 3
+
+
+def test_limited_agent_stops_at_deadline(agent: agents.Agent, gemini: FakeGemini) -> None:
+    # given
+    gemini.failures = 10
+    limiter = limited(agent=agent, max_retries=10, deadline=0.5)
+    limiter.backoff = lambda attempt: 5.0  # type: ignore[method-assign]
+    # when
+    start = time.monotonic()
+    with pytest.raises(exceptions.TooManyRequests):
+        limiter.generate_content(contents=contents(), tools=[])
+    # then
+    assert time.monotonic() - start < 0.5
+    assert len(gemini.requests) == 1
+
+
+def test_limited_agent_does_not_queue_past_deadline(
+    agent: agents.Agent, gemini: FakeGemini
+) -> None:
+    # given
+    gemini.failures = 1
+    limiter = limited(agent=agent, requests_per_minute=1, deadline=1.0)
+    # when
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        limiter.generate_content(contents=contents(), tools=[])  # retry needs a new slot
+    # then
+    assert time.monotonic() - start < 1.0
+    assert len(gemini.requests) == 1
+
+
+def test_token_bucket_is_shared_through_its_state_file(tmp_path: pathlib.Path) -> None:
+    # given
+    path = str(tmp_path / "limits.json")
+    first = limiters.TokenBucket(requests_per_minute=1, tokens_per_minute=1000, path=path)
+    second = limiters.TokenBucket(requests_per_minute=1, tokens_per_minute=1000, path=path)
+    # when
+    waited = first.acquire(tokens=10)
+    # then
+    assert waited < 0.1
+    with pytest.raises(TimeoutError):
+        second.acquire(tokens=10, deadline=time.monotonic() + 1.0)
@@ -0,0 +1,87 @@
+# %% IMPORTS
+
+import pathlib
+
+from bromate import agents, payloads
+
+# %% HELPERS
+
+
+def screenshot(store: payloads.PayloadStore, data: bytes) -> agents.Content:
+    part = store.reference(data=data, mime_type="image/png")
+    return agents.Content(role=agents.Role.USER.value, parts=[part])
+
+
+def source(store: payloads.PayloadStore, html: str) -> agents.Content:
+    structure = agents.Structure(name="get", response={"url": "/", "page_source": html})
+    part = agents.Part(function_response=store.refer(structure))
+    return agents.Content(role=agents.Role.USER.value, parts=[part])
+
+
+# %% TESTS
+
+
+def test_payload_store_deduplicates_and_spills_large_payloads(tmp_path: pathlib.Path) -> None:
+    # given
+    store = payloads.PayloadStore(spill_path=str(tmp_path), spill_size=10)
+    # when
+    small = store.put(data=b"small")
+    large = store.put(data=b"large payload")
+    again = store.put(data=b"large payload")
+    # then
+    assert large == again and store.get(digest=large) == b"large payload"
+    assert store.get(digest=small) == b"small"
+    assert small in store.blobs and large not in store.blobs
+    assert (tmp_path / f"{large}.bin").read_bytes() == b"large payload"
+    assert (store.metrics.puts, store.metrics.hits, store.metrics.saved_bytes) == (3, 1, 13)
+    reopened = payloads.PayloadStore(spill_path=str(tmp_path))
+    assert large in reopened and reopened.get(digest=large) == b"large payload"
+
+
+def test_payload_store_references_the_result_fields() -> None:
+    # given
+    store = payloads.PayloadStore(fields=["page_source"])
+    # when
+    content = source(store=store, html="<html>page</html>")
+    # then
+    response = content.parts[0].function_response.response
+    assert response["url"] == "/" and response["page_source"].startswith(payloads.SCHEME)
+    assert payloads.references(content.parts[0]) == 1
+    materialized = store.materialize(contents=[content])
+    assert materialized[0].parts[0].function_response.response["page_source"] == "<html>page</html>"
+
+
+def test_payload_store_inlines_all_the_payloads_by_default() -> None:
+    # given
+    store = payloads.PayloadStore(fields=["page_source"])
+    contents = [screenshot(store=store, data=bytes([i])) for i in range(6)]
+    # when
+    materialized = store.materialize(contents=contents)
+    # then
+    assert [content.parts[0].inline_data.data for content in materialized] == [
+        bytes([i]) for i in range(6)
+    ]
+    assert contents[0].parts[0].file_data.file_uri.startswith(payloads.SCHEME)  # unchanged
+    assert (store.metrics.inlined, store.metrics.omitted) == (6, 0)
+
+
+def test_payload_store_omits_the_older_payloads_when_pruning() -> None:
+    # given
+    store = payloads.PayloadStore(fields=["page_source"], max_inline=2)
+    contents = [
+        screenshot(store=store, data=b"first"),
+        source(store=store, html="<html>old</html>"),
+        screenshot(store=store, data=b"second"),
+        source(store=store, html="<html>new</html>"),
+    ]
+    # when
+    materialized = store.materialize(contents=contents)
+    again = store.materialize(contents=contents)
+    # then
+    assert materialized[0].parts[0].text.startswith("[image/png omitted: payload://")
+    response = materialized[1].parts[0].function_response.response
+    assert response["page_source"].startswith("[page_source omitted: payload://")
+    assert materialized[2].parts[0].inline_data.data == b"second"
+    assert materialized[3].parts[0].function_response.response["page_source"] == "<html>new</html>"
+    assert all(x is y for x, y in zip(materialized, again, strict=True))  # cached
+    assert (store.metrics.inlined, store.metrics.omitted) == (2, 2)
@@ -0,0 +1,65 @@
+# %% IMPORTS
+
+from conftest import FakeSite
+
+from bromate import actions, documents, drivers, prefetches
+
+# %% CONSTANTS
+
+HOME = """<html><head><title>Home</title></head><body>
+<nav><a href="/about">About</a><a href="/logout">Log out</a></nav>
+<main><p>Welcome, read the <a href="/guide#intro">guide</a> or
+<a class="btn-primary" href="/start">start</a>.</p></main>
+<footer><a href="https://other.com/">Partner</a><a href="mailto:a@b.c">Mail</a>
+<a href="#top">Top</a></footer>
+</body></html>"""
+PAGE = "<html><head><title>{title}</title></head><body><p>{title}</p></body></html>"
+
+# %% TESTS
+
+
+def test_rank_prefers_the_prominent_and_safe_links() -> None:
+    # given
+    document = documents.parse(HOME)
+    # when
+    urls = prefetches.rank(
+        document=document, base_url="https://site.com/", max_links=5, same_host=True
+    )
+    # then
+    assert urls == ["https://site.com/start", "https://site.com/guide", "https://site.com/about"]
+
+
+def test_rank_keeps_the_other_hosts_when_allowed() -> None:
+    # given
+    document = documents.parse(HOME)
+    # when
+    urls = prefetches.rank(
+        document=document, base_url="https://site.com/", max_links=5, same_host=False
+    )
+    # then
+    assert "https://other.com/" in urls
+
+
+def test_navigations_to_the_prefetched_links_are_hits(
+    driver: drivers.HttpDriver, site: FakeSite
+) -> None:
+    # given
+    site.pages |= {
+        "/": HOME,
+        "/start": PAGE.format(title="Start"),
+        "/guide": PAGE.format(title="Guide"),
+        "/about": PAGE.format(title="About"),
+        "/other": PAGE.format(title="Other"),
+    }
+    config = actions.ActionConfig(prefetch=prefetches.PrefetchConfig(enabled=True, max_links=2))
+    actions.get(driver=driver, config=config, url=site.url("/"))
+    for future in driver.prefetches.values():
+        future.result()
+    # when
+    actions.click(driver=driver, config=config, css_selector=".btn-primary")
+    actions.get(driver=driver, config=config, url=site.url("/other"))
+    # then
+    metrics = prefetches.prefetcher(driver=driver, config=config.prefetch).metrics
+    assert (metrics.navigations, metrics.hits, metrics.hit_rate) == (2, 1, 0.5)
+    paths = [request[1] for request in site.requests]
+    assert paths.count("/start") == 1 and "/logout" not in paths
@@ -0,0 +1,102 @@
+# %% IMPORTS
+
+import re
+import typing as T
+
+import pytest
+
+from bromate import agents, payloads, results
+
+# %% CONSTANTS
+
+SOURCE = "".join(f"<p>Line {i:04d} of the page source: café</p>\n" for i in range(500))
+
+# %% HELPERS
+
+
+def shaper(**kwargs: T.Any) -> results.Shaper:
+    config = results.ResultConfig(enabled=True, **kwargs)
+    return results.Shaper(config=config, store=payloads.PayloadStore())
+
+
+# %% TESTS
+
+
+def test_shaper_keeps_the_results_when_disabled() -> None:
+    # given
+    structure = agents.Structure(name="get", response={"page_source": SOURCE})
+    shaper = results.Shaper(config=results.ResultConfig(), store=payloads.PayloadStore())
+    # when
+    shaped = shaper.shape(structure=structure)
+    # then
+    assert shaped is structure
+
+
+@pytest.mark.parametrize("policy", ["head", "head_tail"])
+def test_shaper_truncates_the_large_fields_at_element_boundaries(policy: str) -> None:
+    # given
+    shaper_ = shaper(field_size=2048, policy=policy)
+    structure = agents.Structure(name="get", response={"title": "Page", "page_source": SOURCE})
+    # when
+    shaped = shaper_.shape(structure=structure)
+    # then
+    source = shaped.response["page_source"]
+    assert shaped.response["title"] == "Page"
+    assert len(source.encode()) <= 2048
+    assert source.startswith("<p>Line 0000") and ("Line 0499" in source) == (policy == "head_tail")
+    head = source.split("\n[... ", 1)[0]
+    assert head.endswith((">", "\n"))  # not in the middle of a text
+    assert shaper_.metrics.truncated == 1 and 0 < shaper_.metrics.removed_ratio < 1
+
+
+def test_shaper_reads_more_of_the_truncated_fields() -> None:
+    # given
+    shaper_ = shaper(field_size=2048, policy="head")
+    shaped = shaper_.shape(agents.Structure(name="get", response={"page_source": SOURCE}))
+    marker = re.search(r"handle=(\w+) and offset=(\d+)", shaped.response["page_source"])
+    assert marker is not None
+    handle, offset = marker.group(1), int(marker.group(2))
+    # when
+    pages = []
+    next_offset: int | None = offset
+    while next_offset is not None:
+        page = shaper_.read(handle=handle, offset=next_offset)
+        pages.append(page["content"])
+        next_offset = page["next_offset"]
+    # then
+    assert SOURCE[: len(SOURCE.encode()[:offset].decode())] + "".join(pages) == SOURCE
+    with pytest.raises(ValueError, match="unknown handle"):
+        shaper_.read(handle="unknown")
+
+
+def test_shaper_shares_the_response_budget_between_the_fields() -> None:
+    # given
+    shaper_ = shaper(field_size=4096, response_size=4096)
+    response = {"page_source": SOURCE, "content": SOURCE, "url": "https://example.com"}
+    # when
+    shaped = shaper_.shape(agents.Structure(name="read", response=response))
+    # then
+    sizes = [len(val.encode()) for val in shaped.response.values()]
+    assert sum(sizes) <= 4096 + results.MARKER_SIZE
+    assert shaped.response["url"] == "https://example.com"
+
+
+def test_shaper_cleans_the_driver_errors() -> None:
+    # given
+    error = (
+        "Message: no such element\n  (Session info: chrome=126.0)\nStacktrace:\n#0 0x55 <unknown>"
+    )
+    # when
+    shaped = shaper().shape(agents.Structure(name="click", response={"error": error}))
+    # then
+    assert shaped.response["error"] == "Message: no such element"
+
+
+def test_cut_keeps_the_characters_whole() -> None:
+    # given
+    data = "aé".encode() * 10
+    # when
+    indexes = [results.cut(data=data, index=i, boundary=False) for i in range(len(data))]
+    # then
+    for index in indexes:
+        data[:index].decode()  # no partial character
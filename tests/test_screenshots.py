@@ -0,0 +1,87 @@
+# %% IMPORTS
+
+import numpy as np
+import pytest
+from conftest import FakeSite
+
+from bromate import drivers, images, screenshots
+
+# %% CONSTANTS
+
+PAGE = "<html><head><title>{title}</title></head><body><p>{title}</p></body></html>"
+
+# %% HELPERS
+
+
+class FakeWindow:
+    """Driver with a page and a window to capture (changed by the tests)."""
+
+    def __init__(self) -> None:
+        self.current_url = "https://example.com/"
+        self.page_source = "\n".join(f"<p>Line {i}</p>" for i in range(10))
+        self.pixels = np.zeros((64, 64), dtype=np.uint8)
+
+    def get_screenshot_as_png(self) -> bytes:
+        return images.encode_png(pixels=self.pixels)
+
+
+def decisions(policy: str, steps: list[tuple[str, list[str]]], **kwargs: float) -> list[bool]:
+    window = FakeWindow()
+    config = screenshots.ScreenshotConfig(policy=policy, **kwargs)
+    policy_ = screenshots.ScreenshotPolicy(config=config)
+    outcomes = []
+    for change, names in steps:
+        if change == "url":
+            window.current_url += "next/"
+        elif change == "source":
+            window.page_source += "".join(f"\n<p>New line {i}</p>" for i in range(5))
+        elif change == "pixels":
+            window.pixels = window.pixels.copy()
+            window.pixels[:, :32] = 255
+        outcomes.append(policy_.decide(driver=window, names=names))  # type: ignore[arg-type]
+    return outcomes
+
+
+# %% TESTS
+
+
+@pytest.mark.parametrize(
+    "policy, expected",
+    [
+        ("always", [True, True, True, True, True, True]),
+        ("navigation", [True, False, True, False, False, True]),
+        ("change", [True, False, False, True, False, True]),
+        ("visual", [True, False, False, False, True, True]),
+        ("interval", [True, False, True, False, True, True]),
+        ("request", [True, False, False, False, False, True]),
+    ],
+)
+def test_policy_decides_when_to_capture(policy: str, expected: list[bool]) -> None:
+    # given
+    steps = [
+        ("", ["get"]),  # first step
+        ("", ["click"]),
+        ("url", ["click"]),
+        ("source", ["write"]),
+        ("pixels", ["scroll"]),
+        ("", ["screenshot"]),  # requested
+    ]
+    # when
+    outcomes = decisions(policy=policy, steps=steps, interval=2)
+    # then
+    assert outcomes == expected
+
+
+def test_policy_counts_the_unavailable_screenshots_in_http_mode(
+    driver: drivers.HttpDriver, site: FakeSite
+) -> None:
+    # given
+    site.pages["/"] = PAGE.format(title="Home")
+    driver.get(site.url("/"))
+    policy = screenshots.ScreenshotPolicy(config=screenshots.ScreenshotConfig(policy="navigation"))
+    # when
+    pngs = [policy.capture(driver=driver, names=["get"]) for _ in range(2)]
+    # then
+    assert pngs == [b"", b""]
+    assert (policy.metrics.unavailable, policy.metrics.skipped) == (1, 1)
+    assert policy.metrics.avoided_tokens > 0
@@ -0,0 +1,103 @@
+# %% IMPORTS
+
+import pathlib
+
+import pytest
+from conftest import FakeSite
+
+from bromate import actions, backends, drivers, executions, traces
+
+# %% CONSTANTS
+
+PAGE = "<html><head><title>{title}</title></head><body><p>{title}</p></body></html>"
+
+# %% HELPERS
+
+
+def run(driver: drivers.Driver, query: str, path: pathlib.Path, run_id: str) -> None:
+    execution = executions.execute(
+        query=query,
+        agent=backends.StubAgent(),
+        driver=driver,
+        config=executions.ExecutionConfig(),
+        action_config=actions.ActionConfig(),
+        run_id=run_id,
+        trace_config=traces.TraceConfig(path=str(path)),
+    )
+    next(execution)
+    with pytest.raises(StopIteration):
+        execution.send(None)
+
+
+# %% TESTS
+
+
+def test_executions_trace_the_timeline_of_their_steps(
+    driver: drivers.HttpDriver, site: FakeSite, tmp_path: pathlib.Path
+) -> None:
+    # given
+    site.pages["/"] = PAGE.format(title="Home")
+    # when
+    run(driver=driver, query=f"open {site.url('/')}", path=tmp_path, run_id="run")
+    # then
+    [directory] = traces.find(paths=[str(tmp_path)])
+    trace = traces.load(directory=directory)
+    assert trace.run_id == "run" and trace.query == f"open {site.url('/')}"
+    kinds = [(event.step, event.kind, event.name) for event in trace.events]
+    assert kinds == [
+        (1, "model", "generate_content"),
+        (1, "action", "get"),
+        (1, "observe", "observe"),
+        (1, "input", "user"),
+        (2, "model", "generate_content"),
+        (2, "action", "done"),
+    ]
+    assert all(event.size > 0 for event in trace.events if event.kind in ("model", "action"))
+    assert driver not in traces.TRACERS
+
+
+def test_resumed_runs_append_to_their_trace(
+    driver: drivers.HttpDriver, site: FakeSite, tmp_path: pathlib.Path
+) -> None:
+    # given
+    site.pages["/"] = PAGE.format(title="Home")
+    run(driver=driver, query=f"open {site.url('/')}", path=tmp_path, run_id="run")
+    # when
+    run(driver=driver, query=f"open {site.url('/')}", path=tmp_path, run_id="run")
+    # then
+    trace = traces.load(directory=str(tmp_path / "run"))
+    assert len(trace.events) == 12
+
+
+def test_tracer_records_the_errors_of_the_spans(tmp_path: pathlib.Path) -> None:
+    # given
+    tracer = traces.Tracer(config=traces.TraceConfig(path=str(tmp_path)), run_id="run", query="q")
+    # when
+    with pytest.raises(ValueError, match="boom"), tracer.span(kind="action", name="click"):
+        raise ValueError("boom")
+    tracer.close()
+    # then
+    [event] = traces.load(directory=tracer.directory).events
+    assert (event.kind, event.name, event.error) == ("action", "click", "boom")
+
+
+def test_summarize_and_render_the_traces(tmp_path: pathlib.Path) -> None:
+    # given
+    tracer = traces.Tracer(config=traces.TraceConfig(path=str(tmp_path)), run_id="run", query="q")
+    for step in (1, 2):
+        tracer.step = step
+        tracer.record(kind="model", name="generate_content", start=tracer.origin, duration=step)
+        tracer.screenshot(png=b"png", start=tracer.origin)
+    tracer.close()
+    trace = traces.load(directory=tracer.directory)
+    # when
+    summary = traces.summarize(traces=[trace], top=1)
+    page = traces.render(traces=[trace], directory=str(tmp_path))
+    # then
+    assert traces.breakdown(trace=trace)[2]["model"] == 2.0
+    assert "model:generate_content" in summary and "run step 2" in summary
+    assert '<img src="run/0001.png">' in page and (tmp_path / "run" / "0002.png").exists()
+
+
+def test_init_tracer_from_config_is_disabled_without_path() -> None:
+    assert traces.init_tracer_from_config(config=traces.TraceConfig(), query="q") is None
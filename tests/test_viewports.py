@@ -0,0 +1,79 @@
+# %% IMPORTS
+
+import pytest
+from conftest import FakeSite
+
+from bromate import actions, drivers, viewports
+
+# %% CONSTANTS
+
+PARAGRAPHS = [f"Paragraph {i:02d} of the long page." for i in range(20)]
+PAGE = "<html><head><title>Long</title></head><body>{}</body></html>".format(
+    "".join(f"<p id='p{i}'>{text}</p>" for i, text in enumerate(PARAGRAPHS))
+)
+
+# %% FIXTURES
+
+
+@pytest.fixture
+def config() -> actions.ActionConfig:
+    viewport = viewports.ViewportConfig(enabled=True, margin=0.0, http_size=100)
+    return actions.ActionConfig(viewport=viewport)
+
+
+# %% TESTS
+
+
+def test_get_returns_the_first_viewport_only(
+    driver: drivers.HttpDriver, site: FakeSite, config: actions.ActionConfig
+) -> None:
+    # given
+    site.pages["/"] = PAGE
+    # when
+    structure = actions.get(driver=driver, config=config, url=site.url("/"))
+    # then
+    response = dict(structure.response)
+    assert "page_source" not in response
+    assert response["scroll_y"] == 0 and response["viewport_height"] == 100
+    assert PARAGRAPHS[0] in response["content"] and PARAGRAPHS[-1] not in response["content"]
+
+
+def test_scroll_returns_only_the_new_content(
+    driver: drivers.HttpDriver, site: FakeSite, config: actions.ActionConfig
+) -> None:
+    # given
+    site.pages["/"] = PAGE
+    first = actions.get(driver=driver, config=config, url=site.url("/"))
+    # when
+    structure = actions.scroll(driver=driver, config=config, screens=1.0)
+    # then
+    seen, content = first.response["content"], structure.response["content"]
+    assert structure.response["scroll_y"] == 100
+    assert content and not any(line in seen for line in content.splitlines())
+
+
+def test_scroll_to_reveals_the_element(
+    driver: drivers.HttpDriver, site: FakeSite, config: actions.ActionConfig
+) -> None:
+    # given
+    site.pages["/"] = PAGE
+    actions.get(driver=driver, config=config, url=site.url("/"))
+    # when
+    structure = actions.scroll_to(driver=driver, config=config, css_selector="#p15")
+    # then
+    assert PARAGRAPHS[15] in structure.response["content"]
+
+
+def test_scroll_returns_the_page_source_when_viewports_are_disabled(
+    driver: drivers.HttpDriver, site: FakeSite
+) -> None:
+    # given
+    site.pages["/"] = PAGE
+    config = actions.ActionConfig()
+    actions.get(driver=driver, config=config, url=site.url("/"))
+    # when
+    structure = actions.scroll(driver=driver, config=config)
+    # then
+    response = dict(structure.response)
+    assert set(response) == {"title", "url", "page_source"}
+    assert PARAGRAPHS[-1] in response["page_source"]
@@ -0,0 +1,105 @@
+# %% IMPORTS
+
+import functools
+import pathlib
+import typing as T
+
+import pytest
+import urllib3
+from conftest import FakeSite
+
+from bromate import actions, agents, backends, brokers, drivers, executions, workers
+
+# %% HELPERS
+
+
+def executor(agent: agents.Agent, driver: drivers.Driver) -> workers.Executor:
+    return functools.partial(
+        executions.execute,
+        agent=agent,
+        driver=driver,
+        config=executions.ExecutionConfig(),
+        action_config=actions.ActionConfig(),
+    )
+
+
+# %% FIXTURES
+
+
+@pytest.fixture
+def broker(tmp_path: pathlib.Path) -> brokers.SQLiteBroker:
+    return brokers.SQLiteBroker(path=str(tmp_path / "queue.db"), max_attempts=2)
+
+
+# %% TESTS
+
+
+def test_worker_completes_jobs_done_in_their_first_response(
+    broker: brokers.SQLiteBroker, driver: drivers.HttpDriver
+) -> None:
+    # given
+    job_id = broker.enqueue(query="say hello")
+    config = workers.WorkerConfig(max_jobs=1, poll_interval=0.01)
+    # when
+    metrics = workers.work(
+        broker=broker, execute=executor(backends.StubAgent(), driver), driver=driver, config=config
+    )
+    # then
+    assert (metrics.done, metrics.retried, metrics.dead) == (1, 0, 0)
+    result = broker.result(job_id=job_id)
+    assert result is not None and result.status == "done" and result.steps == 1
+
+
+def test_worker_truncates_jobs_at_max_steps(
+    broker: brokers.SQLiteBroker, driver: drivers.HttpDriver, site: FakeSite
+) -> None:
+    # given
+    site.pages["/"] = "<html><head><title>Home</title></head><body>Home page</body></html>"
+    agent = backends.StubAgent(rules=[lambda contents: backends.to_call("get", url=site.url())])
+    job_id = broker.enqueue(query="loop forever")
+    config = workers.WorkerConfig(max_jobs=1, max_steps=2, poll_interval=0.01)
+    # when
+    metrics = workers.work(
+        broker=broker, execute=executor(agent, driver), driver=driver, config=config
+    )
+    # then
+    assert (metrics.done, metrics.truncated) == (0, 1)
+    result = broker.result(job_id=job_id)
+    assert result is not None and result.status == "truncated" and result.steps == 2
+    assert result.url == site.url()
+
+
+def test_worker_retries_failed_jobs_until_dead(
+    broker: brokers.SQLiteBroker, driver: drivers.HttpDriver
+) -> None:
+    # given
+    invalid = agents.Content(role=agents.Role.AGENT.value, parts=[agents.Part()])
+    agent = backends.StubAgent(rules=[lambda contents: invalid])
+    job_id = broker.enqueue(query="fail")
+    config = workers.WorkerConfig(max_jobs=2, poll_interval=0.01)
+    # when
+    metrics = workers.work(
+        broker=broker, execute=executor(agent, driver), driver=driver, config=config
+    )
+    # then
+    assert (metrics.done, metrics.retried, metrics.dead) == (0, 1, 1)
+    result = broker.result(job_id=job_id)
+    assert result is not None and result.status == "dead"
+
+
+def test_worker_retries_jobs_that_fail_on_network_errors(
+    broker: brokers.SQLiteBroker, driver: drivers.HttpDriver, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # given
+    def restore_sessions(driver: drivers.Driver, query: str, config: T.Any) -> list[str]:
+        raise urllib3.exceptions.MaxRetryError(pool=None, url="/")  # type: ignore[arg-type]
+
+    monkeypatch.setattr(drivers, "restore_sessions", restore_sessions)
+    broker.enqueue(query="open an unreachable site")
+    config = workers.WorkerConfig(max_jobs=1, poll_interval=0.01)
+    # when
+    metrics = workers.work(
+        broker=broker, execute=executor(backends.StubAgent(), driver), driver=driver, config=config
+    )
+    # then
+    assert (metrics.done, metrics.retried, metrics.dead) == (0, 1, 0)